@@ -0,0 +1,506 @@
+"""
+Streaming, parallel site backups and restores
+
+`beam backup --stream` backs up many sites at once without bench's
+intermediate files: each site's mariadb-dump output is piped straight
+through a multi-threaded compressor into the backup file, and the SHA-256
+of what is written is computed on the way. zstd (-T) is used when
+installed, else pigz, else gzip blocks compressed on a thread pool.
+
+Sites run --jobs at a time, largest database first, and --max-rate caps
+the bytes written per second across all of them. A manifest.json in the
+backup directory records every file's checksum and size.
+
+`beam restore --stream <dir>` reads a backup back the same way: file ->
+decompressor -> mariadb client (or tar for files), checking each file's
+checksum as it streams. The dump replaces every table it contains; the
+site must exist and its site_config is left alone.
+
+Usage:
+    beam backup --stream [options]
+    beam restore --stream <backup dir> [options]
+    beam restore --stream <backup dir> --verify
+
+Options:
+    --sites/--glob/--tag  Limit the sites, as for beam fanout
+    --jobs N              Sites at the same time (default 2)
+    --max-rate MB         Write (backup) or read (restore) at most MB/s in total
+    --with-files          Include public and private files
+    --backup-path DIR     Where to write (default: backups/<timestamp> in the bench)
+    --compressor NAME     zstd, pigz or gzip (default: the fastest installed)
+    --verify              Only check the backup's checksums
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+
+
+DEFAULT_JOBS = 2
+CHUNK = 1024 * 1024
+# gzip blocks compressed independently; the output is a multi-member gzip
+GZIP_BLOCK = 4 * 1024 * 1024
+
+# name: (suffix, compress argv, decompress argv); "{threads}" is filled in
+COMPRESSORS = {
+    "zstd": (".zst", ["zstd", "-q", "-c", "-3", "-T{threads}"], ["zstd", "-q", "-d", "-c"]),
+    "pigz": (".gz", ["pigz", "-c", "-p", "{threads}"], ["pigz", "-d", "-c"]),
+    "gzip": (".gz", None, None),
+}
+
+DUMP_OPTIONS = ["--single-transaction", "--quick", "--routines", "--skip-lock-tables"]
+
+
+def pick_compressor(name=None):
+    if name:
+        if name not in COMPRESSORS:
+            raise ValueError(f"Unknown compressor: {name}")
+        if name != "gzip" and not shutil.which(name):
+            raise ValueError(f"{name} is not installed")
+        return name
+    for candidate in ("zstd", "pigz"):
+        if shutil.which(candidate):
+            return candidate
+    return "gzip"
+
+
+def decompressor_for(path):
+    """Compressor name able to read path back"""
+    if str(path).endswith(".zst"):
+        return "zstd"
+    return "pigz" if shutil.which("pigz") else "gzip"
+
+
+def _argv(template, threads):
+    return [part.replace("{threads}", str(threads)) for part in template]
+
+
+class IOBudget:
+    """Token bucket shared by all workers; consume() sleeps when over the rate"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.available = rate or 0
+        self.updated = time.monotonic()
+
+    def consume(self, count):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(self.rate, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            self.available -= count
+            wait = -self.available / self.rate if self.available < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class HashingWriter:
+    """Writes to a file under the budget, hashing and counting the bytes"""
+
+    def __init__(self, file, budget):
+        self.file = file
+        self.budget = budget
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.budget.consume(len(data))
+        self.digest.update(data)
+        self.file.write(data)
+        self.size += len(data)
+
+
+def parallel_gzip(source, write, threads, level=6):
+    """Compress source in blocks on a thread pool, writing members in order"""
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        for block in iter(lambda: source.read(GZIP_BLOCK), b""):
+            pending.append(pool.submit(gzip.compress, block, level))
+            # Bound memory: a couple of blocks per thread in flight
+            while len(pending) > 2 * threads:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+
+
+class Gunzip:
+    """Incremental decompression of (multi-member) gzip data"""
+
+    def __init__(self):
+        self.decoder = zlib.decompressobj(31)
+
+    def feed(self, data):
+        output = [self.decoder.decompress(data)]
+        while self.decoder.eof and self.decoder.unused_data:
+            rest = self.decoder.unused_data
+            self.decoder = zlib.decompressobj(31)
+            output.append(self.decoder.decompress(rest))
+        return b"".join(output)
+
+
+def _collect_stderr(process):
+    """Read a process's stderr on a thread; returns a list filled with its lines"""
+    lines = []
+
+    def read():
+        for line in process.stderr:
+            lines.append(line.decode(errors="replace").rstrip())
+    threading.Thread(target=read, daemon=True).start()
+    return lines
+
+
+def stream_to_file(cmd, env, path, compressor, threads, budget):
+    """Compress the output of cmd into path; (ok, sha256, size, error)"""
+    import subprocess
+
+    partial = path.with_name(path.name + ".partial")
+    producer = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, env=env)
+    errors = _collect_stderr(producer)
+    processes = [producer]
+    source = producer.stdout
+    compress = COMPRESSORS[compressor][1]
+    if compress:
+        # Dump -> compressor is a plain pipe; beam only sees compressed bytes
+        packer = subprocess.Popen(_argv(compress, threads), stdin=producer.stdout,
+                                  stdout=subprocess.PIPE)
+        producer.stdout.close()
+        processes.append(packer)
+        source = packer.stdout
+
+    failure = None
+    try:
+        with open(partial, "wb") as out:
+            writer = HashingWriter(out, budget)
+            if compress:
+                for chunk in iter(lambda: source.read(CHUNK), b""):
+                    writer.write(chunk)
+            else:
+                parallel_gzip(source, writer.write, threads)
+    except (OSError, zlib.error) as e:
+        # e.g. the destination filled up; the dump would only report a broken pipe
+        failure = str(e)
+        for process in processes:
+            process.kill()
+    source.close()
+    codes = [process.wait() for process in processes]
+    if failure or any(codes):
+        if partial.exists():
+            partial.unlink()
+        return False, None, 0, failure or (errors[-1] if errors else f"exit {max(codes)}")
+    os.replace(partial, path)
+    return True, writer.digest.hexdigest(), writer.size, None
+
+
+def stream_from_file(path, cmd, env, budget):
+    """Decompress path into the stdin of cmd; (ok, sha256, error)"""
+    import subprocess
+
+    consumer = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, env=env)
+    errors = _collect_stderr(consumer)
+    processes = [consumer]
+    gunzip = None
+    unpack = COMPRESSORS[decompressor_for(path)][2]
+    if unpack:
+        unpacker = subprocess.Popen(unpack, stdin=subprocess.PIPE, stdout=consumer.stdin)
+        consumer.stdin.close()
+        processes.insert(0, unpacker)
+        target = unpacker.stdin
+    else:
+        gunzip = Gunzip()
+        target = consumer.stdin
+
+    digest = hashlib.sha256()
+    failure = None
+    try:
+        with open(path, "rb") as source:
+            for chunk in iter(lambda: source.read(CHUNK), b""):
+                budget.consume(len(chunk))
+                digest.update(chunk)
+                target.write(gunzip.feed(chunk) if gunzip else chunk)
+        target.close()
+    except (OSError, zlib.error) as e:
+        failure = str(e)
+        for process in processes:
+            process.kill()
+    codes = [process.wait() for process in processes]
+    if failure or any(codes):
+        # The client's own message says more than a broken pipe
+        return False, digest.hexdigest(), errors[-1] if errors else failure or f"exit {max(codes)}"
+    return True, digest.hexdigest(), None
+
+
+def file_checksum(path, budget):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(CHUNK), b""):
+            budget.consume(len(chunk))
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Sites
+# ---------------------------------------------------------------------------
+
+def site_artifacts(bench_root, site, with_files):
+    """[(file stem, producer argv, consumer argv, env)] for one site"""
+    from beam.migrations import Database
+    database = Database.for_site(bench_root, site)
+    site_dir = str(Path(bench_root) / "sites" / site)
+    dump, env = database.command(database.dumper or "mariadb-dump", *DUMP_OPTIONS, database.name)
+    load, _ = database.command(database.client or "mariadb", database.name)
+    artifacts = [("database.sql", dump, load, env)]
+    if with_files:
+        for stem, folder in (("public-files.tar", "public/files"), ("private-files.tar", "private/files")):
+            if os.path.isdir(os.path.join(site_dir, folder)):
+                artifacts.append((stem, ["tar", "-cf", "-", "-C", site_dir, folder],
+                                  ["tar", "-xf", "-", "-C", site_dir], None))
+    return artifacts
+
+
+class Worker:
+    """Runs one job per site on a bounded pool, collecting fanout-style results"""
+
+    def __init__(self, jobs, job):
+        self.jobs = jobs
+        self.job = job
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def run(self, sites):
+        from beam.fanout import FAILED, OK
+        queue = deque(sites)
+
+        def work():
+            while True:
+                with self.lock:
+                    if not queue:
+                        return
+                    site = queue.popleft()
+                start = time.monotonic()
+                try:
+                    ok, detail = self.job(site)
+                except Exception as e:
+                    ok, detail = False, str(e)
+                result = {"state": OK if ok else FAILED, "code": 0 if ok else 1,
+                          "duration": time.monotonic() - start, "detail": detail}
+                with self.lock:
+                    self.results[site] = result
+                    mark = "✓" if ok else "✗"
+                    print(f"{mark} [{len(self.results)}/{len(sites)}] {site}  {detail}  "
+                          f"({result['duration']:.1f}s)", file=sys.stderr, flush=True)
+
+        threads = [threading.Thread(target=work) for _ in range(max(1, min(self.jobs, len(sites))))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.results
+
+
+def _size(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def backup_sites(bench_root, sites, options):
+    """Back up sites into a new directory; returns the exit code"""
+    from beam.fanout import OK, format_duration, print_summary
+    from beam.migrations import Database, site_db_sizes
+    from beam.state import save_json
+
+    compressor = pick_compressor(options["compressor"])
+    suffix = COMPRESSORS[compressor][0]
+    target = Path(options["backup_path"] or Path(bench_root) / "backups" / time.strftime("%Y%m%d-%H%M%S"))
+    target.mkdir(parents=True, exist_ok=True)
+    budget = IOBudget(options["max_rate"])
+    threads = max(1, (os.cpu_count() or 1) // max(1, options["jobs"]))
+
+    # Largest first, so the long dumps don't start last
+    sizes = site_db_sizes(bench_root, sites, Database(bench_root))
+    order = sorted(sites, key=lambda site: -sizes.get(site, 0))
+    manifest = {"created": time.time(), "bench": str(bench_root),
+                "compressor": compressor, "sites": {}}
+    lock = threading.Lock()
+
+    def back_up(site):
+        site_dir = target / site
+        site_dir.mkdir(exist_ok=True)
+        shutil.copy2(Path(bench_root) / "sites" / site / "site_config.json", site_dir)
+        files = {}
+        for stem, producer, _, env in site_artifacts(bench_root, site, options["with_files"]):
+            name = stem + suffix
+            ok, checksum, size, error = stream_to_file(
+                producer, env, site_dir / name, compressor, threads, budget)
+            if not ok:
+                return False, f"{stem}: {error}"
+            files[name] = {"sha256": checksum, "bytes": size}
+        with lock:
+            manifest["sites"][site] = {"files": files}
+        return True, _size(sum(entry["bytes"] for entry in files.values()))
+
+    print(f"Backing up {len(order)} site(s) to {target} ({compressor}, {options['jobs']} at a time)",
+          file=sys.stderr)
+    start = time.monotonic()
+    results = Worker(options["jobs"], back_up).run(order)
+    wall_time = time.monotonic() - start
+    for site, result in results.items():
+        entry = manifest["sites"].setdefault(site, {"files": {}})
+        entry["state"] = result["state"]
+        entry["duration"] = round(result["duration"], 2)
+        if result["state"] != OK:
+            entry["error"] = result["detail"]
+    save_json(target / "manifest.json", manifest)
+
+    total = sum(f["bytes"] for entry in manifest["sites"].values() for f in entry["files"].values())
+    failed = [site for site, result in results.items() if result["state"] != OK]
+    print_summary(results, wall_time, options["jobs"], title="Backup summary",
+                  retry_hint=f"beam backup --stream --sites {','.join(failed)}")
+    print(f"  Wrote {_size(total)} in {format_duration(wall_time)} "
+          f"({_size(total / wall_time if wall_time else 0)}/s) - manifest: {target / 'manifest.json'}")
+    return 1 if failed else 0
+
+
+def restore_sites(bench_root, backup_dir, options):
+    """Restore or verify sites from a backup directory; returns the exit code"""
+    from beam.fanout import OK, list_sites, print_summary
+    from beam.state import load_json
+
+    backup_dir = Path(backup_dir)
+    manifest = load_json(backup_dir / "manifest.json")
+    if not manifest:
+        print(f"Error: no manifest.json in {backup_dir}", file=sys.stderr)
+        return 1
+    available = [site for site, entry in manifest["sites"].items() if entry.get("state") == OK]
+    sites = [site for site in available if not options["names"] or site in options["names"]]
+    if not options["verify"]:
+        existing = set(list_sites(bench_root))
+        missing = [site for site in sites if site not in existing]
+        if missing:
+            print(f"Error: create these sites before restoring: {', '.join(missing)}", file=sys.stderr)
+            return 1
+    budget = IOBudget(options["max_rate"])
+
+    def restore(site):
+        files = manifest["sites"][site]["files"]
+        consumers = {}
+        if not options["verify"]:
+            consumers = {stem: (consumer, env) for stem, _, consumer, env
+                         in site_artifacts(bench_root, site, with_files=True)}
+        for name, entry in files.items():
+            path = backup_dir / site / name
+            stem = name.rsplit(".", 1)[0]
+            if options["verify"] or (stem != "database.sql" and not options["with_files"]):
+                if options["verify"] and file_checksum(path, budget) != entry["sha256"]:
+                    return False, f"{name}: checksum mismatch"
+                continue
+            if stem not in consumers:
+                return False, f"{name}: nothing to restore it into"
+            consumer, env = consumers[stem]
+            ok, checksum, error = stream_from_file(path, consumer, env, budget)
+            if not ok:
+                return False, f"{name}: {error}"
+            if checksum != entry["sha256"]:
+                return False, f"{name}: checksum mismatch (restored data may be incomplete)"
+        return True, "verified" if options["verify"] else "restored"
+
+    action = "Verifying" if options["verify"] else "Restoring"
+    print(f"{action} {len(sites)} site(s) from {backup_dir}", file=sys.stderr)
+    start = time.monotonic()
+    results = Worker(options["jobs"], restore).run(sites)
+    failed = [site for site, result in results.items() if result["state"] != OK]
+    print_summary(results, time.monotonic() - start, options["jobs"],
+                  title="Verify summary" if options["verify"] else "Restore summary",
+                  retry_hint=f"beam restore --stream {backup_dir} --sites {','.join(failed)}")
+    return 1 if failed else 0
+
+
+def parse_args(args):
+    options = {"names": None, "patterns": [], "tags": [], "jobs": DEFAULT_JOBS,
+               "max_rate": None, "with_files": False, "backup_path": None,
+               "compressor": None, "verify": False, "source": None}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        value = args[index + 1] if index + 1 < len(args) else None
+        takes_value = True
+        if arg == "--sites":
+            from beam.fanout import read_site_list
+            options["names"] = (options["names"] or []) + read_site_list(value or "")
+        elif arg == "--glob":
+            options["patterns"] += [p for p in (value or "").split(",") if p]
+        elif arg == "--tag":
+            options["tags"] += [t for t in (value or "").split(",") if t]
+        elif arg in ("--jobs", "-j"):
+            options["jobs"] = int(value or 0)
+        elif arg == "--max-rate":
+            options["max_rate"] = float(value or 0) * 1024 * 1024
+        elif arg == "--backup-path":
+            options["backup_path"] = value
+        elif arg == "--compressor":
+            options["compressor"] = value
+        else:
+            takes_value = False
+            if arg == "--with-files":
+                options["with_files"] = True
+            elif arg == "--verify":
+                options["verify"] = True
+            elif arg == "--stream":
+                pass
+            elif not arg.startswith("-") and options["source"] is None:
+                options["source"] = arg
+            else:
+                raise ValueError(f"Unknown option: {arg}")
+        if takes_value and value is None:
+            raise ValueError(f"{arg} needs a value")
+        index += 2 if takes_value else 1
+    return options
+
+
+def main(args):
+    """Handle beam backup --stream and beam restore --stream"""
+    command, args = args[0], args[1:]
+    if "--help" in args or "-h" in args:
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0
+    try:
+        options = parse_args(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    from beam.fanout import find_bench_root, select_sites
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+
+    if command == "restore":
+        if not options["source"]:
+            print(__doc__.split("Usage:")[1].rstrip())
+            return 1
+        return restore_sites(bench_root, options["source"], options)
+
+    if not shutil.which("mariadb-dump") and not shutil.which("mysqldump"):
+        print("Error: mariadb-dump is needed for streaming backups", file=sys.stderr)
+        return 1
+    try:
+        sites = select_sites(bench_root, options["names"], options["patterns"], options["tags"])
+        return backup_sites(bench_root, sites, options) if sites else 0
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
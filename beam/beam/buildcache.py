@@ -0,0 +1,429 @@
+"""
+Content-addressed cache for built app assets
+
+`beam build` wraps `bench build`. For each app it computes a key from the
+app's source tree, frappe's source tree (which provides the build
+tooling), the Node.js version and the build flags. Apps whose key is in the
+cache have their public/dist restored (hardlinked from the cache where
+possible) and their entries merged back into sites/assets/assets.json;
+only the remaining apps are handed to bench build, and their output is
+stored for next time - on this bench or any other bench on the host.
+
+The cache lives in $BEAM_BUILD_CACHE (default: build-cache in beam's state
+directory) and is trimmed least-recently-used first to
+$BEAM_BUILD_CACHE_SIZE megabytes (default 2048). Cached files are
+read-only; bench build replaces dist/ rather than writing into it, so a
+restored hardlink never changes the cached copy.
+
+Usage:
+    beam build [--app APP | --apps a,b] [bench build options] [--no-cache]
+    beam cache stats
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+
+KEY_VERSION = "1"
+
+DEFAULT_MAX_SIZE_MB = 2048
+
+# bench build options that change the output, and so belong in the key
+OUTPUT_FLAGS = {"--production", "--hard-link", "--using-cached", "--skip-frappe"}
+
+ASSET_MANIFESTS = ["assets.json", "assets-rtl.json"]
+
+
+def cache_dir():
+    override = os.environ.get("BEAM_BUILD_CACHE")
+    if override:
+        path = Path(override)
+    else:
+        from beam.state import state_dir
+        path = state_dir() / "build-cache"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def max_size():
+    try:
+        return int(os.environ.get("BEAM_BUILD_CACHE_SIZE", DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+    except ValueError:
+        return DEFAULT_MAX_SIZE_MB * 1024 * 1024
+
+
+# ---------------------------------------------------------------------------
+# Keys
+# ---------------------------------------------------------------------------
+
+def _git(app_dir, *args):
+    import subprocess
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(app_dir)] + list(args),
+            capture_output=True, timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _is_output(path):
+    """Build output and installed packages are never part of the source"""
+    parts = path.replace(os.sep, "/").split("/")
+    return "node_modules" in parts or any(
+        parts[i] == "public" and parts[i + 1] == "dist" for i in range(len(parts) - 1)
+    )
+
+
+def source_hash(app_dir):
+    """Git tree id for a clean checkout, else a hash of every source file"""
+    status = _git(app_dir, "status", "--porcelain", "-z")
+    if status is not None:
+        changed = [
+            entry[3:] for entry in status.decode("utf-8", "surrogateescape").split("\0")
+            if len(entry) > 3
+        ]
+        if not [path for path in changed if not _is_output(path)]:
+            tree = _git(app_dir, "rev-parse", "HEAD^{tree}")
+            if tree:
+                return "tree:" + tree.decode().strip()
+
+    # Local changes or not a git checkout: hash the files themselves
+    digest = hashlib.sha256()
+    listing = _git(app_dir, "ls-files", "-co", "--exclude-standard", "-z")
+    if listing is not None:
+        paths = listing.decode("utf-8", "surrogateescape").split("\0")
+    else:
+        paths = [
+            os.path.relpath(os.path.join(root, name), app_dir)
+            for root, _, files in os.walk(app_dir)
+            for name in files
+        ]
+    paths = sorted(path for path in paths if path and not _is_output(path))
+    for path in paths:
+        try:
+            with open(os.path.join(app_dir, path), "rb") as f:
+                digest.update(path.encode("utf-8", "surrogateescape") + b"\0")
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            continue
+    return "files:" + digest.hexdigest()
+
+
+def cache_key(app, sources, node_version, flags):
+    """Key for one app's build output"""
+    parts = [
+        KEY_VERSION,
+        app,
+        sources[app],
+        sources.get("frappe", ""),
+        node_version or "",
+        " ".join(sorted(flags)),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Bench layout
+# ---------------------------------------------------------------------------
+
+def public_dir(bench_root, app):
+    """The app's public/ directory (sites/assets/<app> links to it)"""
+    link = Path(bench_root) / "sites" / "assets" / app
+    if link.is_symlink() or link.is_dir():
+        return link.resolve()
+    return Path(bench_root) / "apps" / app / app.replace("-", "_") / "public"
+
+
+def read_manifest(bench_root, name):
+    from beam.state import load_json
+    return load_json(Path(bench_root) / "sites" / "assets" / name, {})
+
+
+def app_entries(manifest, app):
+    """The assets.json entries that point into one app"""
+    prefix = f"/assets/{app}/"
+    return {key: value for key, value in manifest.items() if str(value).startswith(prefix)}
+
+
+# ---------------------------------------------------------------------------
+# Cache entries
+# ---------------------------------------------------------------------------
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _link_or_copy(src, dst):
+    """Hardlink when the cache and bench share a filesystem, else copy"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _make_read_only(path):
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                os.chmod(os.path.join(root, name), 0o444)
+            except OSError:
+                pass
+
+
+def store(bench_root, app, key, build_seconds):
+    """Copy an app's freshly built assets into the cache"""
+    entry = cache_dir() / key
+    if entry.exists():
+        return
+    tmp = cache_dir() / f".{key}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+
+    dist = public_dir(bench_root, app) / "dist"
+    if dist.is_dir():
+        shutil.copytree(dist, tmp / "dist", symlinks=True)
+        _make_read_only(tmp / "dist")
+    meta = {
+        "app": app,
+        "created": time.time(),
+        "build_seconds": round(build_seconds, 2),
+        "size": _tree_size(tmp),
+        "manifests": {
+            name: app_entries(read_manifest(bench_root, name), app)
+            for name in ASSET_MANIFESTS
+        },
+    }
+    with open(tmp / "entry.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # Another bench stored the same key first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def lookup(key):
+    """Metadata of a cached entry, or None"""
+    from beam.state import load_json
+    return load_json(cache_dir() / key / "entry.json")
+
+
+def restore(bench_root, app, key, meta):
+    """Put a cached build in place of the app's dist/; returns the manifest entries"""
+    entry = cache_dir() / key
+    dist = public_dir(bench_root, app) / "dist"
+    if dist.is_symlink() or dist.is_file():
+        dist.unlink()
+    elif dist.exists():
+        shutil.rmtree(dist)
+    if (entry / "dist").is_dir():
+        dist.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copytree(entry / "dist", dist, symlinks=True, copy_function=_link_or_copy)
+
+    # bench build links sites/assets/<app> to the public folder; keep that true
+    link = Path(bench_root) / "sites" / "assets" / app
+    if link.is_symlink() and not link.exists():
+        link.unlink()
+    if not link.exists() and dist.parent.is_dir():
+        link.parent.mkdir(parents=True, exist_ok=True)
+        link.symlink_to(dist.parent)
+
+    # Mark as recently used for LRU eviction
+    os.utime(entry / "entry.json")
+    return meta["manifests"]
+
+
+def merge_manifests(bench_root, restored):
+    """Write restored apps' entries into sites/assets/assets*.json"""
+    from beam.state import save_json
+    for name in ASSET_MANIFESTS:
+        manifest = read_manifest(bench_root, name)
+        for app, manifests in restored.items():
+            for key in app_entries(manifest, app):
+                del manifest[key]
+            manifest.update(manifests.get(name, {}))
+        save_json(Path(bench_root) / "sites" / "assets" / name, manifest)
+
+
+def entries():
+    """(key, meta, last used) for every cached build"""
+    found = []
+    for entry in cache_dir().iterdir():
+        if entry.name.startswith("."):
+            continue
+        meta = lookup(entry.name)
+        if meta is None:
+            continue
+        found.append((entry.name, meta, (entry / "entry.json").stat().st_mtime))
+    return found
+
+
+def evict(limit=None):
+    """Drop least recently used entries until the cache fits; returns bytes freed"""
+    limit = max_size() if limit is None else limit
+    cached = sorted(entries(), key=lambda item: item[2])
+    total = sum(meta["size"] for _, meta, _ in cached)
+    freed = 0
+    for key, meta, _ in cached:
+        if total <= limit:
+            break
+        _remove_entry(cache_dir() / key)
+        total -= meta["size"]
+        freed += meta["size"]
+    return freed
+
+
+def _remove_entry(path):
+    def make_writable(func, target, _):
+        os.chmod(os.path.dirname(target), 0o755)
+        os.chmod(target, 0o644)
+        func(target)
+    shutil.rmtree(path, onerror=make_writable)
+
+
+# ---------------------------------------------------------------------------
+# Statistics
+# ---------------------------------------------------------------------------
+
+def stats_file():
+    return cache_dir() / "stats.json"
+
+
+def record_stats(hits, misses, saved_seconds):
+    from beam.state import load_json, save_json
+    stats = load_json(stats_file(), {})
+    stats["hits"] = stats.get("hits", 0) + hits
+    stats["misses"] = stats.get("misses", 0) + misses
+    stats["saved_seconds"] = round(stats.get("saved_seconds", 0) + saved_seconds, 2)
+    try:
+        save_json(stats_file(), stats)
+    except OSError:
+        pass
+
+
+def show_stats():
+    from beam.fanout import format_duration
+    from beam.state import load_json
+
+    stats = load_json(stats_file(), {})
+    cached = entries()
+    size = sum(meta["size"] for _, meta, _ in cached)
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    rate = f" ({hits * 100 // (hits + misses)}% hit rate)" if hits + misses else ""
+    print(f"Build cache: {cache_dir()}")
+    print(f"  Entries:    {len(cached)} ({size / 1024 / 1024:.1f} MB of {max_size() / 1024 / 1024:.0f} MB)")
+    print(f"  Hits:       {hits}")
+    print(f"  Misses:     {misses}{rate}")
+    print(f"  Time saved: {format_duration(stats.get('saved_seconds', 0))}")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# beam build
+# ---------------------------------------------------------------------------
+
+def parse_args(args):
+    """Apps to build, flags for the key, and the rest for bench"""
+    apps = None
+    passthrough = []
+    use_cache = True
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg in ("--app", "--apps") and index + 1 < len(args):
+            apps = (apps or []) + [a for a in args[index + 1].split(",") if a]
+            index += 2
+            continue
+        if arg == "--no-cache":
+            use_cache = False
+        else:
+            passthrough.append(arg)
+        index += 1
+    flags = [arg for arg in passthrough if arg in OUTPUT_FLAGS]
+    return apps, flags, passthrough, use_cache
+
+
+def build(args):
+    """Handle beam build"""
+    from beam.cli import ensure_bench_installed, forward_to_bench
+    from beam.fanout import find_bench_root, format_duration
+
+    apps, flags, passthrough, use_cache = parse_args(args)
+    bench_root = find_bench_root()
+    # Options we don't understand (or no bench at all) go straight to bench
+    unknown = [arg for arg in passthrough if arg not in OUTPUT_FLAGS and arg != "--verbose"]
+    if not use_cache or bench_root is None or unknown:
+        return forward_to_bench(["build"] + [arg for arg in args if arg != "--no-cache"])
+    ensure_bench_installed()
+
+    from beam.envfacts import get_fact
+    from beam.fanout import list_apps
+    apps = apps or list_apps(bench_root)
+    names = set(apps) | {"frappe"}
+    sources = {
+        app: source_hash(Path(bench_root) / "apps" / app)
+        for app in names if (Path(bench_root) / "apps" / app).is_dir()
+    }
+    node_version = get_fact("node_version")
+    keys = {app: cache_key(app, sources, node_version, flags) for app in apps if app in sources}
+
+    restored = {}
+    saved = 0.0
+    misses = []
+    for app in apps:
+        meta = lookup(keys[app]) if app in keys else None
+        if meta is None:
+            misses.append(app)
+            continue
+        try:
+            restored[app] = restore(bench_root, app, keys[app], meta)
+        except OSError as e:
+            print(f"⚠️  {app}: could not restore cached assets ({e})", file=sys.stderr)
+            misses.append(app)
+            continue
+        saved += meta.get("build_seconds", 0)
+        print(f"✓ {app}: restored from cache (saves ~{format_duration(meta.get('build_seconds', 0))})")
+    if restored:
+        merge_manifests(bench_root, restored)
+
+    code = 0
+    if misses:
+        start = time.monotonic()
+        code = forward_to_bench(["build", "--apps", ",".join(misses)] + passthrough)
+        elapsed = time.monotonic() - start
+        if code == 0:
+            for app in misses:
+                if app in keys:
+                    # One bench build covers every missed app; share its time out
+                    store(bench_root, app, keys[app], elapsed / len(misses))
+            evict()
+
+    record_stats(len(restored), len(misses), saved)
+    print(f"Build cache: {len(restored)} hit(s), {len(misses)} miss(es)"
+          + (f", ~{format_duration(saved)} saved" if saved else ""))
+    return code
+
+
+def clear():
+    """Remove every cached build"""
+    for key, _, _ in entries():
+        _remove_entry(cache_dir() / key)
+    try:
+        stats_file().unlink()
+    except FileNotFoundError:
+        pass
+    print("✓ Build cache cleared")
+    return 0
@@ -0,0 +1,55 @@
+"""
+Host-wide caches shared by every bench
+
+Usage:
+    beam cache stats                  Show cache sizes and hit rates
+    beam cache prune [--max-size MB]  Trim the caches, least recently used first
+    beam cache clear                  Remove every cached build
+"""
+import sys
+
+
+def show_stats():
+    from beam import buildcache, packagecache
+    buildcache.show_stats()
+    print(f"\nPackage caches: {packagecache.cache_dir()}")
+    for name, size in packagecache.sizes().items():
+        print(f"  {name + ':':<14}{size / 1024 / 1024:.1f} MB")
+    print(f"  {'wheels:':<14}{len(packagecache.wheelhouse_contents())}")
+    print(f"  {'limit:':<14}{packagecache.max_size() / 1024 / 1024:.0f} MB")
+    return 0
+
+
+def prune(args):
+    from beam import buildcache, packagecache
+
+    limit = None
+    if "--max-size" in args:
+        try:
+            limit = int(args[args.index("--max-size") + 1]) * 1024 * 1024
+        except (IndexError, ValueError):
+            print("Error: --max-size needs a size in MB", file=sys.stderr)
+            return 1
+    freed_packages = packagecache.prune(limit)
+    freed_builds = buildcache.evict(limit)
+    print(f"✓ Freed {freed_packages / 1024 / 1024:.1f} MB of packages "
+          f"and {freed_builds / 1024 / 1024:.1f} MB of builds")
+    return 0
+
+
+def main(args):
+    """Handle beam cache command"""
+    command = args[0] if args else "stats"
+    if command == "stats":
+        return show_stats()
+    if command == "prune":
+        return prune(args[1:])
+    if command == "clear":
+        from beam import buildcache
+        return buildcache.clear()
+    print(__doc__.split("Usage:")[1].rstrip())
+    return 0 if command in ("--help", "-h", "help") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
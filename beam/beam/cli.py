@@ -1,147 +1,199 @@
 """
 Beam CLI - Main entry point that wraps bench commands and adds SaaS functionality
+
+Only sys and os are imported at module load. Everything else is imported
+inside the function that needs it, so `beam --version`, `beam --help` and
+SaaS commands start without paying for subprocess, threading or re.
 """
 import sys
-import subprocess
-import shutil
-import platform
 import os
-import re
-import threading
-from pathlib import Path
 
 
-def filter_output(text):
-    """Replace frappe/bench references with beam in output text"""
-    if not text:
-        return text
-    
-    # Replacements - case sensitive patterns
-    replacements = [
-        # URLs and paths - preserve structure but rebrand
-        (r'frappe-bench', 'beam'),
-        (r'frappe_bench', 'beam'),
-        
-        # Common phrases
-        (r'Frappe Framework', 'Beam Framework'),
-        (r'frappe framework', 'beam framework'),
-        (r'Frappe Bench', 'Beam'),
-        (r'frappe bench', 'beam'),
-        (r'frappe-bench', 'beam'),
-        
-        # Standalone words (case variations)
-        (r'\bFrappe\b', 'Beam'),
-        (r'\bfrappe\b', 'beam'),
-        (r'\bBench\b', 'Beam'),
-        (r'\bbench\b', 'beam'),
-        
-        # Command references
-        (r"'bench'", "'beam'"),
-        (r'"bench"', '"beam"'),
-        (r'`bench`', '`beam`'),
-        (r"'frappe'", "'beam'"),
-        (r'"frappe"', '"beam"'),
-        (r'`frappe`', '`beam`'),
-    ]
-    
-    result = text
-    for pattern, replacement in replacements:
-        result = re.sub(pattern, replacement, result)
-    
-    return result
+IS_WINDOWS = sys.platform == "win32"
+
+
+def __getattr__(name):
+    # beam.cli.filter_output is kept importable without loading re up front
+    if name == "filter_output":
+        from beam.rebrand import filter_output
+        return filter_output
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def print_filtered(text, file=None):
     """Print text with frappe/bench references replaced"""
     if text:
+        from beam.rebrand import filter_output
         filtered = filter_output(text)
         print(filtered, end='', file=file or sys.stdout)
 
 
 def is_git_bash():
     """Check if running in Git Bash"""
-    # Git Bash sets these environment variables
-    return (
-        os.environ.get("MSYSTEM", "").startswith("MINGW") or
-        "Git" in os.environ.get("SHELL", "") or
-        "bash.exe" in os.environ.get("_", "")
-    )
+    from beam.envfacts import get_fact
+    return get_fact("git_bash")
 
 
 def is_wsl_available():
-    """Check if WSL is available on Windows"""
-    if platform.system() != "Windows":
+    """Check if WSL is available on Windows (probed once, then cached)"""
+    if not IS_WINDOWS:
         return False
+    from beam.envfacts import get_fact
+    return get_fact("wsl_available")
+
+
+WSL_DISTRO = "Ubuntu"
+
+# Where beam usually lives inside WSL, most likely first
+# Note: /mnt/c/ is standard, /mnt/host/c/ is used by some WSL2 configurations
+WSL_BEAM_CANDIDATES = [
+    "/mnt/c/Users/LDT/frappe/beam/.venv/bin/beam",
+    "/mnt/host/c/Users/LDT/frappe/beam/.venv/bin/beam",
+    "~/.local/bin/beam",
+    "/usr/local/bin/beam",
+    "/usr/bin/beam",
+]
+
+# Exit code of the WSL launcher when the cached beam path no longer exists
+WSL_MISSING_BEAM = 199
+
+# Checks every candidate and falls back to PATH in one wsl round trip
+WSL_PROBE_SCRIPT = (
+    'for p in "$@"; do '
+    'case "$p" in "~/"*) p="$HOME/${p#"~/"}";; esac; '
+    'if [ -x "$p" ]; then echo "$p"; exit 0; fi; '
+    'done; '
+    'command -v beam'
+)
+
+# Existence check and exec in the same process that runs the command
+WSL_LAUNCH_SCRIPT = f'[ -x "$0" ] || exit {WSL_MISSING_BEAM}; exec "$0" "$@"'
+
+
+def to_wsl_path(path):
+    """Convert a Windows path like C:\\Users\\me to /mnt/c/Users/me"""
+    if len(path) >= 2 and path[1] == ":":
+        rest = path[2:].replace("\\", "/").lstrip("/")
+        return f"/mnt/{path[0].lower()}/{rest}"
+    return path.replace("\\", "/")
+
+
+def wsl_beam_candidates():
+    """Candidate beam paths, starting with the venv next to this source tree"""
+    source_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    local_venv = to_wsl_path(source_dir) + "/.venv/bin/beam"
+    return [local_venv] + [path for path in WSL_BEAM_CANDIDATES if path != local_venv]
+
+
+def wsl_beam_cache_file():
+    from beam.state import state_dir
+    return state_dir() / "wsl_beam_path.json"
+
+
+def probe_wsl_beam_path():
+    """Find beam inside WSL with a single wsl invocation"""
+    import subprocess
+    
     try:
         result = subprocess.run(
-            ["wsl", "--status"],
+            ["wsl", "-d", WSL_DISTRO, "sh", "-c", WSL_PROBE_SCRIPT, "sh"] + wsl_beam_candidates(),
             capture_output=True,
-            timeout=5
+            text=True,
+            timeout=10
         )
-        return result.returncode == 0
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    path = result.stdout.strip()
+    return path if result.returncode == 0 and path else None
 
 
-def get_wsl_beam_path():
-    """Get the path to beam in WSL"""
-    # Convert Windows path to WSL path
-    current_path = os.path.abspath(os.getcwd())
-    if current_path.startswith("C:\\"):
-        wsl_path = current_path.replace("C:\\", "/mnt/c/").replace("\\", "/")
-    elif current_path.startswith("C:"):
-        wsl_path = current_path.replace("C:", "/mnt/c").replace("\\", "/")
-    else:
-        # Try to find beam installation
-        wsl_path = "~/.local/bin/beam"
-    
-    return wsl_path
-
-
-def get_wsl_beam_path():
-    """Get the path to beam executable in WSL"""
-    # Try common locations - check /mnt/c/ first (most common)
-    # Note: /mnt/c/ is standard, /mnt/host/c/ is used by some WSL2 configurations
-    possible_paths = [
-        "/mnt/c/Users/LDT/frappe/beam/.venv/bin/beam",  # Standard WSL path
-        "/mnt/host/c/Users/LDT/frappe/beam/.venv/bin/beam",  # Alternative WSL2 path
-        "~/.local/bin/beam",
-        "/usr/local/bin/beam",
-        "/usr/bin/beam",
-    ]
+def get_wsl_beam_path(refresh=False):
+    """Get the path to beam executable in WSL, using the on-disk cache"""
+    from beam.state import load_json, save_json
     
-    # Check which one exists using Ubuntu distribution
-    for path in possible_paths:
+    cache_file = wsl_beam_cache_file()
+    if not refresh:
+        cached = load_json(cache_file, {})
+        if cached.get("distro") == WSL_DISTRO and cached.get("path"):
+            return cached["path"]
+    
+    path = probe_wsl_beam_path()
+    if path:
+        save_json(cache_file, {"distro": WSL_DISTRO, "path": path})
+    else:
         try:
-            # Use sh -c to properly execute the test command
-            result = subprocess.run(
-                ["wsl", "-d", "Ubuntu", "sh", "-c", f"test -f '{path}'"],
-                capture_output=True,
-                timeout=2
-            )
-            if result.returncode == 0:
-                return path
-        except:
-            continue
+            cache_file.unlink()
+        except FileNotFoundError:
+            pass
+    return path
+
+
+def build_wsl_command(beam_path, args):
+    """wsl command line that runs beam with the given arguments"""
+    if beam_path:
+        return ["wsl", "-d", WSL_DISTRO, "sh", "-c", WSL_LAUNCH_SCRIPT, beam_path] + args
+    # Fallback: try just "beam" (might be in PATH)
+    return ["wsl", "-d", WSL_DISTRO, "beam"] + args
+
+
+def stream_wsl_command(wsl_cmd, on_stderr=None):
+    """Run a wsl command with rebranded streaming output. Returns the exit code."""
+    import subprocess
+    from beam.streaming import stream_process
+    
+    process = subprocess.Popen(
+        wsl_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0  # Raw bytes - beam.streaming does the buffering
+    )
     
-    # If none found, try to find it using which
     try:
-        result = subprocess.run(
-            ["wsl", "-d", "Ubuntu", "which", "beam"],
-            capture_output=True,
-            text=True,
-            timeout=2
+        # Stream both pipes with chunked reads, rebranding and batched writes
+        return stream_process(process, on_stderr=on_stderr)
+    except KeyboardInterrupt:
+        process.terminate()
+        process.wait()
+        raise
+
+
+def run_wsl_beam(beam_path, args, on_stderr=None):
+    """Run beam inside WSL, via the long-lived broker when possible. Returns the exit code."""
+    if os.environ.get("BEAM_NO_WSL_BROKER") != "1" and not needs_console(args):
+        from beam.wsl_broker import run_via_broker
+        return_code = run_via_broker(
+            [beam_path or "beam"] + args,
+            to_wsl_path(os.getcwd()),
+            missing_code=WSL_MISSING_BEAM,
+            on_stderr=on_stderr
         )
-        if result.returncode == 0:
-            return result.stdout.strip()
-    except:
-        pass
+        if return_code is not None:
+            return return_code
     
-    return None
+    # A live broker session proves WSL works; a plain wsl launch checks first
+    ensure_wsl_running()
+    return stream_wsl_command(build_wsl_command(beam_path, args), on_stderr=on_stderr)
 
 
-def run_in_wsl(args):
-    """Run beam command in WSL, hiding bench completely"""
+def refresh_env():
+    """Forget cached environment facts and probe again (beam --refresh-env)"""
+    from beam import envfacts
+    envfacts.clear()
+    if not IS_WINDOWS:
+        print("✓ Cached environment facts cleared")
+        return 0
+    path = get_wsl_beam_path(refresh=True)
+    if path:
+        print(f"✓ Beam found in WSL: {path}")
+        return 0
+    print("⚠️  Beam not found in WSL - commands will try 'beam' from the WSL PATH", file=sys.stderr)
+    return 1
+
+
+def ensure_wsl_running():
+    """Exit with a helpful message if WSL is missing or Ubuntu won't respond"""
+    import subprocess
+    
     # Check if WSL is available
     if not is_wsl_available():
         print(
@@ -185,112 +237,41 @@ def run_in_wsl(args):
     except Exception as e:
         # Continue anyway - might work
         pass
+
+
+def run_in_wsl(args):
+    """Run beam command in WSL, hiding bench completely"""
+    from beam.diagnostics import ErrorClassifier, report
     
-    # Try to find beam in WSL
+    # Try to find beam in WSL (cached after the first successful probe)
     beam_path = get_wsl_beam_path()
     
-    if beam_path:
-        # Use full path to beam with Ubuntu distribution
-        wsl_cmd = ["wsl", "-d", "Ubuntu", beam_path] + args
-    else:
-        # Fallback: try just "beam" (might be in PATH)
-        wsl_cmd = ["wsl", "-d", "Ubuntu", "beam"] + args
-    
     # Execute in WSL with real-time streaming output
     try:
-        process = subprocess.Popen(
-            wsl_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1  # Line buffered
-        )
-        
-        # Track output for error detection
-        stderr_lines = []
-        
-        def stream_stdout(pipe):
-            """Stream and filter stdout line by line"""
-            try:
-                for line in iter(pipe.readline, ''):
-                    if line:
-                        filtered_line = filter_output(line)
-                        print(filtered_line, end='', flush=True)
-            except:
-                pass
-            finally:
-                pipe.close()
-        
-        def stream_stderr(pipe):
-            """Stream and filter stderr line by line, also capture for error detection"""
-            try:
-                for line in iter(pipe.readline, ''):
-                    if line:
-                        stderr_lines.append(line)
-                        filtered_line = filter_output(line)
-                        print(filtered_line, end='', file=sys.stderr, flush=True)
-            except:
-                pass
-            finally:
-                pipe.close()
-        
-        # Start threads for stdout and stderr
-        stdout_thread = threading.Thread(target=stream_stdout, args=(process.stdout,))
-        stderr_thread = threading.Thread(target=stream_stderr, args=(process.stderr,))
-        
-        stdout_thread.daemon = True
-        stderr_thread.daemon = True
-        stdout_thread.start()
-        stderr_thread.start()
-        
-        # Wait for process to complete
-        return_code = process.wait()
+        # Stderr is classified line by line as it streams past
+        classifier = ErrorClassifier("wsl")
+        return_code = run_wsl_beam(beam_path, args, on_stderr=classifier.feed)
         
-        # Wait for output threads to finish
-        stdout_thread.join(timeout=1)
-        stderr_thread.join(timeout=1)
+        if return_code == WSL_MISSING_BEAM and beam_path:
+            # Cached path has gone away (venv moved or removed) - probe again
+            beam_path = get_wsl_beam_path(refresh=True)
+            classifier = ErrorClassifier("wsl")
+            return_code = run_wsl_beam(beam_path, args, on_stderr=classifier.feed)
         
-        # Check for specific error conditions after process completes
-        stderr_text = ''.join(stderr_lines)
-        
-        # Check for WSL service errors
-        if "Catastrophic failure" in stderr_text or "E_UNEXPECTED" in stderr_text:
-            print(
-                "\n❌ WSL Service Error\n"
-                "WSL is having issues. Try these steps:\n\n"
-                "1. Restart WSL service:\n"
-                "   wsl --shutdown\n"
-                "   wsl -d Ubuntu\n\n"
-                "2. If that doesn't work, restart your computer\n\n"
-                "3. Then try beam again",
-                file=sys.stderr
-            )
+        if return_code == WSL_MISSING_BEAM:
+            from beam.diagnostics import BEAM_NOT_FOUND_IN_WSL
+            print(BEAM_NOT_FOUND_IN_WSL, file=sys.stderr)
             return 1
         
-        # If beam command not found, provide helpful message
-        if return_code != 0 and ("not found" in stderr_text.lower() or "command not found" in stderr_text.lower()):
-            print(
-                "\n❌ Beam Not Found in WSL\n"
-                "Beam needs to be installed in WSL to work from PowerShell.\n\n"
-                "Quick Setup (One Time Only):\n"
-                "  1. Open Ubuntu WSL: wsl -d Ubuntu\n"
-                "  2. Navigate to beam: cd /mnt/c/Users/LDT/frappe/beam\n"
-                "  3. Create venv: python3 -m venv .venv\n"
-                "  4. Activate: source .venv/bin/activate\n"
-                "  5. Install: pip install -e .\n"
-                "  6. Add to PATH: echo 'export PATH=\"\\$PATH:/mnt/c/Users/LDT/frappe/beam/.venv/bin\"' >> ~/.bashrc\n"
-                "  7. Close WSL and use beam from PowerShell\n\n"
-                "See SETUP_UBUNTU.md for detailed instructions.",
-                file=sys.stderr
-            )
-            return 1
+        # WSL service errors, beam missing in WSL, services down, ...
+        diagnosis = classifier.finish(return_code)
+        if diagnosis is not None:
+            report(diagnosis)
+            return return_code or 1
         
         return return_code
         
     except KeyboardInterrupt:
-        if 'process' in locals():
-            process.terminate()
-            process.wait()
         return 130
     except Exception as e:
         print(f"Error running in WSL: {e}", file=sys.stderr)
@@ -299,7 +280,9 @@ def run_in_wsl(args):
 
 def ensure_bench_installed():
     """Check if bench is installed, if not, provide helpful error message"""
-    bench_path = shutil.which("bench")
+    from beam.envfacts import get_fact
+    # A cached path is trusted only while the file is still there
+    bench_path = get_fact("bench_path", validate=lambda path: bool(path) and os.path.exists(path))
     if not bench_path:
         print(
             "Error: Beam core dependencies not found.\n"
@@ -316,6 +299,7 @@ def is_saas_command(args):
     """Check if the command is a SaaS-specific command"""
     saas_commands = [
         "deploy",
+        "provision",
         "scale",
         "monitor",
         "logs",
@@ -332,6 +316,9 @@ def handle_saas_command(args):
     if command == "deploy":
         from beam.saas import deploy
         return deploy.main(args[1:])
+    elif command == "provision":
+        from beam.saas import provision
+        return provision.main(args[1:])
     elif command == "scale":
         from beam.saas import scale
         return scale.main(args[1:])
@@ -353,54 +340,145 @@ def handle_saas_command(args):
         return 1
 
 
+# Interactive or long-running commands that want a real terminal
+PTY_COMMANDS = [
+    "start",
+    "console",
+    "serve",
+    "watch",
+    "worker",
+    "schedule",
+]
+
+# Commands whose output never mentions frappe/bench - hand over the process
+EXEC_COMMANDS = [
+    "mariadb",
+    "postgres",
+    "db-console",
+]
+
+# Commands that may prompt (passwords, confirmations, sudo)
+PROMPT_COMMANDS = [
+    "new-site",
+    "drop-site",
+    "reinstall",
+    "restore",
+    "set-admin-password",
+    "uninstall-app",
+    "remove-app",
+    "setup",
+    "restart",
+]
+
+
+def needs_console(args):
+    """True if the command may read the console, which the WSL broker can't pass on"""
+    # Piped input only reaches the command through a direct wsl launch
+    if sys.stdin is None or not sys.stdin.isatty():
+        return True
+    return get_bench_subcommand(args) in PTY_COMMANDS + EXEC_COMMANDS + PROMPT_COMMANDS
+
+
+# Commands that install Python and Node packages
+PACKAGE_COMMANDS = [
+    "init",
+    "get-app",
+]
+
+
+def is_package_install(args):
+    """True for commands that should use the shared package caches"""
+    command = get_bench_subcommand(args)
+    if command in PACKAGE_COMMANDS:
+        return True
+    return command == "setup" and "requirements" in args
+
+
+def get_bench_subcommand(args):
+    """Return the bench subcommand, skipping global options like --site"""
+    skip_next = False
+    for arg in args:
+        if skip_next:
+            skip_next = False
+        elif arg == "--site":
+            skip_next = True
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+def choose_forward_mode(args):
+    """Pick how to run bench: 'pipe', 'pty' or 'exec'"""
+    mode = os.environ.get("BEAM_FORWARD_MODE", "").lower()
+    if mode in ("pipe", "pty", "exec"):
+        return mode
+    
+    # PTY and exec only make sense when a person is watching a terminal
+    if os.name == "nt" or not sys.stdout.isatty():
+        return "pipe"
+    
+    command = get_bench_subcommand(args)
+    if command in EXEC_COMMANDS:
+        return "exec"
+    if command in PTY_COMMANDS:
+        return "pty"
+    return "pipe"
+
+
 def forward_to_bench(args):
     """Forward command to bench (bench is completely hidden from user)"""
     # On Windows, run in WSL automatically
-    if platform.system() == "Windows":
+    if IS_WINDOWS:
         return run_in_wsl(args)
     
+    # A warm daemon, when running, already has bench imported
+    if os.environ.get("BEAM_NO_DAEMON") != "1" and choose_forward_mode(args) == "pipe":
+        from beam.daemon import run_via_daemon
+        return_code = run_via_daemon(args)
+        if return_code is not None:
+            return return_code
+    
+    # Opt-in: run bench's CLI inside this interpreter instead of spawning one
+    if os.environ.get("BEAM_INPROCESS") == "1":
+        from beam.inprocess import can_run_inprocess, run_bench_inprocess
+        command = get_bench_subcommand(args)
+        if can_run_inprocess(args, command, PTY_COMMANDS + EXEC_COMMANDS):
+            return run_bench_inprocess(args)
+    
     ensure_bench_installed()
     
     # Build bench command (hidden from user - they only see beam)
     bench_cmd = ["bench"] + args
     
+    mode = choose_forward_mode(args)
+    if mode == "exec":
+        from beam.terminal import exec_command
+        exec_command(bench_cmd)
+    if mode == "pty":
+        from beam.terminal import run_in_pty
+        return run_in_pty(bench_cmd)
+    
+    import subprocess
+    from beam.diagnostics import ErrorClassifier, report
+    from beam.streaming import stream_process
+    
     # Execute bench with real-time output streaming and filtering
     try:
         process = subprocess.Popen(
             bench_cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1  # Line buffered
+            bufsize=0  # Raw bytes - beam.streaming does the buffering
         )
         
-        def stream_output(pipe, output_file):
-            """Stream and filter output line by line"""
-            try:
-                for line in iter(pipe.readline, ''):
-                    if line:
-                        filtered_line = filter_output(line)
-                        print(filtered_line, end='', file=output_file, flush=True)
-            except:
-                pass
-            finally:
-                pipe.close()
-        
-        # Start threads for stdout and stderr
-        stdout_thread = threading.Thread(target=stream_output, args=(process.stdout, sys.stdout))
-        stderr_thread = threading.Thread(target=stream_output, args=(process.stderr, sys.stderr))
-        
-        stdout_thread.daemon = True
-        stderr_thread.daemon = True
-        stdout_thread.start()
-        stderr_thread.start()
-        
-        # Wait for process to complete
-        return_code = process.wait()
+        # Stream both pipes with chunked reads, rebranding and batched writes
+        classifier = ErrorClassifier("bench")
+        return_code = stream_process(process, on_stderr=classifier.feed)
         
-        # Wait for output threads to finish
-        stdout_thread.join(timeout=1)
-        stderr_thread.join(timeout=1)
+        # Known failures (database or Redis down, wrong Node, ...) get a hint
+        diagnosis = classifier.finish(return_code)
+        if diagnosis is not None:
+            report(diagnosis)
         
         return return_code
     except KeyboardInterrupt:
@@ -441,11 +519,84 @@ def main():
         print(f"beam version {__version__}")
         return 0
     
+    # Re-probe cached environment facts
+    if args[0] == "--refresh-env":
+        return refresh_env()
+    
+    # Show cached environment facts
+    if args[0] == "env":
+        from beam import envfacts
+        return envfacts.main(args[1:])
+    
+    # Warm daemon management
+    if args[0] == "daemon":
+        from beam import daemon
+        return daemon.main(args[1:])
+    
+    # Fleet update: bench updates code, beam schedules the site migrations
+    if args[0] == "update" and "--fleet" in args:
+        if IS_WINDOWS:
+            return run_in_wsl(args)
+        from beam import migrations
+        return migrations.update(args[1:])
+    
+    # Cached asset builds
+    if args[0] in ("build", "cache"):
+        if IS_WINDOWS:
+            return run_in_wsl(args)
+        if args[0] == "cache":
+            from beam import cache
+            return cache.main(args[1:])
+        from beam import buildcache
+        return buildcache.build(args[1:])
+    
+    # Apps are fetched through local git mirrors, several at a time
+    if args[0] == "get-app":
+        if IS_WINDOWS:
+            return run_in_wsl(args)
+        from beam import gitmirror
+        return gitmirror.get_apps(args[1:])
+    
+    # Installs go through the host-wide wheel and Node package caches
+    if is_package_install(args):
+        if IS_WINDOWS:
+            return run_in_wsl(args)
+        from beam import packagecache
+        return packagecache.install(args)
+    
+    # Streaming, parallel backups and restores
+    if args[0] in ("backup", "restore") and "--stream" in args:
+        if IS_WINDOWS:
+            return run_in_wsl(args)
+        from beam import backup
+        return backup.main(args)
+    
+    # Production configs are fitted to the host after bench writes them
+    if args[:2] == ["setup", "production"]:
+        if IS_WINDOWS:
+            return run_in_wsl(args)
+        from beam import tuning
+        return tuning.main(args[2:])
+    
+    # One bench command across many sites
+    if args[0] == "fanout":
+        if IS_WINDOWS:
+            return run_in_wsl(args)
+        from beam import fanout
+        return fanout.main(args[1:])
+    
+    # beam start supervises the Procfile itself, without honcho
+    if args[0] == "start":
+        from beam import supervisor
+        return_code = supervisor.main(args[1:])
+        if return_code is not None:
+            return return_code
+    
     # Check if it's a SaaS command
     if is_saas_command(args):
         # On Windows, SaaS commands can run natively or in WSL
         # For now, if on Windows and WSL available, use WSL for consistency
-        if platform.system() == "Windows" and is_wsl_available():
+        if IS_WINDOWS and is_wsl_available():
             return run_in_wsl(args)
         return handle_saas_command(args)
     
@@ -454,57 +605,43 @@ def main():
     return forward_to_bench(args)
 
 
-def show_beam_help():
-    """Show beam-specific help"""
-    is_windows = platform.system() == "Windows"
-    is_gitbash = is_git_bash()
-    windows_note = ""
-    
-    if is_windows:
-        if is_gitbash:
-            windows_note = """
-✅ Git Bash Detected - Beam will automatically use WSL for commands.
-   You can use beam commands directly from Git Bash!
-
-"""
-        elif is_wsl_available():
-            windows_note = """
-✅ WSL Detected - Beam will automatically use WSL for commands.
-   You can use beam commands directly from PowerShell or Git Bash!
-
-"""
-        else:
-            windows_note = """
-⚠️  Windows Detected - WSL Required
-   Beam automatically uses WSL on Windows.
-   Install WSL: wsl --install (run PowerShell as Administrator)
-   Then use beam commands from PowerShell or Git Bash - no need to open WSL!
-
-"""
-    
-    help_text = f"""Beam - SaaS-Ready Application Management Tool
-{windows_note}Usage:
+# Help is a constant: printing it must never wait on WSL or PATH probes
+HELP_TEXT = """Beam - SaaS-Ready Application Management Tool
+{}Usage:
     beam [command] [options]
 
 Core Commands:
     init              Initialize a new beam instance
-    start             Start development processes
+    start             Start development processes (supervised by beam)
     new-site          Create a new site
-    get-app           Download and add an app
+    get-app           Download and add apps (several at once, via local mirrors)
     install-app       Install app on a site
     update            Update beam, apps, and sites
-    setup             Setup production environment
+                      (--fleet: schedule site migrations in parallel)
+    setup             Setup production environment (tuned to the host)
     config            Configure beam settings
+    fanout            Run a command on many sites in parallel
+    backup --stream   Back up many sites in parallel, compressed on the fly
+    restore --stream  Restore sites from a streaming backup
     ... and all other commands
 
 SaaS Commands:
     deploy            Deploy application to cloud
-    scale             Scale application resources
+    provision         Create a tenant site from a template snapshot
+    scale             Autoscale RQ workers to queue depth
     monitor           Monitor application health
     logs              View application logs
-    status            Check application status
+    status            Check database, Redis, sites and processes
     saas              Show SaaS command help
 
+Performance:
+    env               Show cached environment facts and probe times
+    --refresh-env     Re-detect cached environment facts
+    daemon start      Keep a warm beam process for faster commands
+    daemon stop       Stop the warm beam process
+    cache stats       Show build and package cache usage
+    cache prune       Trim the shared caches to their size limits
+
 Examples:
     beam init my-app
     beam new-site example.com
@@ -518,7 +655,49 @@ For more information on a specific command:
 For SaaS-specific help:
     beam saas --help
 """
-    print(help_text)
+
+WSL_NOTE = """
+✅ WSL Detected - Beam will automatically use WSL for commands.
+   You can use beam commands directly from PowerShell or Git Bash!
+
+"""
+
+NO_WSL_NOTE = """
+⚠️  Windows Detected - WSL Required
+   Beam automatically uses WSL on Windows.
+   Install WSL: wsl --install (run PowerShell as Administrator)
+   Then use beam commands from PowerShell or Git Bash - no need to open WSL!
+
+"""
+
+GIT_BASH_NOTE = """
+✅ Git Bash Detected - Beam will automatically use WSL for commands.
+   You can use beam commands directly from Git Bash!
+
+"""
+
+WINDOWS_NOTE = """
+✅ Windows Detected - Beam automatically uses WSL for commands.
+   You can use beam commands directly from PowerShell or Git Bash!
+   If WSL is not installed yet: wsl --install (run PowerShell as Administrator)
+
+"""
+
+
+def show_beam_help():
+    """Show beam-specific help"""
+    windows_note = ""
+    if IS_WINDOWS:
+        # Only environment variables and already-cached facts - no probes
+        from beam.envfacts import peek_fact
+        wsl_available = peek_fact("wsl_available")
+        if is_git_bash():
+            windows_note = GIT_BASH_NOTE
+        elif wsl_available is None:
+            windows_note = WINDOWS_NOTE
+        else:
+            windows_note = WSL_NOTE if wsl_available else NO_WSL_NOTE
+    print(HELP_TEXT.format(windows_note))
 
 
 if __name__ == "__main__":
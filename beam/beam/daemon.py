@@ -0,0 +1,493 @@
+"""
+Warm beam daemon
+
+`beam daemon start` launches a background process that imports bench's CLI
+once and then serves beam invocations over a Unix domain socket. Each
+request is handled zygote-style: the daemon forks a worker, the worker
+forks the command with its stdout/stderr on pipes, and relays rebranded
+output back to the thin client as framed messages.
+
+The client side (run_via_daemon) only needs socket/json/struct, so a warm
+invocation skips interpreter-level imports of bench and click entirely.
+When no daemon is running, or it was started from different beam code,
+the caller falls back to the normal forward_to_bench path. The client's
+stdin is handed to the command over the socket (SCM_RIGHTS); when it is a
+terminal the daemon is skipped, since prompts need a controlling terminal.
+
+Usage:
+    beam daemon start [--idle-timeout SECONDS]
+    beam daemon run [--idle-timeout SECONDS]     (foreground)
+    beam daemon stop
+    beam daemon status
+"""
+import json
+import os
+import socket
+import struct
+import sys
+from pathlib import Path
+
+
+# Frame: 1-byte kind + 4-byte big-endian length + payload
+FRAME_HEADER = struct.Struct(">cI")
+REQUEST = b"r"
+STDOUT = b"o"
+STDERR = b"e"
+EXIT = b"x"
+STALE = b"s"
+
+DEFAULT_IDLE_TIMEOUT = 900
+
+# Modules worth having in memory before the first fork
+PRELOAD_MODULES = [
+    "click",
+    "bench",
+    "bench.cli",
+    "bench.utils",
+    "bench.commands",
+    "beam.cli",
+    "beam.inprocess",
+    "beam.streaming",
+]
+
+
+def socket_path():
+    """Path of the daemon's Unix socket"""
+    from beam.state import state_dir
+    return state_dir() / "daemon.sock"
+
+
+def pid_path():
+    from beam.state import state_dir
+    return state_dir() / "daemon.pid"
+
+
+def _source_stamp(package):
+    """(file count, newest mtime) of a package's Python sources"""
+    newest = 0
+    count = 0
+    for path in package.rglob("*.py"):
+        newest = max(newest, path.stat().st_mtime_ns)
+        count += 1
+    return count, newest
+
+
+def code_version():
+    """
+    Token that changes whenever beam's code, the interpreter or a preloaded
+    package (bench, click) changes - found without importing them, since
+    the client computes this on every call
+    """
+    from importlib.util import find_spec
+    from beam import __version__
+
+    stamps = [__version__, sys.executable, *_source_stamp(Path(__file__).resolve().parent)]
+    for name in sorted({module.split(".")[0] for module in PRELOAD_MODULES} - {"beam"}):
+        spec = find_spec(name)
+        if spec is None or not spec.origin:
+            stamps.append(f"{name}:-")
+        else:
+            stamps.append(f"{name}:{spec.origin}:%d:%d" % _source_stamp(Path(spec.origin).parent))
+    return ":".join(str(stamp) for stamp in stamps)
+
+
+def send_frame(sock, kind, payload=b""):
+    sock.sendall(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def read_frame(reader):
+    """Read one frame from a buffered socket file, or None at EOF"""
+    header = reader.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    kind, length = FRAME_HEADER.unpack(header)
+    payload = reader.read(length) if length else b""
+    return kind, payload
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+def run_via_daemon(args):
+    """Run a beam command through the daemon. Returns None if it can't be used."""
+    path = socket_path()
+    if not path.exists() or sys.stdin is None or sys.stdin.isatty():
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(path))
+    except OSError:
+        client.close()
+        return None
+
+    from beam.streaming import make_writer
+
+    request = {
+        "version": code_version(),
+        "argv": list(args),
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    }
+    writers = {STDOUT: make_writer(sys.stdout), STDERR: make_writer(sys.stderr)}
+
+    try:
+        socket.send_fds(client, [b"\0"], [sys.stdin.fileno()])
+        send_frame(client, REQUEST, json.dumps(request).encode("utf-8"))
+    except (OSError, ValueError):
+        # Nothing has run yet
+        client.close()
+        return None
+
+    try:
+        reader = client.makefile("rb")
+        while True:
+            frame = read_frame(reader)
+            if frame is None:
+                # Daemon died mid-command; output so far has been shown
+                print("Error: beam daemon connection lost", file=sys.stderr)
+                return 1
+            kind, payload = frame
+            if kind in writers:
+                writers[kind](payload)
+            elif kind == EXIT:
+                return int(payload)
+            elif kind == STALE:
+                # Daemon runs older code and is shutting down - run normally
+                return None
+    except KeyboardInterrupt:
+        # Closing the socket makes the daemon stop the command
+        return 130
+    except BrokenPipeError:
+        # Our own stdout went away (beam ... | head); closing stops the command
+        return 141
+    except OSError as e:
+        # The command may have run already, so running it again is not an option
+        print(f"Error: beam daemon connection lost: {e.strerror or e}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+
+
+# ---------------------------------------------------------------------------
+# Daemon
+# ---------------------------------------------------------------------------
+
+def preload():
+    """Import bench's CLI and beam's forwarding modules once"""
+    import importlib
+
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def run_command(request):
+    """Runs in the forked command process: behave like a fresh `beam` call"""
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    args = request["argv"]
+
+    from beam.inprocess import load_bench_cli
+    from beam.cli import is_saas_command, handle_saas_command
+
+    if is_saas_command(args):
+        return handle_saas_command(args)
+
+    cli = load_bench_cli()
+    if cli is None:
+        # No importable bench - the warm start still saves beam's own startup
+        os.execvp("bench", ["bench"] + args)
+
+    # This process exists only for this command, so bench can chdir, exec
+    # or spawn freely; everything it writes goes through our pipes
+    sys.argv = ["bench"] + args
+    try:
+        result = cli()
+        return result if isinstance(result, int) else 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+
+
+def handle_connection(conn, version):
+    """Runs in the forked worker: execute one request and relay its output"""
+    import selectors
+    import signal
+    import time
+
+    from beam.streaming import CHUNK_SIZE, LineStream
+
+    try:
+        _, fds, _, _ = socket.recv_fds(conn, 1, 1)
+    except OSError:
+        return
+    if len(fds) != 1:
+        for fd in fds:
+            os.close(fd)
+        return
+    stdin = fds[0]
+    reader = conn.makefile("rb")
+    frame = read_frame(reader)
+    if frame is None or frame[0] != REQUEST:
+        return
+    request = json.loads(frame[1])
+    if request.get("version") != version:
+        send_frame(conn, STALE)
+        # Tell the parent daemon to retire; the next beam call runs cold
+        os.kill(os.getppid(), signal.SIGTERM)
+        return
+
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.setsid()
+        conn.close()
+        os.close(out_r)
+        os.close(err_r)
+        # The client's own stdin, so piped input and answers reach the command
+        os.dup2(stdin, 0)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        code = 1
+        try:
+            code = run_command(request)
+        except KeyboardInterrupt:
+            code = 130
+        except BaseException as e:
+            print(f"Error executing beam: {e}", file=sys.stderr)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code if isinstance(code, int) else 1)
+
+    os.close(out_w)
+    os.close(err_w)
+    os.close(stdin)
+
+    def sender(kind):
+        return lambda data: send_frame(conn, kind, data)
+
+    streams = {out_r: LineStream(sender(STDOUT)), err_r: LineStream(sender(STDERR))}
+    selector = selectors.DefaultSelector()
+    for fd, line_stream in streams.items():
+        selector.register(fd, selectors.EVENT_READ, line_stream)
+    selector.register(conn, selectors.EVENT_READ, None)
+
+    try:
+        open_pipes = len(streams)
+        while open_pipes:
+            deadlines = [d for d in (s.deadline() for s in streams.values()) if d is not None]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            for key, _ in selector.select(timeout):
+                if key.data is None:
+                    if not conn.recv(1):
+                        # Client went away (Ctrl+C) - stop the command
+                        os.killpg(pid, signal.SIGTERM)
+                        selector.unregister(conn)
+                    continue
+                data = os.read(key.fd, CHUNK_SIZE)
+                if data:
+                    key.data.feed(data)
+                else:
+                    selector.unregister(key.fd)
+                    key.data.close()
+                    open_pipes -= 1
+            for line_stream in streams.values():
+                line_stream.tick()
+
+        _, status = os.waitpid(pid, 0)
+        code = 128 + os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        send_frame(conn, EXIT, str(code).encode())
+    except OSError:
+        # Client disconnected while we were writing
+        try:
+            os.killpg(pid, signal.SIGTERM)
+        except OSError:
+            pass
+    finally:
+        selector.close()
+
+
+def serve(idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Accept connections until idle for idle_timeout seconds or told to stop"""
+    import selectors
+    import signal
+    import time
+
+    preload()
+    version = code_version()
+    path = socket_path()
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created 0600 - a chmod after bind() would leave a window open to others
+    umask = os.umask(0o177)
+    try:
+        server.bind(str(path))
+    finally:
+        os.umask(umask)
+    server.listen(64)
+    pid_path().write_text(str(os.getpid()))
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    workers = set()
+    last_activity = time.monotonic()
+
+    try:
+        while not stopping:
+            try:
+                events = selector.select(timeout=1.0)
+            except InterruptedError:
+                continue
+
+            for _ in events:
+                conn, _ = server.accept()
+                worker = os.fork()
+                if worker == 0:
+                    server.close()
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    signal.signal(signal.SIGINT, signal.SIG_DFL)
+                    try:
+                        handle_connection(conn, version)
+                    finally:
+                        os._exit(0)
+                conn.close()
+                workers.add(worker)
+
+            # Reap finished workers
+            for worker in list(workers):
+                try:
+                    done, _ = os.waitpid(worker, os.WNOHANG)
+                except ChildProcessError:
+                    done = worker
+                if done:
+                    workers.discard(worker)
+
+            if workers or events:
+                last_activity = time.monotonic()
+            elif time.monotonic() - last_activity > idle_timeout:
+                break
+    finally:
+        selector.close()
+        server.close()
+        for stale in (path, pid_path()):
+            try:
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def read_pid():
+    try:
+        pid = int(pid_path().read_text())
+        os.kill(pid, 0)
+        return pid
+    except (OSError, ValueError):
+        return None
+
+
+def start(idle_timeout):
+    """Fork a detached daemon and return once its socket is up"""
+    import time
+
+    if read_pid():
+        print("✓ Beam daemon already running")
+        return 0
+
+    pid = os.fork()
+    if pid == 0:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        try:
+            serve(idle_timeout)
+        finally:
+            os._exit(0)
+
+    os.waitpid(pid, 0)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if socket_path().exists() and read_pid():
+            print(f"✓ Beam daemon started (idle timeout {idle_timeout}s)")
+            return 0
+        time.sleep(0.05)
+    print("❌ Beam daemon did not start", file=sys.stderr)
+    return 1
+
+
+def stop():
+    import signal
+    import time
+
+    pid = read_pid()
+    if not pid:
+        print("Beam daemon is not running")
+        return 0
+    os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + 5
+    while read_pid() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    print("✓ Beam daemon stopped")
+    return 0
+
+
+def status():
+    pid = read_pid()
+    if pid:
+        print(f"Beam daemon running (pid {pid})")
+        print(f"  Socket: {socket_path()}")
+        return 0
+    print("Beam daemon is not running")
+    return 1
+
+
+def main(args):
+    """Handle beam daemon command"""
+    if os.name == "nt":
+        print("The beam daemon needs Unix domain sockets (Linux/macOS/WSL).", file=sys.stderr)
+        return 1
+
+    command = args[0] if args else "status"
+    idle_timeout = DEFAULT_IDLE_TIMEOUT
+    if "--idle-timeout" in args:
+        try:
+            idle_timeout = int(args[args.index("--idle-timeout") + 1])
+        except (IndexError, ValueError):
+            print("Error: --idle-timeout needs a number of seconds", file=sys.stderr)
+            return 1
+
+    if command == "start":
+        return start(idle_timeout)
+    if command == "run":
+        serve(idle_timeout)
+        return 0
+    if command == "stop":
+        return stop()
+    if command == "status":
+        return status()
+
+    print(__doc__.split("Usage:")[1].rstrip())
+    return 0 if command in ("--help", "-h", "help") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,226 @@
+"""
+Streaming error classifier for forwarded command output
+
+Each stderr line is checked once against a compiled set of known failure
+signatures as it streams past; only a bounded ring buffer of recent lines
+is kept for context. The remediation message is chosen as soon as a
+signature is seen, so nothing has to be re-scanned when the command ends.
+"""
+import re
+import sys
+from collections import deque
+
+
+# Remediation messages
+
+WSL_SERVICE_ERROR = (
+    "\n❌ WSL Service Error\n"
+    "WSL is having issues. Try these steps:\n\n"
+    "1. Restart WSL service:\n"
+    "   wsl --shutdown\n"
+    "   wsl -d Ubuntu\n\n"
+    "2. If that doesn't work, restart your computer\n\n"
+    "3. Then try beam again"
+)
+
+BEAM_NOT_FOUND_IN_WSL = (
+    "\n❌ Beam Not Found in WSL\n"
+    "Beam needs to be installed in WSL to work from PowerShell.\n\n"
+    "Quick Setup (One Time Only):\n"
+    "  1. Open Ubuntu WSL: wsl -d Ubuntu\n"
+    "  2. Navigate to beam: cd /mnt/c/Users/LDT/frappe/beam\n"
+    "  3. Create venv: python3 -m venv .venv\n"
+    "  4. Activate: source .venv/bin/activate\n"
+    "  5. Install: pip install -e .\n"
+    "  6. Add to PATH: echo 'export PATH=\"\\$PATH:/mnt/c/Users/LDT/frappe/beam/.venv/bin\"' >> ~/.bashrc\n"
+    "  7. Close WSL and use beam from PowerShell\n\n"
+    "See SETUP_UBUNTU.md for detailed instructions."
+)
+
+BENCH_MISSING = (
+    "\n❌ Beam Core Dependencies Missing\n"
+    "Please install beam dependencies first:\n"
+    "  pip install frappe-bench\n\n"
+    "Or reinstall beam with all dependencies."
+)
+
+MARIADB_UNREACHABLE = (
+    "\n❌ Database Connection Refused\n"
+    "Beam could not reach MariaDB. Try:\n"
+    "  1. Check the service: sudo systemctl status mariadb\n"
+    "  2. Start it: sudo systemctl start mariadb\n"
+    "  3. Check db_host/db_port in sites/common_site_config.json"
+)
+
+REDIS_UNREACHABLE = (
+    "\n❌ Redis Not Running\n"
+    "Beam could not connect to Redis (cache/queue/socketio). Try:\n"
+    "  1. In development: run 'beam start' in another terminal\n"
+    "  2. In production: sudo supervisorctl status\n"
+    "  3. Check the redis_* URLs in sites/common_site_config.json"
+)
+
+NODE_VERSION_MISMATCH = (
+    "\n❌ Node.js Version Mismatch\n"
+    "An app requires a different Node.js version. Try:\n"
+    "  1. Check the version: node --version\n"
+    "  2. Switch with nvm: nvm install 18 && nvm use 18\n"
+    "  3. Then run beam setup requirements --node"
+)
+
+
+class Signature:
+    """A known failure: what it looks like and what to tell the user"""
+
+    def __init__(self, name, pattern, message, contexts=("wsl", "bench"), requires_failure=False):
+        self.name = name
+        self.pattern = pattern
+        self.message = message
+        self.contexts = contexts
+        # Only report it if the command actually failed
+        self.requires_failure = requires_failure
+
+
+# Checked in order; the first signature seen wins unless a later one is
+# needed because the first requires a failing exit code
+SIGNATURES = [
+    Signature(
+        "wsl_service",
+        r"Catastrophic failure|E_UNEXPECTED",
+        WSL_SERVICE_ERROR,
+        contexts=("wsl",),
+    ),
+    Signature(
+        "bench_missing",
+        r"bench: (?:command )?not found|No module named '?bench(?:\.|'|$)",
+        BENCH_MISSING,
+        contexts=("bench",),
+        requires_failure=True,
+    ),
+    Signature(
+        "mariadb_unreachable",
+        r"Can't connect to (?:local )?(?:MySQL|MariaDB) server"
+        r"|OperationalError: \((?:2002|2003)"
+        r"|Connection refused.*:3306",
+        MARIADB_UNREACHABLE,
+        requires_failure=True,
+    ),
+    Signature(
+        "redis_unreachable",
+        r"Error \d+ connecting to \S+:\d+\. Connection refused"
+        r"|redis\.exceptions\.ConnectionError"
+        r"|Could not connect to Redis",
+        REDIS_UNREACHABLE,
+        requires_failure=True,
+    ),
+    Signature(
+        "node_version",
+        r'The engine "node" is incompatible'
+        r"|Unsupported engine"
+        r"|requires (?:at least )?Node(?:\.js)? (?:version )?v?\d+",
+        NODE_VERSION_MISMATCH,
+        requires_failure=True,
+    ),
+    Signature(
+        "beam_not_found",
+        r"(?i)not found",
+        BEAM_NOT_FOUND_IN_WSL,
+        contexts=("wsl",),
+        requires_failure=True,
+    ),
+]
+
+
+def compile_signatures(context):
+    """One alternation with a named group per signature for this context"""
+    selected = [s for s in SIGNATURES if context in s.contexts]
+    parts = []
+    for signature in selected:
+        pattern = signature.pattern
+        flags = ""
+        if pattern.startswith("(?i)"):
+            pattern, flags = pattern[4:], "(?i:"
+        parts.append(f"(?P<{signature.name}>{flags or '(?:'}{pattern}))")
+    return re.compile("|".join(parts)), {s.name: s for s in selected}
+
+
+_COMPILED = {}
+
+
+class Diagnosis:
+    """A matched signature plus the line that matched and the lines before it"""
+
+    def __init__(self, signature, line, context):
+        self.signature = signature
+        self.line = line
+        self.context = context
+
+    @property
+    def message(self):
+        return self.signature.message
+
+
+class ErrorClassifier:
+    """Feed it raw stderr batches; ask finish() for a diagnosis at exit"""
+
+    def __init__(self, context, context_lines=20):
+        if context not in _COMPILED:
+            _COMPILED[context] = compile_signatures(context)
+        self.pattern, self.signatures = _COMPILED[context]
+        self.recent = deque(maxlen=context_lines)
+        self.partial = b""
+        # First hit per signature, in the order seen
+        self.hits = {}
+
+    def feed(self, data):
+        """Accept a raw chunk of stderr"""
+        data = self.partial + data
+        cut = max(data.rfind(b"\n"), data.rfind(b"\r")) + 1
+        self.partial = data[cut:]
+        if cut:
+            for line in data[:cut].decode("utf-8", errors="replace").splitlines():
+                self._check(line)
+        # An unterminated line can't grow forever
+        if len(self.partial) > 64 * 1024:
+            self._check(self.partial.decode("utf-8", errors="replace"))
+            self.partial = b""
+
+    def _check(self, line):
+        if not line:
+            return
+        self.recent.append(line)
+        if len(self.hits) == len(self.signatures):
+            return
+        # Every signature on the line counts: a generic match early in the
+        # line mustn't hide a more specific one after it
+        for match in self.pattern.finditer(line):
+            if match.lastgroup not in self.hits:
+                self.hits[match.lastgroup] = Diagnosis(
+                    self.signatures[match.lastgroup], line, list(self.recent)
+                )
+
+    def finish(self, return_code):
+        """The diagnosis that applies to this exit code, or None"""
+        if self.partial:
+            self._check(self.partial.decode("utf-8", errors="replace"))
+            self.partial = b""
+        for signature in SIGNATURES:
+            diagnosis = self.hits.get(signature.name)
+            if diagnosis is None:
+                continue
+            if signature.requires_failure and return_code == 0:
+                continue
+            return diagnosis
+        return None
+
+
+def report(diagnosis, file=None):
+    """Print the remediation message for a diagnosis, after the output that led to it"""
+    from beam.rebrand import filter_output
+
+    file = file or sys.stderr
+    print(diagnosis.message, file=file)
+    if diagnosis.context:
+        print("\nOutput leading up to it:", file=file)
+        for line in diagnosis.context:
+            print(f"  | {filter_output(line)}", file=file)
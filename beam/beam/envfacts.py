@@ -0,0 +1,236 @@
+"""
+Environment facts shared by beam.cli and beam.install_wsl
+
+Facts such as "is WSL available" or "where is bench" are probed at most
+once per process and saved to a versioned snapshot in beam's state
+directory. The snapshot is reused until it is older than its TTL or the
+environment fingerprint changes (PATH, interpreter, installed WSL distros).
+`beam env` shows the facts and how long each probe took;
+`beam --refresh-env` or `beam env --refresh` throws them away.
+"""
+import os
+import sys
+import time
+
+
+SCHEMA_VERSION = 1
+
+# Snapshot lifetime in seconds (BEAM_ENV_TTL overrides)
+DEFAULT_TTL = 6 * 60 * 60
+
+IS_WINDOWS = sys.platform == "win32"
+
+# In-process cache: {name: {"value", "probe_ms", "probed_at"}}
+_facts = None
+
+
+def probe_wsl_available():
+    """Check if WSL is available on Windows (runs wsl --status)"""
+    if not IS_WINDOWS:
+        return False
+    import subprocess
+    try:
+        result = subprocess.run(
+            ["wsl", "--status"],
+            capture_output=True,
+            timeout=5
+        )
+        return result.returncode == 0
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return False
+
+
+def probe_bench_path():
+    """Locate the bench executable on PATH"""
+    import shutil
+    return shutil.which("bench")
+
+
+def probe_git_bash():
+    """Check if running in Git Bash"""
+    # Git Bash sets these environment variables
+    return (
+        os.environ.get("MSYSTEM", "").startswith("MINGW") or
+        "Git" in os.environ.get("SHELL", "") or
+        "bash.exe" in os.environ.get("_", "")
+    )
+
+
+def probe_node_version():
+    """Version reported by node on PATH, e.g. v18.19.0"""
+    import subprocess
+    try:
+        result = subprocess.run(["node", "--version"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+PROBES = {
+    "wsl_available": probe_wsl_available,
+    "bench_path": probe_bench_path,
+    "git_bash": probe_git_bash,
+    "node_version": probe_node_version,
+}
+
+# Facts that depend on the current shell rather than the machine
+UNCACHED = {"git_bash"}
+
+
+def wsl_distros():
+    """Installed WSL distributions, read from the registry (no wsl.exe launch)"""
+    if not IS_WINDOWS:
+        return []
+    try:
+        import winreg
+        names = []
+        path = r"Software\Microsoft\Windows\CurrentVersion\Lxss"
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, path) as root:
+            index = 0
+            while True:
+                try:
+                    guid = winreg.EnumKey(root, index)
+                except OSError:
+                    break
+                with winreg.OpenKey(root, guid) as key:
+                    names.append(winreg.QueryValueEx(key, "DistributionName")[0])
+                index += 1
+        return sorted(names)
+    except OSError:
+        return []
+
+
+def fingerprint():
+    """Changes whenever a cached fact could have changed"""
+    import zlib
+    parts = [
+        str(SCHEMA_VERSION),
+        os.environ.get("PATH", ""),
+        sys.executable,
+        sys.version,
+        ",".join(wsl_distros()),
+    ]
+    return f"{zlib.crc32(chr(0).join(parts).encode('utf-8', 'surrogateescape')):08x}"
+
+
+def snapshot_file():
+    from beam.state import state_dir
+    return state_dir() / "env_facts.json"
+
+
+def ttl():
+    try:
+        return int(os.environ.get("BEAM_ENV_TTL", DEFAULT_TTL))
+    except ValueError:
+        return DEFAULT_TTL
+
+
+def _load():
+    """Load the snapshot once per process, discarding it if stale"""
+    global _facts
+    if _facts is not None:
+        return _facts
+
+    from beam.state import load_json
+    snapshot = load_json(snapshot_file(), {})
+    _facts = {}
+    if (
+        snapshot.get("schema") == SCHEMA_VERSION
+        and snapshot.get("fingerprint") == fingerprint()
+        and time.time() - snapshot.get("created", 0) < ttl()
+    ):
+        _facts = snapshot.get("facts", {})
+    return _facts
+
+
+def _save():
+    from beam.state import save_json
+    persistent = {name: fact for name, fact in _facts.items() if name not in UNCACHED}
+    try:
+        save_json(snapshot_file(), {
+            "schema": SCHEMA_VERSION,
+            "fingerprint": fingerprint(),
+            "created": min((f["probed_at"] for f in persistent.values()), default=time.time()),
+            "facts": persistent,
+        })
+    except OSError:
+        # A read-only home directory only costs us the cache
+        pass
+
+
+def probe(name):
+    """Run a probe now and record its result and duration"""
+    facts = _load()
+    start = time.perf_counter()
+    value = PROBES[name]()
+    facts[name] = {
+        "value": value,
+        "probe_ms": round((time.perf_counter() - start) * 1000, 2),
+        "probed_at": time.time(),
+    }
+    if name not in UNCACHED:
+        _save()
+    return value
+
+
+def get_fact(name, validate=None):
+    """
+    Value of a fact, probing only if it isn't cached.
+
+    validate, if given, is called with a cached value; returning False
+    forces a fresh probe (e.g. a cached path that no longer exists).
+    """
+    fact = _load().get(name)
+    if fact is not None and (validate is None or validate(fact["value"])):
+        return fact["value"]
+    return probe(name)
+
+
+def peek_fact(name):
+    """Cached value of a fact, or None - never runs a probe"""
+    fact = _load().get(name)
+    return None if fact is None else fact["value"]
+
+
+def clear():
+    """Forget every cached fact, in memory and on disk"""
+    global _facts
+    _facts = {}
+    try:
+        snapshot_file().unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def main(args):
+    """Handle beam env command"""
+    if "--refresh" in args:
+        clear()
+
+    loaded = dict(_load())
+    for name in PROBES:
+        get_fact(name)
+
+    now = time.time()
+    print("Beam Environment")
+    print(f"  Snapshot:    {snapshot_file()} (ttl {_format_age(ttl())})")
+    print(f"  Fingerprint: {fingerprint()}")
+    if IS_WINDOWS:
+        from beam.cli import wsl_beam_cache_file
+        from beam.state import load_json
+        print(f"  WSL distros: {', '.join(wsl_distros()) or 'none'}")
+        print(f"  WSL beam:    {load_json(wsl_beam_cache_file(), {}).get('path') or 'not cached'}")
+    print()
+    for name in PROBES:
+        fact = _facts[name]
+        source = f"cached {_format_age(now - fact['probed_at'])} ago" if name in loaded else "probed now"
+        print(f"  {name:<16} {str(fact['value']):<32} {fact['probe_ms']:>9.2f} ms  ({source})")
+    return 0
@@ -0,0 +1,470 @@
+"""
+Run one bench command across many sites in parallel
+
+`beam fanout` starts `bench --site <site> <command>` for every selected
+site, at most --jobs at a time. Output from each site is rebranded by the
+normal streaming pipeline and prefixed with the site name, a line is
+printed as each site finishes, and a summary with durations is printed at
+the end. The results are saved so `--retry-failed` can re-run only the
+sites that failed.
+
+Sites are the directories under sites/ that have a site_config.json. Tags
+come from a "beam_tags" list in each site's site_config.json.
+
+Usage:
+    beam fanout [options] [--] <command> [args...]
+
+Options:
+    --sites a,b,c       Only these sites (or --sites @file, one per line)
+    --glob PATTERN      Only sites matching a shell pattern (e.g. 'tenant-*')
+    --tag TAG           Only sites tagged TAG in site_config.json
+    --jobs N            Sites to run at the same time (default 4)
+    --timeout SECONDS   Stop a site's command after this long
+    --retry-failed      Re-run the sites that failed last time
+    --keep-going        (default) run every site even after failures
+    --fail-fast         Start no new sites after the first failure
+
+Examples:
+    beam fanout --glob 'tenant-*' --jobs 8 migrate
+    beam fanout --tag trial clear-cache
+    beam fanout --retry-failed
+"""
+import fnmatch
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+DEFAULT_JOBS = 4
+
+# Result states
+OK = "ok"
+FAILED = "failed"
+TIMEOUT = "timeout"
+SKIPPED = "skipped"
+
+
+def find_bench_root(start=None):
+    """Nearest directory at or above start that has sites/ and apps/"""
+    path = Path(start or os.getcwd()).resolve()
+    for candidate in [path] + list(path.parents):
+        if (candidate / "sites").is_dir() and (candidate / "apps").is_dir():
+            return candidate
+    return None
+
+
+def list_sites(bench_root):
+    """Names of all sites in a bench, sorted"""
+    sites_dir = Path(bench_root) / "sites"
+    return sorted(
+        entry.name for entry in sites_dir.iterdir()
+        if entry.is_dir() and (entry / "site_config.json").is_file()
+    )
+
+
+def list_apps(bench_root):
+    """Apps in install order (sites/apps.txt), falling back to apps/"""
+    apps_txt = Path(bench_root) / "sites" / "apps.txt"
+    try:
+        apps = [line.strip() for line in apps_txt.read_text().splitlines() if line.strip()]
+    except OSError:
+        apps = sorted(entry.name for entry in (Path(bench_root) / "apps").iterdir() if entry.is_dir())
+    return [app for app in apps if (Path(bench_root) / "apps" / app).is_dir()]
+
+
+def site_tags(bench_root, site):
+    from beam.state import load_json
+    config = load_json(Path(bench_root) / "sites" / site / "site_config.json", {})
+    tags = config.get("beam_tags", [])
+    return set(tags) if isinstance(tags, list) else set()
+
+
+def read_site_list(value):
+    """Parse --sites a,b,c or --sites @file"""
+    if value.startswith("@"):
+        with open(value[1:], encoding="utf-8") as f:
+            names = [line.split("#")[0].strip() for line in f]
+    else:
+        names = [name.strip() for name in value.split(",")]
+    return [name for name in names if name]
+
+
+def select_sites(bench_root, names=None, patterns=(), tags=()):
+    """Sites matching every given filter, in listing order"""
+    available = list_sites(bench_root)
+    if names:
+        missing = [name for name in names if name not in available]
+        if missing:
+            raise ValueError(f"Unknown site(s): {', '.join(missing)}")
+        sites = list(dict.fromkeys(names))
+    else:
+        sites = available
+    if patterns:
+        sites = [s for s in sites if any(fnmatch.fnmatch(s, p) for p in patterns)]
+    if tags:
+        sites = [s for s in sites if site_tags(bench_root, s) & set(tags)]
+    return sites
+
+
+def results_file():
+    from beam.state import state_dir
+    return state_dir() / "fanout_last.json"
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m{int(seconds % 60):02d}s"
+    return f"{int(seconds // 3600)}h{int(seconds % 3600 // 60):02d}m"
+
+
+def prefixer(prefix, rewrite):
+    """Rewrite function that rebrands output and then prefixes every line"""
+    from beam.streaming import prefix_lines
+    prefix = prefix.encode("utf-8")
+    return prefix_lines(rewrite, lambda: prefix)
+
+
+def locked_writer(stream, lock):
+    """make_writer for a stream shared by several sites"""
+    from beam.streaming import make_writer
+    write = make_writer(stream)
+
+    def locked_write(data):
+        with lock:
+            write(data)
+    return locked_write
+
+
+def stream_prefixed(process, prefix, output_lock):
+    """Stream a piped child's rebranded output with every line prefixed"""
+    from beam.rebrand import filter_bytes
+    from beam.streaming import LineStream, pump
+
+    # Each stream tracks its own line starts; partial lines wait for their
+    # end so that sites running side by side don't interleave mid-line
+    streams = {
+        process.stdout.fileno(): LineStream(locked_writer(sys.stdout, output_lock),
+                                            prefixer(prefix, filter_bytes), hold_partial=True),
+        process.stderr.fileno(): LineStream(locked_writer(sys.stderr, output_lock),
+                                            prefixer(prefix, filter_bytes), hold_partial=True),
+    }
+    try:
+        pump(streams, process)
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+    return process.wait()
+
+
+class Fanout:
+    """Bounded pool of workers, each running one site's command at a time"""
+
+    def __init__(self, bench_root, command, jobs=DEFAULT_JOBS, timeout=None,
+                 fail_fast=False, bench="bench"):
+        self.bench_root = Path(bench_root)
+        self.command = list(command)
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        self.fail_fast = fail_fast
+        self.bench = bench
+        self.lock = threading.Lock()
+        self.output_lock = threading.Lock()
+        self.queue = []
+        self.running = {}
+        self.results = {}
+        self.stopping = False
+        self.width = 0
+        self.total = 0
+
+    def site_command(self, site):
+        return [self.bench, "--site", site] + self.command
+
+    def next_site(self):
+        """Hand the next queued site to a worker, or None when done"""
+        with self.lock:
+            if self.stopping or not self.queue:
+                return None
+            return self.queue.pop(0)
+
+    def run_site(self, site):
+        """Run the command for one site, streaming prefixed output"""
+        import subprocess
+
+        prefix = f"{site:<{self.width}} | "
+        start = time.monotonic()
+        try:
+            process = subprocess.Popen(
+                self.site_command(site),
+                cwd=self.bench_root,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                # Own process group, so a timeout also stops bench's children
+                start_new_session=os.name != "nt",
+            )
+        except OSError as e:
+            return {"state": FAILED, "code": 127, "duration": 0.0, "error": str(e)}
+
+        with self.lock:
+            self.running[site] = process
+
+        timed_out = threading.Event()
+        timer = None
+        if self.timeout:
+            def expire():
+                timed_out.set()
+                self.kill(process)
+            timer = threading.Timer(self.timeout, expire)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            code = stream_prefixed(process, prefix, self.output_lock)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self.lock:
+                self.running.pop(site, None)
+
+        if code < 0:
+            code = 128 - code
+        if timed_out.is_set():
+            state = TIMEOUT
+        else:
+            state = OK if code == 0 else FAILED
+        return {"state": state, "code": code, "duration": round(time.monotonic() - start, 3)}
+
+    def kill(self, process):
+        import signal
+        try:
+            if os.name == "nt":
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def record(self, site, result):
+        with self.lock:
+            self.results[site] = result
+            done = len(self.results)
+            if result["state"] != OK and self.fail_fast:
+                self.stopping = True
+        mark = {OK: "✓", FAILED: "✗", TIMEOUT: "⏱"}[result["state"]]
+        detail = format_duration(result["duration"])
+        if result["state"] == FAILED:
+            detail += f", exit {result['code']}"
+        elif result["state"] == TIMEOUT:
+            detail += ", timed out"
+        with self.output_lock:
+            print(f"{mark} [{done:>{len(str(self.total))}}/{self.total}] {site} ({detail})",
+                  file=sys.stderr, flush=True)
+
+    def worker(self):
+        while True:
+            site = self.next_site()
+            if site is None:
+                return
+            self.record(site, self.run_site(site))
+
+    def run(self, sites):
+        """Run every site; returns {site: result}"""
+        self.queue = list(sites)
+        self.total = len(sites)
+        self.width = max((len(site) for site in sites), default=0)
+
+        threads = [
+            threading.Thread(target=self.worker, daemon=True)
+            for _ in range(min(self.jobs, len(sites)))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                # Short joins keep Ctrl+C responsive
+                while thread.is_alive():
+                    thread.join(0.2)
+        except KeyboardInterrupt:
+            with self.lock:
+                self.stopping = True
+                running = list(self.running.values())
+            for process in running:
+                self.kill(process)
+            for thread in threads:
+                thread.join()
+            raise
+        finally:
+            for site in sites:
+                self.results.setdefault(site, {"state": SKIPPED, "code": None, "duration": 0.0})
+        return self.results
+
+
+def print_summary(results, wall_time, jobs, title="Fanout summary",
+                  retry_hint="beam fanout --retry-failed"):
+    """Aggregated success/failure summary with durations"""
+    counts = {state: 0 for state in (OK, FAILED, TIMEOUT, SKIPPED)}
+    for result in results.values():
+        counts[result["state"]] += 1
+    site_time = sum(result["duration"] for result in results.values())
+
+    print()
+    print(f"{title}: {len(results)} sites, {jobs} at a time")
+    print(f"  ✓ {counts[OK]} succeeded")
+    if counts[FAILED]:
+        print(f"  ✗ {counts[FAILED]} failed")
+    if counts[TIMEOUT]:
+        print(f"  ⏱ {counts[TIMEOUT]} timed out")
+    if counts[SKIPPED]:
+        print(f"  - {counts[SKIPPED]} not run")
+    speedup = f" ({site_time / wall_time:.1f}x)" if len(results) > 1 and wall_time > 0 else ""
+    print(f"  Wall time {format_duration(wall_time)}, total site time {format_duration(site_time)}{speedup}")
+
+    finished = [(r["duration"], site) for site, r in results.items() if r["state"] != SKIPPED]
+    if finished:
+        duration, site = max(finished)
+        print(f"  Slowest: {site} ({format_duration(duration)})")
+
+    failed = [site for site, r in results.items() if r["state"] in (FAILED, TIMEOUT)]
+    if failed:
+        print("\nFailed sites:")
+        for site in failed:
+            result = results[site]
+            reason = "timed out" if result["state"] == TIMEOUT else f"exit {result['code']}"
+            print(f"  {site:<30} {reason:<10} {format_duration(result['duration'])}")
+    if failed or counts[SKIPPED]:
+        print(f"\nRe-run them with: {retry_hint}")
+
+
+def parse_args(args):
+    """Split fanout options from the bench command that follows them"""
+    options = {
+        "names": None, "patterns": [], "tags": [], "jobs": DEFAULT_JOBS,
+        "timeout": None, "retry_failed": False, "fail_fast": False,
+    }
+    with_value = {"--sites", "--glob", "--tag", "--jobs", "-j", "--timeout"}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg == "--":
+            index += 1
+            break
+        if arg in with_value:
+            if index + 1 >= len(args):
+                raise ValueError(f"{arg} needs a value")
+            value = args[index + 1]
+            if arg == "--sites":
+                options["names"] = (options["names"] or []) + read_site_list(value)
+            elif arg == "--glob":
+                options["patterns"] += [p for p in value.split(",") if p]
+            elif arg == "--tag":
+                options["tags"] += [t for t in value.split(",") if t]
+            else:
+                try:
+                    number = int(value) if arg in ("--jobs", "-j") else float(value)
+                except ValueError:
+                    number = None
+                if number is None or not number > 0:
+                    raise ValueError(f"{arg} must be a positive number, got {value}")
+                options["jobs" if arg in ("--jobs", "-j") else "timeout"] = number
+            index += 2
+        elif arg == "--retry-failed":
+            options["retry_failed"] = True
+            index += 1
+        elif arg == "--fail-fast":
+            options["fail_fast"] = True
+            index += 1
+        elif arg == "--keep-going":
+            options["fail_fast"] = False
+            index += 1
+        else:
+            break
+    return options, args[index:]
+
+
+def main(args):
+    """Handle beam fanout command"""
+    if not args or args[0] in ("--help", "-h", "help"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0 if args else 1
+
+    try:
+        options, command = parse_args(args)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+
+    from beam.state import load_json, save_json
+
+    if options["retry_failed"]:
+        last = load_json(results_file(), {})
+        if last.get("bench_root") != str(bench_root):
+            print("Error: no previous fanout run for this beam directory", file=sys.stderr)
+            return 1
+        command = command or last.get("command", [])
+        sites = [
+            site for site, result in last.get("results", {}).items()
+            if result["state"] != OK
+        ]
+        if not sites:
+            print("✓ Nothing to retry - every site succeeded last time")
+            return 0
+    else:
+        try:
+            sites = select_sites(bench_root, options["names"], options["patterns"], options["tags"])
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    if not command:
+        print("Error: no command given (e.g. beam fanout --glob 'tenant-*' migrate)", file=sys.stderr)
+        return 1
+    if "--site" in command:
+        print("Error: sites are chosen by fanout; drop --site from the command", file=sys.stderr)
+        return 1
+    if not sites:
+        print("No sites matched", file=sys.stderr)
+        return 1
+
+    from beam.cli import ensure_bench_installed
+    bench = ensure_bench_installed()
+
+    jobs = min(options["jobs"], len(sites))
+    print(f"Running '{' '.join(command)}' on {len(sites)} site(s), {jobs} at a time", file=sys.stderr)
+    fanout = Fanout(bench_root, command, jobs, options["timeout"], options["fail_fast"], bench)
+    start = time.monotonic()
+    interrupted = False
+    try:
+        results = fanout.run(sites)
+    except KeyboardInterrupt:
+        interrupted = True
+        results = fanout.results
+    wall_time = time.monotonic() - start
+
+    try:
+        save_json(results_file(), {
+            "bench_root": str(bench_root),
+            "command": command,
+            "finished": time.time(),
+            "results": results,
+        })
+    except OSError:
+        pass
+
+    print_summary(results, wall_time, jobs)
+    if interrupted:
+        return 130
+    return 0 if all(result["state"] == OK for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,232 @@
+"""
+Local bare mirrors of app repositories for `beam get-app`
+
+Every repository beam fetches is kept as a bare mirror in
+$BEAM_GIT_MIRRORS (default: git-mirrors in beam's state directory).
+`beam get-app` first creates or updates the mirrors of all requested apps
+in parallel, then runs bench get-app for each app with git told (through
+GIT_CONFIG_* variables, url.<mirror>.insteadOf) to clone from the mirror.
+A clone from a local mirror hardlinks its objects instead of downloading
+them; afterwards the app's remote is pointed back at the original URL.
+
+The bench installs run one at a time, since they share the bench's
+environment and apps.txt; only the network-bound part runs in parallel.
+
+Usage:
+    beam get-app <app> [<app> ...] [--branch BRANCH] [--jobs N] [bench options]
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+DEFAULT_JOBS = 4
+
+# Bare names resolve to this organisation, as in bench
+DEFAULT_ORG = "https://github.com/frappe"
+
+
+def mirrors_dir():
+    override = os.environ.get("BEAM_GIT_MIRRORS")
+    if override:
+        path = Path(override)
+    else:
+        from beam.state import state_dir
+        path = state_dir() / "git-mirrors"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def resolve_url(app):
+    """The URL bench will clone for an app argument, or None for local paths"""
+    if re.match(r"^(https?|ssh|git|file)://", app) or re.match(r"^[\w.-]+@[\w.-]+:", app):
+        return app
+    if os.path.exists(app):
+        return None
+    if re.match(r"^[\w.-]+/[\w.-]+$", app):
+        return f"https://github.com/{app}"
+    if re.match(r"^[\w.-]+$", app):
+        return f"{DEFAULT_ORG}/{app}"
+    return None
+
+
+def mirror_path(url):
+    base = url.rstrip("/")
+    if base.endswith(".git"):
+        base = base[:-4]
+    name = re.sub(r"[^\w.-]", "_", base.rsplit("/", 1)[-1].rsplit(":", 1)[-1]) or "repo"
+    return mirrors_dir() / f"{name}-{hashlib.sha1(base.encode()).hexdigest()[:10]}.git"
+
+
+def _git(*args, cwd=None):
+    import subprocess
+    result = subprocess.run(
+        ["git"] + list(args), cwd=cwd,
+        stdin=subprocess.DEVNULL, capture_output=True, text=True
+    )
+    return result.returncode, (result.stderr or result.stdout).strip()
+
+
+def update_mirror(url):
+    """Create or refresh the mirror of url; returns (ok, message)"""
+    path = mirror_path(url)
+    from beam.state import FileLock
+    with FileLock(path):
+        if (path / "HEAD").exists():
+            code, output = _git("--git-dir", str(path), "remote", "update", "--prune")
+            return code == 0, "updated" if code == 0 else output
+        tmp = path.with_name(path.name + ".tmp")
+        import shutil
+        shutil.rmtree(tmp, ignore_errors=True)
+        code, output = _git("clone", "--mirror", "--quiet", url, str(tmp))
+        if code != 0:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False, output
+        os.rename(tmp, path)
+        return True, "created"
+
+
+def redirect_env(url):
+    """GIT_CONFIG_* variables that make git clone url from its mirror"""
+    path = str(mirror_path(url))
+    base = url[:-4] if url.endswith(".git") else url
+    # insteadOf matches prefixes and the longest one wins, so the ".git"
+    # spelling needs its own entry to not become "<mirror>.git"
+    pairs = [(f"url.{path}.insteadOf", base), (f"url.{path}.insteadOf", base + ".git")]
+    env = {"GIT_CONFIG_COUNT": str(len(pairs))}
+    for index, (key, value) in enumerate(pairs):
+        env[f"GIT_CONFIG_KEY_{index}"] = key
+        env[f"GIT_CONFIG_VALUE_{index}"] = value
+    return env
+
+
+def restore_remotes(bench_root, url):
+    """Point remotes that git recorded as the mirror back at the real URL"""
+    path = str(mirror_path(url))
+    for app_dir in (Path(bench_root) / "apps").iterdir():
+        if not (app_dir / ".git").exists():
+            continue
+        code, remotes = _git("remote", "-v", cwd=app_dir)
+        if code != 0:
+            continue
+        for line in remotes.splitlines():
+            parts = line.split()
+            if len(parts) >= 2 and parts[1] == path:
+                _git("remote", "set-url", parts[0], url, cwd=app_dir)
+
+
+def parse_args(args):
+    """Apps, pool size and the options that go to every bench get-app"""
+    apps = []
+    passthrough = []
+    jobs = DEFAULT_JOBS
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg in ("--jobs", "--branch", "-b") and index + 1 >= len(args):
+            raise ValueError(f"{arg} needs a value")
+        if arg == "--jobs":
+            try:
+                jobs = int(args[index + 1])
+            except ValueError:
+                raise ValueError(f"invalid value for --jobs: {args[index + 1]}") from None
+            index += 2
+            continue
+        if arg in ("--branch", "-b"):
+            passthrough += [arg, args[index + 1]]
+            index += 2
+            continue
+        if arg.startswith("-"):
+            passthrough.append(arg)
+        else:
+            apps.append(arg)
+        index += 1
+    return apps, passthrough, jobs
+
+
+def fetch_mirrors(urls, jobs):
+    """Update mirrors with at most `jobs` fetches at a time; {url: (ok, message, seconds)}"""
+    results = {}
+    queue = list(urls)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                url = queue.pop(0)
+            start = time.monotonic()
+            ok, message = update_mirror(url)
+            with lock:
+                results[url] = (ok, message, time.monotonic() - start)
+            print(f"{'✓' if ok else '⚠️ '} mirror {url} ({message}, {time.monotonic() - start:.1f}s)",
+                  file=sys.stderr, flush=True)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(jobs, len(urls)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def get_apps(args):
+    """Handle beam get-app"""
+    from beam.fanout import find_bench_root, format_duration
+    from beam.packagecache import install
+
+    if "--help" in args or "-h" in args:
+        from beam.cli import forward_to_bench
+        return forward_to_bench(["get-app"] + args)
+    try:
+        apps, passthrough, jobs = parse_args(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not apps:
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 1
+
+    bench_root = find_bench_root()
+    urls = {app: resolve_url(app) for app in apps}
+    mirrored = fetch_mirrors(sorted({url for url in urls.values() if url}), max(1, jobs))
+
+    timings = []
+    code = 0
+    saved_env = {key: os.environ.get(key) for key in redirect_env("x")}
+    for app in apps:
+        url = urls[app]
+        fetch_seconds = 0.0
+        # A mirror that couldn't be refreshed (offline) is still worth using
+        if url and (mirror_path(url) / "HEAD").exists():
+            os.environ.update(redirect_env(url))
+            fetch_seconds = mirrored[url][2]
+        else:
+            # No mirror or a local path: let bench fetch it directly
+            for key in saved_env:
+                os.environ.pop(key, None)
+        start = time.monotonic()
+        app_code = install(["get-app"] + passthrough + [app])
+        if url and bench_root is not None:
+            restore_remotes(bench_root, url)
+        timings.append((app, fetch_seconds, time.monotonic() - start, app_code))
+        code = code or app_code
+
+    for key, value in saved_env.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = value
+
+    if len(apps) > 1 or code:
+        print()
+        print(f"  {'App':<24} {'Mirror':>8} {'Install':>8}  Result")
+        for app, fetch_seconds, install_seconds, app_code in timings:
+            result = "✓" if app_code == 0 else f"✗ exit {app_code}"
+            print(f"  {app:<24} {format_duration(fetch_seconds):>8} {format_duration(install_seconds):>8}  {result}")
+    return code
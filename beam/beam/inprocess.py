@@ -0,0 +1,132 @@
+"""
+In-process bench dispatch
+
+Imports bench's click CLI and runs it inside the beam process instead of
+starting a second Python interpreter. sys.stdout and sys.stderr are swapped
+for rewriting wrappers while it runs, so output is rebranded as usual.
+
+Commands that spawn their own processes, replace the process or need a
+terminal still go through the subprocess path - anything they write from
+a child process would bypass the wrappers.
+"""
+import io
+import sys
+
+from beam.rebrand import filter_output
+
+
+# Commands that shell out to git/pip/yarn/supervisor or run for a long time
+ISOLATED_COMMANDS = [
+    "init",
+    "get-app",
+    "new-app",
+    "remove-app",
+    "update",
+    "setup",
+    "restart",
+    "build",
+    "pip",
+    "switch-to-branch",
+    "switch-to-develop",
+    "migrate-env",
+    "renew-lets-encrypt",
+    "backup-all-sites",
+    "drop-site",
+    "frappe",
+]
+
+
+class RebrandingWriter(io.TextIOBase):
+    """Text stream wrapper that rebrands whole lines before writing them on"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.partial = ""
+
+    def write(self, text):
+        data = self.partial + text
+        cut = max(data.rfind("\n"), data.rfind("\r")) + 1
+        if cut:
+            self.stream.write(filter_output(data[:cut]))
+            self.partial = data[cut:]
+        else:
+            self.partial = data
+        return len(text)
+
+    def flush(self):
+        if self.partial:
+            self.stream.write(filter_output(self.partial))
+            self.partial = ""
+        self.stream.flush()
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self.stream.isatty()
+
+    @property
+    def encoding(self):
+        return self.stream.encoding
+
+    @property
+    def errors(self):
+        return self.stream.errors
+
+
+def load_bench_cli():
+    """Import bench's CLI entry point, or return None if bench is missing"""
+    try:
+        from bench.cli import cli
+    except ImportError:
+        return None
+    return cli
+
+
+def is_frappe_command(args, command):
+    """bench hands frappe/site commands to the bench's own env via os.execv"""
+    if args and args[0] in ("frappe", "--site"):
+        return True
+    try:
+        from bench.cli import get_frappe_commands
+        return command in get_frappe_commands()
+    except Exception:
+        # Can't tell - let bench sort it out in its own process
+        return True
+
+
+def can_run_inprocess(args, command, isolated=()):
+    """Check whether a bench command is safe to run inside this process"""
+    if command in ISOLATED_COMMANDS or command in isolated:
+        return False
+    if load_bench_cli() is None:
+        return False
+    return not is_frappe_command(args, command)
+
+
+def run_bench_inprocess(args):
+    """Run bench's CLI in this interpreter with rebranded output. Returns the exit code."""
+    cli = load_bench_cli()
+    saved_argv = sys.argv
+    saved_stdout, saved_stderr = sys.stdout, sys.stderr
+    sys.argv = ["bench"] + list(args)
+    sys.stdout = RebrandingWriter(saved_stdout)
+    sys.stderr = RebrandingWriter(saved_stderr)
+
+    try:
+        result = cli()
+        return result if isinstance(result, int) else 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.argv = saved_argv
+        sys.stdout, sys.stderr = saved_stdout, saved_stderr
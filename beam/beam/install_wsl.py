@@ -9,18 +9,11 @@ import os
 
 
 def is_wsl_available():
-    """Check if WSL is available"""
+    """Check if WSL is available (shared, cached probe)"""
     if platform.system() != "Windows":
         return False
-    try:
-        result = subprocess.run(
-            ["wsl", "--status"],
-            capture_output=True,
-            timeout=5
-        )
-        return result.returncode == 0
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
+    from beam.envfacts import get_fact
+    return get_fact("wsl_available")
 
 
 def check_wsl_python():
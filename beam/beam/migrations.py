@@ -0,0 +1,542 @@
+"""
+Resource-aware migration scheduler for fleet updates
+
+`beam update --fleet` lets bench pull, install requirements and build as
+usual, then migrates every site itself instead of one after another:
+
+- Sites are ordered longest job first. A site's expected duration comes
+  from its past migrations (recorded after every run), else its database
+  size times the fleet's seconds-per-byte, else the fleet median.
+- Up to --jobs sites migrate at once, but a new one only starts while the
+  host's load average per CPU and MariaDB's Threads_running are under
+  their limits. One site always runs, so a host kept busy by something
+  else still makes progress.
+- With --canary, a few sites (the quickest by estimate, or the ones named)
+  migrate first; the rest only start if they all succeed.
+
+Usage:
+    beam update --fleet [options] [bench update options]
+
+Options:
+    --jobs N              Sites to migrate at the same time (default 4)
+    --canary N|a,b        Migrate N quick sites (or these sites) first
+    --max-load F          Start no new site above this load per CPU (default 1.5)
+    --max-db-threads N    ...or above this many running MariaDB threads
+                          (default 2 per CPU)
+    --timeout SECONDS     Stop a site's migration after this long
+    --sites/--glob/--tag  Limit the sites, as for beam fanout
+    --patch               Only migrate - skip pull, requirements and build
+    --dry-run             Show the plan and estimates, change nothing
+"""
+import os
+import sys
+import threading
+import time
+
+from beam.fanout import OK, SKIPPED, Fanout, format_duration, read_site_list, select_sites
+
+
+DEFAULT_JOBS = 4
+DEFAULT_MAX_LOAD = 1.5
+
+# Estimate for a site nobody knows anything about (seconds)
+DEFAULT_ESTIMATE = 60.0
+
+# Past durations kept per site
+HISTORY_LENGTH = 5
+
+# How often host load is sampled while sites wait to start (seconds)
+LOAD_INTERVAL = 1.0
+
+
+# ---------------------------------------------------------------------------
+# History and estimates
+# ---------------------------------------------------------------------------
+
+def history_file():
+    from beam.state import state_dir
+    return state_dir() / "migration_history.json"
+
+
+def load_history(bench_root):
+    """{site: {"durations": [...], "db_size": bytes}} for this bench"""
+    from beam.state import load_json
+    return load_json(history_file(), {}).get(str(bench_root), {})
+
+
+def save_history(bench_root, results, db_sizes):
+    """Record durations of successful migrations and the sizes they ran on"""
+    from beam.state import load_json, save_json
+    history = load_json(history_file(), {})
+    sites = history.setdefault(str(bench_root), {})
+    for site, result in results.items():
+        if result["state"] != OK:
+            continue
+        entry = sites.setdefault(site, {"durations": []})
+        entry["durations"] = (entry["durations"] + [result["duration"]])[-HISTORY_LENGTH:]
+        if db_sizes.get(site):
+            entry["db_size"] = db_sizes[site]
+        entry["updated"] = time.time()
+    try:
+        save_json(history_file(), history)
+    except OSError:
+        pass
+
+
+def weighted_duration(durations):
+    """Recent runs count more: exponentially weighted average"""
+    estimate = durations[0]
+    for duration in durations[1:]:
+        estimate = 0.5 * estimate + 0.5 * duration
+    return estimate
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def estimate_durations(sites, history, db_sizes):
+    """{site: (seconds, source)} for every site"""
+    known = {
+        site: weighted_duration(entry["durations"])
+        for site, entry in history.items() if entry.get("durations")
+    }
+    # Seconds per byte, from sites with both a duration and a size
+    rates = [
+        known[site] / entry["db_size"]
+        for site, entry in history.items()
+        if site in known and entry.get("db_size")
+    ]
+    rate = _median(rates)
+    fallback = _median(list(known.values())) or DEFAULT_ESTIMATE
+
+    estimates = {}
+    for site in sites:
+        size = db_sizes.get(site) or history.get(site, {}).get("db_size")
+        if site in known:
+            estimates[site] = (known[site], "history")
+        elif size and rate:
+            estimates[site] = (size * rate, "db size")
+        else:
+            estimates[site] = (fallback, "default")
+    return estimates
+
+
+def predicted_wall_time(durations, jobs):
+    """Makespan of running durations in the given order on `jobs` workers"""
+    import heapq
+    workers = [0.0] * max(1, min(jobs, len(durations)))
+    for duration in durations:
+        heapq.heappush(workers, heapq.heappop(workers) + duration)
+    return max(workers) if durations else 0.0
+
+
+# ---------------------------------------------------------------------------
+# MariaDB and host load
+# ---------------------------------------------------------------------------
+
+class Database:
+    """Access to the bench's MariaDB through the command-line client (root by default)"""
+
+    def __init__(self, bench_root, password=None):
+        import shutil
+        from beam.state import load_json
+        config = load_json(os.path.join(bench_root, "sites", "common_site_config.json"), {})
+        self.host = config.get("db_host", "localhost")
+        self.port = config.get("db_port")
+        self.user = config.get("root_login", "root")
+        self.password = (password or os.environ.get("BEAM_DB_ROOT_PASSWORD")
+                         or config.get("root_password"))
+        self.name = None
+        self.client = shutil.which("mariadb") or shutil.which("mysql")
+        self.dumper = shutil.which("mariadb-dump") or shutil.which("mysqldump")
+
+    @classmethod
+    def for_site(cls, bench_root, site):
+        """Access with a site's own credentials, limited to its database"""
+        from beam.state import load_json
+        config = load_json(os.path.join(bench_root, "sites", site, "site_config.json"), {})
+        database = cls(bench_root)
+        database.host = config.get("db_host", database.host)
+        database.port = config.get("db_port", database.port)
+        database.user = config.get("db_user") or config.get("db_name")
+        database.password = config.get("db_password")
+        database.name = config.get("db_name")
+        return database
+
+    def command(self, program, *args):
+        """argv and environment for running a MariaDB tool as root"""
+        cmd = [program, "-h", self.host, "-u", self.user]
+        if self.port:
+            cmd += ["-P", str(self.port)]
+        env = dict(os.environ)
+        if self.password:
+            env["MYSQL_PWD"] = self.password
+        return cmd + list(args), env
+
+    def query(self, sql, timeout=10):
+        """Rows of a query as lists of strings, or None if it can't run"""
+        import subprocess
+        if not self.client:
+            return None
+        cmd, env = self.command(self.client, "-N", "-B", "-e", sql)
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, env=env)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return [line.split("\t") for line in result.stdout.splitlines() if line]
+
+    def dump(self, database, path):
+        """Write a gzipped dump of a database to path; True on success"""
+        import gzip
+        import shutil
+        import subprocess
+        if not self.dumper:
+            return False
+        cmd, env = self.command(self.dumper, "--single-transaction", "--quick",
+                                "--routines", "--skip-lock-tables", database)
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+        except OSError:
+            return False
+        with gzip.open(path, "wb", compresslevel=1) as out:
+            shutil.copyfileobj(process.stdout, out, 1024 * 1024)
+        return process.wait() == 0
+
+    def load(self, path, database):
+        """Stream a gzipped dump into an existing database; True on success"""
+        import gzip
+        import shutil
+        import subprocess
+        if not self.client:
+            return False
+        cmd, env = self.command(self.client, database)
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+        except OSError:
+            return False
+        try:
+            with gzip.open(path, "rb") as dump:
+                shutil.copyfileobj(dump, process.stdin, 1024 * 1024)
+            process.stdin.close()
+        except (OSError, EOFError):
+            process.kill()
+        return process.wait() == 0
+
+    def schema_sizes(self):
+        """{db_name: bytes} for every schema, in one query"""
+        rows = self.query(
+            "SELECT table_schema, SUM(data_length + index_length) "
+            "FROM information_schema.tables GROUP BY table_schema"
+        )
+        sizes = {}
+        for row in rows or []:
+            try:
+                sizes[row[0]] = int(row[1])
+            except (IndexError, ValueError):
+                pass
+        return sizes
+
+    def threads_running(self):
+        rows = self.query("SHOW GLOBAL STATUS LIKE 'Threads_running'")
+        try:
+            return int(rows[0][1])
+        except (TypeError, IndexError, ValueError):
+            return None
+
+
+def site_db_sizes(bench_root, sites, database):
+    """{site: bytes} from MariaDB, falling back to the data directory"""
+    from beam.state import load_json
+    db_names = {}
+    for site in sites:
+        config = load_json(os.path.join(bench_root, "sites", site, "site_config.json"), {})
+        if config.get("db_name"):
+            db_names[site] = config["db_name"]
+
+    schema_sizes = database.schema_sizes()
+    sizes = {}
+    for site, db_name in db_names.items():
+        size = schema_sizes.get(db_name)
+        if size is None:
+            # Readable when beam runs as root or the mysql user
+            size = _directory_size(os.path.join("/var/lib/mysql", db_name))
+        if size:
+            sizes[site] = size
+    return sizes
+
+
+def _directory_size(path):
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    except OSError:
+        return None
+
+
+def load_per_cpu():
+    """1-minute load average divided by the number of CPUs"""
+    try:
+        with open("/proc/loadavg") as f:
+            load = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            return None
+    return load / (os.cpu_count() or 1)
+
+
+class Throttle:
+    """Decides whether the host has room for one more migration"""
+
+    def __init__(self, database, max_load, max_db_threads):
+        self.database = database
+        self.max_load = max_load
+        self.max_db_threads = max_db_threads
+        self.lock = threading.Lock()
+        self.sampled_at = 0.0
+        self.reason = None
+
+    def busy(self):
+        """Why a new site should wait, or None; sampled at most once a second"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.sampled_at >= LOAD_INTERVAL:
+                self.sampled_at = now
+                self.reason = self._sample()
+            return self.reason
+
+    def _sample(self):
+        load = load_per_cpu()
+        if load is not None and load > self.max_load:
+            return f"load {load:.2f}/cpu"
+        if self.max_db_threads:
+            threads = self.database.threads_running()
+            if threads is not None and threads > self.max_db_threads:
+                return f"{threads} MariaDB threads running"
+        return None
+
+
+class ScheduledMigrations(Fanout):
+    """Fanout that holds back new sites while the host is saturated"""
+
+    def __init__(self, bench_root, throttle, jobs, timeout=None, bench="bench"):
+        super().__init__(bench_root, ["migrate"], jobs, timeout, bench=bench)
+        self.throttle = throttle
+        self.active = 0
+        self.waiting_reason = None
+
+    def next_site(self):
+        while True:
+            with self.lock:
+                if self.stopping or not self.queue:
+                    return None
+                idle = self.active == 0
+            # The first site always starts; the rest wait for headroom.
+            # Sampling can query MariaDB, so it happens outside the lock.
+            reason = None if idle else self.throttle.busy()
+            with self.lock:
+                if self.stopping or not self.queue:
+                    return None
+                if reason is None:
+                    self.active += 1
+                    return self.queue.pop(0)
+            if reason != self.waiting_reason:
+                self.waiting_reason = reason
+                with self.output_lock:
+                    print(f"⏸  Holding back new sites: {reason}", file=sys.stderr, flush=True)
+            time.sleep(LOAD_INTERVAL)
+
+    def record(self, site, result):
+        with self.lock:
+            self.active -= 1
+        super().record(site, result)
+
+
+# ---------------------------------------------------------------------------
+# beam update --fleet
+# ---------------------------------------------------------------------------
+
+VALUE_OPTIONS = ("--jobs", "--canary", "--max-load", "--max-db-threads", "--timeout",
+                 "--sites", "--glob", "--tag")
+
+
+def apply_option(options, arg, value):
+    if arg == "--jobs":
+        options["jobs"] = int(value)
+    elif arg == "--canary":
+        options["canary"] = value
+    elif arg == "--max-load":
+        options["max_load"] = float(value)
+    elif arg == "--max-db-threads":
+        options["max_db_threads"] = int(value)
+    elif arg == "--timeout":
+        options["timeout"] = float(value)
+    elif arg == "--sites":
+        options["names"] = (options["names"] or []) + read_site_list(value)
+    elif arg == "--glob":
+        options["patterns"] += [p for p in value.split(",") if p]
+    elif arg == "--tag":
+        options["tags"] += [t for t in value.split(",") if t]
+
+
+def parse_args(args):
+    """Split scheduler options from the options meant for bench update"""
+    options = {
+        "jobs": DEFAULT_JOBS, "canary": None, "max_load": DEFAULT_MAX_LOAD,
+        "max_db_threads": 2 * (os.cpu_count() or 1), "timeout": None,
+        "names": None, "patterns": [], "tags": [], "patch_only": False,
+        "dry_run": False,
+    }
+    passthrough = []
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg in VALUE_OPTIONS:
+            if index + 1 >= len(args):
+                raise ValueError(f"{arg} needs a value")
+            value = args[index + 1]
+            try:
+                apply_option(options, arg, value)
+            except ValueError:
+                raise ValueError(f"invalid value for {arg}: {value}") from None
+            except OSError as e:
+                raise ValueError(f"{arg}: {e.strerror}: {value}") from None
+            index += 2
+            continue
+        if arg == "--patch":
+            options["patch_only"] = True
+        elif arg == "--dry-run":
+            options["dry_run"] = True
+        elif arg != "--fleet":
+            passthrough.append(arg)
+        index += 1
+    return options, passthrough
+
+
+def pick_canaries(canary, order, estimates):
+    """Sites for the canary phase: the N quickest, or the ones named"""
+    if not canary:
+        return []
+    if canary.isdigit():
+        quickest = sorted(order, key=lambda site: estimates[site][0])
+        return quickest[:int(canary)]
+    names = [name.strip() for name in canary.split(",") if name.strip()]
+    unknown = [name for name in names if name not in order]
+    if unknown:
+        raise ValueError(f"Canary site(s) not selected: {', '.join(unknown)}")
+    return names
+
+
+def show_plan(order, canaries, estimates, db_sizes, jobs):
+    print(f"Migration plan: {len(order)} site(s), {jobs} at a time, longest first")
+    for site in canaries:
+        print(f"  canary  {site:<32} ~{format_duration(estimates[site][0]):>8}  ({estimates[site][1]})")
+    for site in order:
+        if site in canaries:
+            continue
+        size = db_sizes.get(site)
+        size_text = f"{size / 1024 / 1024:.0f} MB" if size else "?"
+        print(f"          {site:<32} ~{format_duration(estimates[site][0]):>8}  ({estimates[site][1]}, {size_text})")
+    rest = [estimates[site][0] for site in order if site not in canaries]
+    canary_time = predicted_wall_time([estimates[site][0] for site in canaries], jobs)
+    print(f"  Predicted wall time: {format_duration(canary_time + predicted_wall_time(rest, jobs))}")
+
+
+def migrate_sites(bench_root, sites, options, bench="bench"):
+    """Run the scheduled migrations; returns an exit code"""
+    from beam.fanout import print_summary
+
+    database = Database(bench_root)
+    db_sizes = site_db_sizes(bench_root, sites, database)
+    estimates = estimate_durations(sites, load_history(bench_root), db_sizes)
+    # Longest job first keeps a big site from starting last and running alone
+    order = sorted(sites, key=lambda site: estimates[site][0], reverse=True)
+    canaries = pick_canaries(options["canary"], order, estimates)
+
+    if options["dry_run"]:
+        show_plan(order, canaries, estimates, db_sizes, options["jobs"])
+        return 0
+
+    throttle = Throttle(database, options["max_load"], options["max_db_threads"])
+    phases = [("canary", canaries), ("fleet", [site for site in order if site not in canaries])]
+    results = {}
+    start = time.monotonic()
+    code = 0
+    for phase, phase_sites in phases:
+        if not phase_sites:
+            continue
+        if canaries:
+            print(f"\n▶ {phase.capitalize()} phase: {len(phase_sites)} site(s)", file=sys.stderr)
+        run = ScheduledMigrations(bench_root, throttle, options["jobs"], options["timeout"], bench)
+        try:
+            results.update(run.run(phase_sites))
+        except KeyboardInterrupt:
+            results.update(run.results)
+            code = 130
+            break
+        finally:
+            save_history(bench_root, run.results, db_sizes)
+        if any(result["state"] != OK for result in results.values()):
+            code = 1
+            if phase == "canary":
+                print("\n❌ Canary migration failed - the rest of the fleet was not migrated",
+                      file=sys.stderr)
+                break
+
+    for site in order:
+        results.setdefault(site, {"state": SKIPPED, "code": None, "duration": 0.0})
+    retry = [site for site in order if results[site]["state"] != OK]
+    print_summary(
+        results, time.monotonic() - start, options["jobs"], title="Migration summary",
+        retry_hint=f"beam update --fleet --patch --sites {','.join(retry)}",
+    )
+    return code
+
+
+def update(args):
+    """Handle beam update --fleet"""
+    from beam.fanout import find_bench_root
+
+    try:
+        options, passthrough = parse_args(args)
+    except (TypeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+    try:
+        sites = select_sites(bench_root, options["names"], options["patterns"], options["tags"])
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not sites:
+        print("No sites matched", file=sys.stderr)
+        return 1
+
+    from beam.cli import ensure_bench_installed, forward_to_bench
+    bench = ensure_bench_installed()
+
+    if not options["patch_only"] and not options["dry_run"]:
+        # Everything bench update does except migrating; beam migrates below
+        steps = ["--pull", "--requirements", "--build"]
+        if not any(step in passthrough for step in steps):
+            passthrough += steps
+        return_code = forward_to_bench(["update"] + passthrough)
+        if return_code != 0:
+            return return_code
+
+    try:
+        return migrate_sites(bench_root, sites, options, bench)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
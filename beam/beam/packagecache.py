@@ -0,0 +1,262 @@
+"""
+Host-wide Python wheel and Node package caches
+
+`beam init`, `beam get-app` and `beam setup requirements` run bench with
+pip and yarn pointed at caches shared by every bench on the host:
+
+    wheelhouse/     wheels of everything a bench has installed (pip find-links)
+    pip/            pip's download and built-wheel cache
+    yarn/           yarn's package cache
+    yarn-mirror/    yarn offline mirror (tarballs)
+
+After a successful install, any installed distribution missing from the
+wheelhouse is added to it (built from pip's cache, so mostly without the
+network). With BEAM_OFFLINE=1 (or --offline) pip only looks in the
+wheelhouse; yarn installs from its cache whenever a lockfile pins the
+packages, so a warm host can set up a bench with no network at all.
+
+The caches live in $BEAM_PACKAGE_CACHE (default: packages in beam's state
+directory). `beam cache prune` trims them, least recently used first, to
+$BEAM_PACKAGE_CACHE_SIZE megabytes (default 4096).
+"""
+import os
+import re
+import sys
+from pathlib import Path
+
+
+DEFAULT_MAX_SIZE_MB = 4096
+
+# Needed to build apps' own packages with pip's build isolation offline
+BUILD_REQUIREMENTS = ["flit_core", "setuptools", "wheel"]
+
+# The harvest runs after bench has finished; don't hold the user's command
+# hostage to a slow index or a source build (seconds)
+HARVEST_TIMEOUT = 120
+
+
+def cache_dir():
+    override = os.environ.get("BEAM_PACKAGE_CACHE")
+    if override:
+        path = Path(override)
+    else:
+        from beam.state import state_dir
+        path = state_dir() / "packages"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def wheelhouse():
+    path = cache_dir() / "wheelhouse"
+    path.mkdir(exist_ok=True)
+    return path
+
+
+def max_size():
+    try:
+        return int(os.environ.get("BEAM_PACKAGE_CACHE_SIZE", DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+    except ValueError:
+        return DEFAULT_MAX_SIZE_MB * 1024 * 1024
+
+
+def offline():
+    return os.environ.get("BEAM_OFFLINE") == "1"
+
+
+def install_env():
+    """Environment variables that point pip and yarn at the shared caches"""
+    root = cache_dir()
+    env = {
+        "PIP_FIND_LINKS": str(wheelhouse()),
+        "PIP_CACHE_DIR": str(root / "pip"),
+        "YARN_CACHE_FOLDER": str(root / "yarn"),
+        # yarn reads YARN_<setting> variables as config
+        "YARN_YARN_OFFLINE_MIRROR": str(root / "yarn-mirror"),
+        "YARN_YARN_OFFLINE_MIRROR_PRUNING": "false",
+    }
+    if offline():
+        env["PIP_NO_INDEX"] = "1"
+    return env
+
+
+# ---------------------------------------------------------------------------
+# Wheelhouse
+# ---------------------------------------------------------------------------
+
+def _normalize(name):
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def wheelhouse_contents():
+    """{(normalized name, version)} of the wheels already cached"""
+    contents = set()
+    for wheel in wheelhouse().glob("*.whl"):
+        parts = wheel.name.split("-")
+        if len(parts) >= 2:
+            contents.add((_normalize(parts[0]), parts[1]))
+    return contents
+
+
+def harvest(bench_root):
+    """Add the bench's installed distributions to the wheelhouse"""
+    import subprocess
+
+    python = Path(bench_root) / "env" / ("Scripts" if os.name == "nt" else "bin") / "python"
+    if not python.exists():
+        return 0
+    env = dict(os.environ, **install_env())
+    try:
+        frozen = subprocess.run(
+            [str(python), "-m", "pip", "freeze", "--exclude-editable"],
+            capture_output=True, text=True, timeout=120, env=env
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return 0
+    if frozen.returncode != 0:
+        return 0
+
+    cached = wheelhouse_contents()
+    cached_names = {name for name, _ in cached}
+    missing = []
+    for line in frozen.stdout.splitlines():
+        name, sep, version = line.partition("==")
+        if sep and (_normalize(name), version.strip()) not in cached:
+            missing.append(line.strip())
+    missing += [name for name in BUILD_REQUIREMENTS if _normalize(name) not in cached_names]
+    if not missing:
+        return 0
+
+    # --no-deps: the freeze already lists every dependency
+    try:
+        result = subprocess.run(
+            [str(python), "-m", "pip", "wheel", "--no-deps", "-q",
+             "--wheel-dir", str(wheelhouse())] + missing,
+            capture_output=True, text=True, timeout=HARVEST_TIMEOUT, env=env
+        )
+    except subprocess.TimeoutExpired:
+        # Wheels finished so far are kept; the next install picks up the rest
+        print("⚠️  Wheelhouse update timed out; it will continue after the next install",
+              file=sys.stderr)
+    except OSError:
+        return 0
+    else:
+        if result.returncode != 0:
+            print("⚠️  Some packages could not be added to the wheelhouse", file=sys.stderr)
+    return len(wheelhouse_contents() - cached)
+
+
+# bench init options that take a value, so it isn't mistaken for the path
+INIT_VALUE_OPTIONS = ("--frappe-branch", "--frappe-path", "--clone-from", "--apps_path",
+                      "--python", "--install-app", "--version")
+
+
+def bench_root_for(args):
+    """Where the bench being installed into lives"""
+    from beam.cli import get_bench_subcommand
+    from beam.fanout import find_bench_root
+
+    if get_bench_subcommand(args) == "init":
+        rest = args[args.index("init") + 1:]
+        index = 0
+        while index < len(rest):
+            if rest[index] in INIT_VALUE_OPTIONS:
+                index += 2
+            elif rest[index].startswith("-"):
+                index += 1
+            else:
+                return Path(rest[index]).resolve()
+        return None
+    return find_bench_root()
+
+
+def install(args):
+    """Run an installing bench command through the shared caches"""
+    from beam.cli import forward_to_bench
+
+    if "--offline" in args:
+        args = [arg for arg in args if arg != "--offline"]
+        os.environ["BEAM_OFFLINE"] = "1"
+    os.environ.update(install_env())
+    # A warm daemon was started with its own environment
+    os.environ["BEAM_NO_DAEMON"] = "1"
+
+    return_code = forward_to_bench(args)
+    if return_code == 0 and not offline():
+        bench_root = bench_root_for(args)
+        if bench_root is not None:
+            added = harvest(bench_root)
+            if added:
+                print(f"✓ Added {added} wheel(s) to the shared wheelhouse")
+    return return_code
+
+
+# ---------------------------------------------------------------------------
+# Size and pruning
+# ---------------------------------------------------------------------------
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _last_used(path):
+    stat = os.stat(path)
+    return max(stat.st_atime, stat.st_mtime)
+
+
+def cache_entries():
+    """(path, size, last used) for every evictable item in the package caches"""
+    root = cache_dir()
+    found = []
+    # Single files: wheels, mirror tarballs, pip cache files
+    for sub in ("wheelhouse", "yarn-mirror", "pip"):
+        for dirpath, _, files in os.walk(root / sub):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    found.append((path, os.lstat(path).st_size, _last_used(path)))
+                except OSError:
+                    pass
+    # yarn keeps one directory per package; it has to go as a whole
+    for version_dir in (root / "yarn").glob("v*"):
+        for package in version_dir.iterdir():
+            if package.is_dir() and not package.name.startswith("."):
+                try:
+                    found.append((str(package), _tree_size(package), _last_used(package)))
+                except OSError:
+                    pass
+    return found
+
+
+def sizes():
+    """{cache name: bytes}"""
+    root = cache_dir()
+    return {sub: _tree_size(root / sub) for sub in ("wheelhouse", "pip", "yarn", "yarn-mirror")}
+
+
+def prune(limit=None):
+    """Remove least recently used items until the caches fit; returns bytes freed"""
+    import shutil
+    limit = max_size() if limit is None else limit
+    found = sorted(cache_entries(), key=lambda item: item[2])
+    total = sum(size for _, size, _ in found)
+    freed = 0
+    for path, size, _ in found:
+        if total <= limit:
+            break
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        freed += size
+    return freed
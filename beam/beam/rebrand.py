@@ -0,0 +1,73 @@
+"""
+Rebranding engine - rewrites frappe/bench references to beam in output text
+
+All rules are compiled into a single alternation pattern once at import time,
+so each line is scanned exactly once instead of once per rule.
+"""
+import re
+
+
+# Replacement rules, in priority order. When two rules match at the same
+# position the earlier one wins, which mirrors applying them one by one.
+#
+# Quoted forms such as 'bench' or `frappe` need no rules of their own: the
+# standalone-word rules already match inside the quotes.
+REPLACEMENTS = [
+    # URLs and paths - preserve structure but rebrand
+    (r'frappe-bench', 'beam'),
+    (r'frappe_bench', 'beam'),
+
+    # Common phrases
+    (r'Frappe Framework', 'Beam Framework'),
+    (r'frappe framework', 'beam framework'),
+    (r'Frappe Bench', 'Beam'),
+    (r'frappe bench', 'beam'),
+
+    # Standalone words (case variations)
+    (r'\bFrappe\b', 'Beam'),
+    (r'\bfrappe\b', 'beam'),
+    (r'\bBench\b', 'Beam'),
+    (r'\bbench\b', 'beam'),
+]
+
+# Every rule matches a fixed string, so the matched text is the lookup key
+_LOOKUP = {
+    pattern.replace(r'\b', ''): replacement
+    for pattern, replacement in REPLACEMENTS
+}
+
+# The leading lookahead lets the regex engine jump straight to candidate
+# first letters instead of trying every alternative at every position
+_FIRST_CHARS = "".join(sorted({literal[0] for literal in _LOOKUP}))
+_PATTERN = re.compile(
+    f"(?=[{_FIRST_CHARS}])(?:"
+    + "|".join(f"(?:{pattern})" for pattern, _ in REPLACEMENTS)
+    + ")"
+)
+
+
+def _replace(match):
+    return _LOOKUP[match.group()]
+
+
+_substitute = _PATTERN.sub
+
+
+def filter_output(text):
+    """Replace frappe/bench references with beam in output text"""
+    if not text:
+        return text
+    # Every rule contains one of these substrings - most lines contain neither
+    if "rappe" not in text and "ench" not in text:
+        return text
+    return _substitute(_replace, text)
+
+
+def filter_bytes(data, encoding="utf-8"):
+    """Rebrand raw output bytes, passing undecodable sequences through untouched"""
+    if not data:
+        return data
+    if b"rappe" not in data and b"ench" not in data:
+        return data
+    text = data.decode(encoding, errors="surrogateescape")
+    return _substitute(_replace, text).encode(encoding, errors="surrogateescape")
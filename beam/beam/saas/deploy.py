@@ -1,18 +1,355 @@
 """
 Deploy command for SaaS functionality
+
+`beam deploy` updates a bench in stages and skips every stage whose inputs
+have not changed since the last successful deploy:
+
+    fetch     git pull --ff-only in every app (in parallel)
+    python    bench setup requirements --python, per app whose
+              pyproject.toml/setup.py/requirements changed
+    node      bench setup requirements --node, per app whose
+              package.json/yarn.lock changed (in parallel)
+    build     beam build (cached bench build) for apps whose public/ files or
+              node deps changed
+    migrate   site migrations when patches.txt, hooks.py or any JSON
+              (doctypes, fixtures, ...) changed, or for new sites
+    restart   bench restart, if anything above ran
+
+The python -> migrate and node -> build tracks run at the same time.
+Inputs are fingerprinted from git's committed blob ids (one `git ls-tree`
+per app), so checking an unchanged bench takes well under a second. What
+each stage last deployed is kept in a deploy manifest in beam's state
+directory.
+
+Usage:
+    beam deploy [environment] [options]
+
+Options:
+    --no-fetch        Deploy what is checked out, don't pull
+    --force           Run every stage regardless of the manifest
+    --dry-run         Show which stages would run
+    --no-restart      Leave processes running
+    --jobs N          Sites to migrate at the same time (default 4)
 """
+import fnmatch
+import hashlib
+import os
 import sys
+import threading
+import time
+from pathlib import Path
+
+
+# Which committed files feed each stage (matched against repo-relative paths)
+STAGE_INPUTS = {
+    "python": ["pyproject.toml", "setup.py", "setup.cfg", "requirements*.txt"],
+    "node": ["package.json", "yarn.lock"],
+    "build": ["package.json", "yarn.lock", "*/public/*", "*.bundle.*"],
+    "migrate": ["*patches.txt", "*hooks.py", "*.json"],
+}
+
+APP_STAGES = ["python", "node", "build", "migrate"]
+
+
+def manifest_file():
+    from beam.state import state_dir
+    return state_dir() / "deploy_manifest.json"
+
+
+def load_manifest(bench_root):
+    from beam.state import load_json
+    return load_json(manifest_file(), {}).get(str(bench_root), {})
+
+
+def save_manifest(bench_root, manifest):
+    from beam.state import load_json, save_json
+    manifests = load_json(manifest_file(), {})
+    manifests[str(bench_root)] = manifest
+    try:
+        save_json(manifest_file(), manifests)
+    except OSError:
+        pass
+
+
+def git(app_dir, *args):
+    """Output of a git command in an app, or None if it fails"""
+    import subprocess
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(app_dir)] + list(args),
+            capture_output=True, text=True, timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def fingerprint_app(app_dir):
+    """{"commit": sha, stage: hash of that stage's inputs} for one app"""
+    commit = git(app_dir, "rev-parse", "HEAD")
+    tree = git(app_dir, "ls-tree", "-r", "HEAD")
+    if commit is None or tree is None:
+        # Not a git checkout: nothing to compare, so every stage runs
+        return {"commit": None}
+
+    digests = {stage: hashlib.sha1() for stage in STAGE_INPUTS}
+    for line in tree.splitlines():
+        # <mode> <type> <sha>\t<path>
+        meta, _, path = line.partition("\t")
+        blob = meta.rsplit(" ", 1)[-1]
+        for stage, patterns in STAGE_INPUTS.items():
+            if any(fnmatch.fnmatch(path, pattern) for pattern in patterns):
+                digests[stage].update(f"{blob} {path}\n".encode())
+
+    fingerprint = {stage: digest.hexdigest() for stage, digest in digests.items()}
+    fingerprint["commit"] = commit.strip()
+    return fingerprint
+
+
+def plan_stages(apps, fingerprints, manifest, sites, force=False):
+    """{stage: [apps]} of the work that is actually needed"""
+    deployed = manifest.get("apps", {})
+    plan = {stage: [] for stage in APP_STAGES}
+    for app in apps:
+        current = fingerprints[app]
+        previous = deployed.get(app, {})
+        for stage in APP_STAGES:
+            if force or current.get(stage) is None or current.get(stage) != previous.get(stage):
+                plan[stage].append(app)
+
+    # A site added since the last deploy still needs its first migrate
+    new_sites = [site for site in sites if site not in manifest.get("sites", [])]
+    plan["migrate_sites"] = sites if plan["migrate"] else new_sites
+    return plan
+
+
+class Pipeline:
+    """Runs the stages, timing each step and recording what succeeded"""
+
+    def __init__(self, bench_root, bench, jobs):
+        self.bench_root = Path(bench_root)
+        self.bench = bench
+        self.jobs = jobs
+        self.output_lock = threading.Lock()
+        self.timings = []
+        self.failed = []
+
+    def step(self, label, cmd, cwd=None):
+        """Run one command with prefixed, rebranded output; True on success"""
+        import subprocess
+        from beam.fanout import stream_prefixed
+
+        start = time.monotonic()
+        try:
+            process = subprocess.Popen(
+                cmd,
+                cwd=cwd or self.bench_root,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+            )
+            code = stream_prefixed(process, f"{label} | ", self.output_lock)
+        except OSError as e:
+            with self.output_lock:
+                print(f"{label} | {e}", file=sys.stderr)
+            code = 127
+        self.record(label, time.monotonic() - start, code == 0)
+        return code == 0
+
+    def record(self, label, duration, ok):
+        with self.output_lock:
+            self.timings.append((label, duration, ok))
+            if not ok:
+                self.failed.append(label)
+            mark = "✓" if ok else "✗"
+            print(f"{mark} {label} ({duration:.1f}s)", file=sys.stderr, flush=True)
+
+    def parallel(self, func, items):
+        """Call func(item) for every item on its own thread; results in order"""
+        results = [None] * len(items)
+
+        def call(index, item):
+            results[index] = func(item)
+
+        threads = [threading.Thread(target=call, args=(i, item)) for i, item in enumerate(items)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def fetch(self, apps):
+        """Fast-forward every app that tracks an upstream branch"""
+        def pull(app):
+            app_dir = self.bench_root / "apps" / app
+            if git(app_dir, "rev-parse", "--abbrev-ref", "@{u}") is None:
+                return True
+            return self.step(f"fetch {app}", ["git", "pull", "--ff-only", "-q"], cwd=app_dir)
+        return all(self.parallel(pull, apps))
+
+    def python_track(self, apps, sites, migrate_options, done):
+        """Python requirements one app at a time (shared env), then migrate"""
+        for app in apps:
+            if not self.step(f"python {app}", [self.bench, "setup", "requirements", "--python", app]):
+                return
+            done["python"].append(app)
+        if sites:
+            from beam.migrations import migrate_sites
+            start = time.monotonic()
+            code = migrate_sites(self.bench_root, sites, migrate_options, self.bench)
+            self.record(f"migrate {len(sites)} site(s)", time.monotonic() - start, code == 0)
+            if code == 0:
+                done["migrate"] = True
+
+    def assets_track(self, node_apps, build_apps, done):
+        """Node requirements per app in parallel, then one build"""
+        def install(app):
+            ok = self.step(f"node {app}", [self.bench, "setup", "requirements", "--node", app])
+            if ok:
+                done["node"].append(app)
+            return ok
+
+        if not all(self.parallel(install, node_apps)):
+            return
+        if build_apps:
+            build = [sys.executable, "-m", "beam.cli", "build", "--apps", ",".join(build_apps)]
+            if self.step("build", build):
+                done["build"] = True
+
+
+def parse_args(args):
+    options = {"environment": None, "fetch": True, "force": False,
+               "dry_run": False, "restart": True, "jobs": 4}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg == "--no-fetch":
+            options["fetch"] = False
+        elif arg == "--force":
+            options["force"] = True
+        elif arg == "--dry-run":
+            options["dry_run"] = True
+        elif arg == "--no-restart":
+            options["restart"] = False
+        elif arg == "--jobs":
+            if index + 1 >= len(args):
+                raise ValueError("--jobs needs a number")
+            options["jobs"] = int(args[index + 1])
+            index += 1
+        elif not arg.startswith("-") and options["environment"] is None:
+            options["environment"] = arg
+        else:
+            raise ValueError(f"Unknown option: {arg}")
+        index += 1
+    return options
+
+
+def show_plan(plan):
+    print("Deploy plan (for the checked-out code - a real deploy pulls first):")
+    for stage in APP_STAGES:
+        apps = plan[stage]
+        print(f"  {stage:<8} {', '.join(apps) if apps else 'up to date'}")
+    if plan["migrate_sites"]:
+        print(f"  {'sites':<8} {len(plan['migrate_sites'])} to migrate")
 
 
 def main(args):
     """Handle beam deploy command"""
-    print("Beam Deploy - SaaS Deployment")
-    print("This is a placeholder for future SaaS deployment functionality.")
-    print("\nArguments received:", args)
-    print("\nYou can extend this module to add your deployment logic.")
+    if args and args[0] in ("--help", "-h", "help"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0
+    try:
+        options = parse_args(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    from beam.fanout import find_bench_root, format_duration, list_apps, list_sites
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+
+    from beam.cli import ensure_bench_installed
+    from beam.packagecache import install_env
+    bench = ensure_bench_installed()
+    # Requirement steps use the host-wide wheel and Node package caches
+    os.environ.update(install_env())
+
+    start = time.monotonic()
+    apps = list_apps(bench_root)
+    sites = list_sites(bench_root)
+    manifest = load_manifest(bench_root)
+    pipeline = Pipeline(bench_root, bench, options["jobs"])
+
+    label = f" to {options['environment']}" if options["environment"] else ""
+    print(f"Deploying{label}: {len(apps)} app(s), {len(sites)} site(s)", file=sys.stderr)
+
+    if options["fetch"] and not options["dry_run"]:
+        if not pipeline.fetch(apps):
+            print("\n❌ Fetch failed - nothing was deployed", file=sys.stderr)
+            return 1
+
+    fingerprints = dict(zip(apps, pipeline.parallel(
+        lambda app: fingerprint_app(bench_root / "apps" / app), apps
+    )))
+    plan = plan_stages(apps, fingerprints, manifest, sites, options["force"])
+
+    if options["dry_run"]:
+        show_plan(plan)
+        return 0
+
+    from beam.migrations import parse_args as migration_options
+    migrate_options = migration_options(["--jobs", str(options["jobs"])])[0]
+    done = {"python": [], "node": [], "build": False, "migrate": False}
+    tracks = [
+        threading.Thread(target=pipeline.python_track,
+                         args=(plan["python"], plan["migrate_sites"], migrate_options, done)),
+        threading.Thread(target=pipeline.assets_track,
+                         args=(plan["node"], plan["build"], done)),
+    ]
+    for track in tracks:
+        track.start()
+    for track in tracks:
+        track.join()
+
+    # Record every stage that succeeded, even if another one failed
+    deployed = manifest.setdefault("apps", {})
+    for app in apps:
+        entry = deployed.setdefault(app, {})
+        entry["commit"] = fingerprints[app]["commit"]
+        for stage in ("python", "node"):
+            if app in done[stage]:
+                entry[stage] = fingerprints[app].get(stage)
+        if done["build"] and app in plan["build"]:
+            entry["build"] = fingerprints[app].get("build")
+        if done["migrate"] or not plan["migrate_sites"]:
+            entry["migrate"] = fingerprints[app].get("migrate")
+    if done["migrate"]:
+        manifest["sites"] = sites
+    manifest["environment"] = options["environment"]
+    manifest["deployed_at"] = time.time()
+
+    # Pulling is routine; anything after it means the deploy changed something
+    changed = any(not step.startswith("fetch ") for step, _, _ in pipeline.timings)
+    if changed and not pipeline.failed and options["restart"]:
+        pipeline.step("restart", [bench, "restart"])
+    save_manifest(bench_root, manifest)
+
+    print()
+    if not changed:
+        print(f"✅ Nothing changed - deploy finished in {format_duration(time.monotonic() - start)}")
+        return 0
+    for step, duration, ok in pipeline.timings:
+        print(f"  {'✓' if ok else '✗'} {step:<32} {format_duration(duration):>8}")
+    if pipeline.failed:
+        print(f"\n❌ Deploy failed: {', '.join(pipeline.failed)}")
+        print("Stages that succeeded are recorded; 'beam deploy' again retries the rest.")
+        return 1
+    print(f"\n✅ Deployed in {format_duration(time.monotonic() - start)}")
     return 0
 
 
 if __name__ == "__main__":
     sys.exit(main(sys.argv[1:]))
-
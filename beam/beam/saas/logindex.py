@@ -0,0 +1,275 @@
+"""
+Sparse time index for large log files
+
+`beam logs --since/--until` would otherwise scan multi-GB logs from the
+start. Each log file gets a small index in beam's state directory: one
+(timestamp, byte offset) entry per 128 KB of log, taken at the first
+timestamped line after each boundary. Building it touches only those
+lines - the file is memory-mapped and the scan jumps from boundary to
+boundary - and later calls only index what was appended since.
+
+A query binary-searches the memory-mapped index for the entries around
+the window and reads just that byte range of the log.
+
+Indexes are keyed by device and inode, not by path, so a file renamed by
+log rotation (web.log -> web.log.1) keeps its index. gzip-compressed
+archives are indexed once by offset into the decompressed stream; a query
+skips archives outside the window entirely and, inside one, discards
+decompressed data up to the start offset without parsing it.
+"""
+import bisect
+import glob
+import hashlib
+import mmap
+import os
+import re
+import struct
+import time
+
+
+MAGIC = b"BLX1"
+# magic, indexed up to (bytes of the log), digest of the log's first bytes
+HEADER = struct.Struct("<4sQ8s")
+# timestamp, offset of the line it was read from
+ENTRY = struct.Struct("<dQ")
+INDEX_EVERY = 128 * 1024
+HEAD_BYTES = 4096
+READ_CHUNK = 1024 * 1024
+# Lines looked at after a boundary to find one with a timestamp
+PROBE_LINES = 64
+# Index files untouched this long belong to logs that are gone
+STALE_AFTER = 30 * 86400
+
+
+def index_dir():
+    from beam.state import state_dir
+    path = state_dir() / "log-index"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def prune(max_age=STALE_AFTER):
+    cutoff = time.time() - max_age
+    for entry in os.scandir(index_dir()):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def rotated_versions(path):
+    """Rotated copies of a log, oldest first (web.log.2.gz, web.log.1, web.log-20240131)"""
+    numbered = []
+    dated = []
+    for candidate in glob.glob(glob.escape(path) + ".*") + glob.glob(glob.escape(path) + "-*"):
+        suffix = candidate[len(path) + 1:]
+        first = suffix.split(".")[0]
+        if candidate[len(path)] == "." and first.isdigit():
+            numbered.append((int(first), candidate))
+        elif re.match(r"\d{8}", suffix):
+            dated.append(candidate)
+    return sorted(dated) + [candidate for _, candidate in sorted(numbered, reverse=True)]
+
+
+class _Stamps:
+    """The timestamps of a memory-mapped index, as a sequence bisect can search"""
+
+    def __init__(self, data):
+        self.data = data
+        self.count = (len(data) - HEADER.size) // ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)[0]
+
+    def offset(self, index):
+        return ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)[1]
+
+
+class TimeIndex:
+    """The time index of one log file (plain or .gz)"""
+
+    def __init__(self, path, parse_timestamp):
+        stat = os.stat(path)
+        self.path = path
+        self.parse = parse_timestamp
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.compressed = path.endswith(".gz")
+        self.file = index_dir() / f"{stat.st_dev}-{stat.st_ino}.idx"
+        local = time.localtime(stat.st_mtime)
+        # Logs that only print a time of day get the date of the last write
+        self.today = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+
+    def _head_digest(self):
+        with open(self.path, "rb") as f:
+            return hashlib.sha1(f.read(HEAD_BYTES)).digest()[:8]
+
+    def _stamp(self, line):
+        return self.parse(line[:160], self.today)
+
+    def update(self):
+        """Bring the index up to date with the log; rebuilds it if the log was replaced"""
+        digest = self._head_digest()
+        indexed_to = 0
+        last = None
+        try:
+            with open(self.file, "rb") as f:
+                header = f.read(HEADER.size)
+                magic, indexed_to, stored = HEADER.unpack(header)
+                size = os.fstat(f.fileno()).st_size
+                if size >= HEADER.size + ENTRY.size:
+                    f.seek(size - (size - HEADER.size) % ENTRY.size - ENTRY.size)
+                    last = ENTRY.unpack(f.read(ENTRY.size))
+            # Same inode but different content, or shorter: the log was truncated
+            valid = magic == MAGIC and indexed_to <= self.size and \
+                (stored == digest or indexed_to < HEAD_BYTES)
+        except (OSError, struct.error):
+            valid = False
+        if not valid:
+            indexed_to = 0
+            last = None
+            with open(self.file, "wb") as f:
+                f.write(HEADER.pack(MAGIC, 0, digest))
+        if indexed_to == self.size:
+            return
+
+        next_at = last[1] + INDEX_EVERY if last else 0
+        previous = last[0] if last else float("-inf")
+        if self.compressed:
+            entries = self._scan_gzip(next_at, previous) if not last else []
+        else:
+            entries = self._scan(next_at, previous)
+        # Entries first, then the header that covers them
+        with open(self.file, "ab") as f:
+            f.write(b"".join(ENTRY.pack(*entry) for entry in entries))
+        with open(self.file, "r+b") as f:
+            f.write(HEADER.pack(MAGIC, self.size, digest))
+
+    def _scan(self, position, previous):
+        """Entries from position to the end of a plain log, read through mmap"""
+        if self.size == 0:
+            return []
+        entries = []
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end = data.rfind(b"\n") + 1
+            while position < end:
+                if position and data[position - 1] != 0x0A:
+                    newline = data.find(b"\n", position, end)
+                    if newline < 0:
+                        break
+                    position = newline + 1
+                stamp = None
+                for _ in range(PROBE_LINES):
+                    newline = data.find(b"\n", position, end)
+                    if newline < 0:
+                        break
+                    stamp = self._stamp(data[position:newline])
+                    if stamp is not None:
+                        break
+                    position = newline + 1
+                if stamp is None:
+                    break
+                # Keep the entries sorted, whatever the log's clock did
+                previous = max(previous, stamp)
+                entries.append((previous, position))
+                position += INDEX_EVERY
+        return entries
+
+    def _scan_gzip(self, position, previous):
+        """Entries of a compressed archive, by offset into its decompressed data"""
+        import gzip
+        entries = []
+        with gzip.open(self.path, "rb") as f:
+            while True:
+                try:
+                    f.seek(position)
+                    if position:
+                        f.readline()
+                except (OSError, EOFError):
+                    break
+                stamp = None
+                for _ in range(PROBE_LINES):
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line:
+                        break
+                    stamp = self._stamp(line)
+                    if stamp is not None:
+                        break
+                if stamp is None:
+                    break
+                previous = max(previous, stamp)
+                entries.append((previous, offset))
+                position = offset + INDEX_EVERY
+        return entries
+
+    def _bounds(self, since, until):
+        """(start, end) offsets holding every line in the window; end None for EOF"""
+        with open(self.file, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= HEADER.size:
+                return 0, None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                stamps = _Stamps(data)
+                if not len(stamps):
+                    return 0, None
+                first = bisect.bisect_left(stamps, since) if since is not None else 0
+                start = stamps.offset(first - 1) if first > 0 else 0
+                last = bisect.bisect_right(stamps, until) if until is not None else len(stamps)
+                end = stamps.offset(last) if last < len(stamps) else None
+                return start, end
+
+    def overlaps(self, since, until):
+        """Whether the log can hold lines in the window (by its first entry and mtime)"""
+        if since is not None and self.mtime < since:
+            return False
+        if until is None:
+            return True
+        with open(self.file, "rb") as f:
+            f.seek(HEADER.size)
+            first = f.read(ENTRY.size)
+        return len(first) < ENTRY.size or ENTRY.unpack(first)[0] <= until
+
+    def read(self, since, until):
+        """Chunks of whole lines covering the window"""
+        start, end = self._bounds(since, until)
+        if self.compressed:
+            yield from self._read_gzip(start, end)
+            return
+        if self.size == 0:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            limit = data.rfind(b"\n") + 1
+            end = limit if end is None else min(end, limit)
+            position = start
+            while position < end:
+                stop = min(position + READ_CHUNK, end)
+                if stop < end:
+                    newline = data.rfind(b"\n", position, stop)
+                    if newline < 0:
+                        newline = data.find(b"\n", stop, end)
+                    stop = newline + 1 if newline >= 0 else end
+                yield data[position:stop]
+                position = stop
+
+    def _read_gzip(self, start, end):
+        import gzip
+        with gzip.open(self.path, "rb") as f:
+            # Decompressed and dropped, not parsed
+            f.seek(start)
+            carry = b""
+            while end is None or f.tell() < end:
+                size = READ_CHUNK if end is None else min(READ_CHUNK, end - f.tell())
+                block = f.read(size)
+                if not block:
+                    break
+                block = carry + block
+                cut = block.rfind(b"\n") + 1
+                carry = block[cut:]
+                if cut:
+                    yield block[:cut]
+            if carry:
+                yield carry + f.readline()
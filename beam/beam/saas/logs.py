@@ -1,18 +1,575 @@
 """
 Logs command for SaaS functionality
+
+`beam logs` follows every bench log at once - logs/*.log (web, worker,
+scheduler, frappe, redis, ...) and each site's sites/*/logs/*.log - and
+prints their lines merged in timestamp order.
+
+- New data is found with inotify on the log directories (stat polling
+  where inotify isn't available) and read in large chunks from where the
+  last read stopped; files are never re-read or held in memory.
+- Each file's lines are already in order, so the backlog is a heap-based
+  k-way merge of the files; live lines are held for a short window
+  (--window) and released from a heap so lines from different files that
+  arrive together still come out in order.
+- Lines without a timestamp (tracebacks) stay with the line before them.
+- A rotated file is read to its end before the new one is opened; a
+  truncated one is read again from the start.
+- --since/--until read only the part of each log (and of its rotated and
+  gzipped copies) inside the window, found through a sparse time index
+  (see logindex.py) instead of a scan from the start.
+
+Usage:
+    beam logs [options]
+
+Options:
+    -n N               Lines of backlog per file (default 10)
+    --no-follow        Print the backlog and exit
+    --since WHEN       Print from WHEN instead of the last lines, then follow
+    --until WHEN       Stop at WHEN (implies --no-follow)
+                       WHEN: 15m, 2h, 1d (ago), HH:MM[:SS], YYYY-MM-DD[ HH:MM[:SS]]
+    --service a,b      Only these services (web, worker, schedule, frappe, ...)
+    --site SITE        Only this site's logs, and bench log lines naming it
+    --level LEVEL      Only records at this level or above (INFO, WARNING, ERROR)
+    --grep REGEX       Only records matching REGEX
+    --window SECONDS   How long live lines wait to be ordered (default 0.3)
 """
+import glob
+import heapq
+import os
+import re
 import sys
+import time
+
+
+DEFAULT_LINES = 10
+DEFAULT_WINDOW = 0.3
+READ_SIZE = 1024 * 1024
+# Polling fallback: how often files are stat()ed
+POLL_INTERVAL = 0.25
+# How often new log files are looked for when nothing says there are any
+DISCOVER_EVERY = 5.0
+
+LEVELS = {b"DEBUG": 10, b"INFO": 20, b"WARNING": 30, b"WARN": 30, b"ERROR": 40, b"CRITICAL": 50}
+
+# 2024-01-31 02:10:05,123 (frappe, gunicorn, redis-less python logs)
+DATETIME = re.compile(rb"(\d{4})-(\d\d)-(\d\d)[ T](\d\d):(\d\d):(\d\d)(?:[.,](\d+))?")
+# [31/Jan/2024 02:10:05] (werkzeug)
+ACCESS = re.compile(rb"\[(\d\d)/(\w{3})/(\d{4})[ :](\d\d):(\d\d):(\d\d)")
+# 02:10:05 at the start of the line (rq workers)
+CLOCK = re.compile(rb"(\d\d):(\d\d):(\d\d)\b")
+LEVEL = re.compile(rb"\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL)\b")
+MONTHS = {m: i for i, m in enumerate(
+    [b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun",
+     b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec"], 1)}
+
+COLORS = ["36", "33", "32", "35", "34", "96", "93", "92", "95", "94"]
+
+# 15m, 2h, 1d - optionally followed by "ago"
+RELATIVE = re.compile(r"(\d+(?:\.\d+)?)\s*([smhd])(?:\s+ago)?$")
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Midnight (local time) of a date, which every timestamp is added to
+_midnights = {}
+
+
+def _midnight(year, month, day):
+    key = (year, month, day)
+    if key not in _midnights:
+        _midnights[key] = time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+    return _midnights[key]
+
+
+def parse_timestamp(line, today):
+    """Epoch seconds of a log line's timestamp, or None"""
+    match = DATETIME.search(line, 0, 64)
+    if match:
+        year, month, day, hour, minute, second, fraction = match.groups()
+        stamp = _midnight(int(year), int(month), int(day))
+        stamp += int(hour) * 3600 + int(minute) * 60 + int(second)
+        return stamp + (float(b"0." + fraction) if fraction else 0.0)
+    match = ACCESS.search(line, 0, 80)
+    if match and match.group(2) in MONTHS:
+        day, month, year, hour, minute, second = match.groups()
+        return (_midnight(int(year), MONTHS[month], int(day))
+                + int(hour) * 3600 + int(minute) * 60 + int(second))
+    match = CLOCK.match(line)
+    if match:
+        hour, minute, second = match.groups()
+        return today + int(hour) * 3600 + int(minute) * 60 + int(second)
+    return None
+
+
+def parse_when(value, now=None):
+    """Epoch seconds of a --since/--until value"""
+    now = time.time() if now is None else now
+    value = value.strip()
+    match = RELATIVE.match(value)
+    if match:
+        return now - float(match.group(1)) * UNITS[match.group(2)]
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S",
+                "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            parsed = time.strptime(value, fmt)
+        except ValueError:
+            continue
+        local = time.localtime(now)
+        stamp = (_midnight(local.tm_year, local.tm_mon, local.tm_mday)
+                 + parsed.tm_hour * 3600 + parsed.tm_min * 60 + parsed.tm_sec)
+        # A time later than now means yesterday's
+        return stamp - 86400 if stamp > now else stamp
+    raise ValueError(f"Bad time: {value} (use 15m, 2h, HH:MM or YYYY-MM-DD HH:MM)")
+
+
+def describe(bench_root, path):
+    """(service, site) of a log file"""
+    stem = os.path.basename(path)[:-4]
+    service = stem[:-6] if stem.endswith(".error") else stem
+    parts = os.path.relpath(path, bench_root).split(os.sep)
+    site = parts[1] if parts[0] == "sites" and len(parts) > 3 else None
+    return service, site
+
+
+def find_logs(bench_root):
+    return sorted(glob.glob(os.path.join(bench_root, "logs", "*.log"))
+                  + glob.glob(os.path.join(bench_root, "sites", "*", "logs", "*.log")))
+
+
+class LogFile:
+    """One followed file: its open descriptor, offset and unfinished line"""
+
+    def __init__(self, path, index, service, site):
+        self.path = path
+        self.index = index
+        self.service = service
+        self.site = site
+        from beam.rebrand import filter_output
+        # frappe.log is labelled beam, like every other mention of frappe
+        self.label = filter_output(f"{site}:{service}" if site else service)
+        self.fd = None
+        self.inode = None
+        self.offset = 0
+        self.partial = b""
+        self.last_stamp = None
+        self.last_level = 0
+        self.today = 0.0
+
+    def open(self, offset=0):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return False
+        if self.fd is not None:
+            os.close(self.fd)
+        stat = os.fstat(fd)
+        self.fd = fd
+        self.inode = stat.st_ino
+        self.offset = min(offset, stat.st_size) if offset >= 0 else stat.st_size
+        self.partial = b""
+        local = time.localtime(stat.st_mtime)
+        self.today = _midnight(local.tm_year, local.tm_mon, local.tm_mday)
+        if self.last_stamp is None:
+            self.last_stamp = stat.st_mtime
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def tail_offset(self, lines):
+        """Offset where the last `lines` lines start, reading backwards in blocks"""
+        size = os.fstat(self.fd).st_size
+        if lines <= 0:
+            return size
+        position = size
+        found = 0
+        while position > 0:
+            step = min(65536, position)
+            position -= step
+            block = os.pread(self.fd, step, position)
+            cut = len(block)
+            # A trailing newline ends the last line rather than starting one
+            if position + step == size and block.endswith(b"\n"):
+                cut -= 1
+            while True:
+                cut = block.rfind(b"\n", 0, cut)
+                if cut < 0:
+                    break
+                found += 1
+                if found == lines:
+                    return position + cut + 1
+        return 0
+
+    def read(self):
+        """Complete lines appended since the last read, as records"""
+        records = []
+        while True:
+            data = os.pread(self.fd, READ_SIZE, self.offset)
+            if not data:
+                break
+            self.offset += len(data)
+            data = self.partial + data
+            cut = data.rfind(b"\n") + 1
+            self.partial = data[cut:]
+            if cut:
+                self._parse(data[:cut], records)
+            if len(data) < READ_SIZE:
+                break
+        return records
+
+    def _parse(self, data, records):
+        for line in data.splitlines():
+            stamp = parse_timestamp(line, self.today)
+            if stamp is None and records:
+                # A traceback or wrapped line belongs to the record before it
+                records[-1][4].append(line)
+                continue
+            if stamp is not None:
+                self.last_stamp = stamp
+                level = LEVEL.search(line, 0, 120)
+                self.last_level = LEVELS[level.group(1)] if level else 0
+            # [stamp, arrival order, file, level, lines]
+            records.append([self.last_stamp, 0, self.index, self.last_level, [line]])
+
+    def changed(self):
+        """'rotated', 'truncated', 'grown' or None, from a stat of the path"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        if stat.st_ino != self.inode:
+            return "rotated"
+        if stat.st_size < self.offset:
+            return "truncated"
+        if stat.st_size > self.offset:
+            return "grown"
+        return None
+
+
+class Inotify:
+    """Directory change notifications through libc, without dependencies"""
+
+    MASK = 0x2 | 0x8 | 0x80 | 0x100 | 0x200  # MODIFY CLOSE_WRITE MOVED_TO CREATE DELETE
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+
+    def watch(self, directory):
+        if directory in self.watches.values():
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def read(self):
+        """{path} of files that changed"""
+        import struct
+        paths = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return paths
+            offset = 0
+            while offset + 16 <= len(data):
+                wd, _, _, length = struct.unpack_from("iIII", data, offset)
+                name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+                offset += 16 + length
+                if wd in self.watches and name:
+                    paths.add(os.path.join(self.watches[wd], os.fsdecode(name)))
+
+
+class Filter:
+    """Which records to print"""
+
+    def __init__(self, services=None, site=None, level=None, pattern=None):
+        self.services = set(services or [])
+        self.site = site
+        self.site_bytes = site.encode() if site else None
+        self.level = LEVELS[level.upper().encode()] if level else 0
+        self.pattern = re.compile(pattern.encode()) if pattern else None
+
+    def wants_file(self, log):
+        if self.services and log.service not in self.services and \
+                log.label.rsplit(":", 1)[-1] not in self.services:
+            return False
+        return not self.site or log.site in (None, self.site)
+
+    def wants(self, log, record):
+        if record[3] < self.level:
+            return False
+        if self.site and log.site is None and self.site_bytes not in record[4][0]:
+            return False
+        if self.pattern and not any(self.pattern.search(line) for line in record[4]):
+            return False
+        return True
+
+
+class Tailer:
+    """Follows the bench's log files and writes their records in order"""
+
+    def __init__(self, bench_root, log_filter, window=DEFAULT_WINDOW):
+        from beam.rebrand import filter_bytes
+        from beam.streaming import make_writer
+
+        self.bench_root = str(bench_root)
+        self.filter = log_filter
+        self.window = window
+        self.files = {}
+        self.by_index = {}
+        self.pending = []
+        self.arrivals = 0
+        self.write = make_writer(sys.stdout)
+        self.rewrite = filter_bytes
+        self.colored = sys.stdout.isatty() and not os.environ.get("NO_COLOR")
+        self.width = 12
+
+    def discover(self, lines=None):
+        """Open log files not followed yet; new files are read from their start"""
+        added = []
+        for path in find_logs(self.bench_root):
+            if path in self.files:
+                continue
+            service, site = describe(self.bench_root, path)
+            log = LogFile(path, len(self.by_index), service, site)
+            if not self.filter.wants_file(log) or not log.open():
+                continue
+            if lines is not None:
+                log.offset = log.tail_offset(lines)
+            self.files[path] = log
+            self.by_index[log.index] = log
+            self.width = max(self.width, len(log.label))
+            added.append(log)
+        return added
+
+    def format(self, record):
+        log = self.by_index[record[2]]
+        label = f"{log.label:<{self.width}} | "
+        if self.colored:
+            label = f"\x1b[{COLORS[record[2] % len(COLORS)]}m{label}\x1b[0m"
+        prefix = label.encode()
+        lines = self.rewrite(b"\n".join(record[4])).split(b"\n")
+        return b"".join(prefix + line + b"\n" for line in lines)
+
+    def emit(self, records):
+        out = [self.format(r) for r in records if self.filter.wants(self.by_index[r[2]], r)]
+        if out:
+            self.write(b"".join(out))
+
+    def backlog(self, lines):
+        """Print the last lines of every file, merged by timestamp"""
+        self.discover(lines)
+        per_file = [log.read() for log in self.files.values()]
+        for records in per_file:
+            for record in records:
+                record[1] = self.arrivals
+                self.arrivals += 1
+        self.emit(heapq.merge(*per_file, key=lambda r: (r[0], r[1])))
+
+    def between(self, log, since, until):
+        """A file's records from since to until, rotated copies included, oldest first"""
+        from beam.saas.logindex import TimeIndex, rotated_versions
+        reader = LogFile(log.path, log.index, log.service, log.site)
+        reader.last_stamp = float("-inf")
+        # The last record is held back: the next chunk may continue it
+        held = []
+        for path in rotated_versions(log.path) + [log.path]:
+            try:
+                index = TimeIndex(path, parse_timestamp)
+                index.update()
+                if not index.overlaps(since, until):
+                    continue
+                reader.today = index.today
+                for chunk in index.read(since, until):
+                    reader._parse(chunk, held)
+                    for record in held[:-1]:
+                        if until is not None and record[0] > until:
+                            return
+                        if since is None or record[0] >= since:
+                            yield record
+                    del held[:-1]
+            except OSError:
+                continue
+        for record in held:
+            if (since is None or record[0] >= since) and (until is None or record[0] <= until):
+                yield record
+
+    def history(self, since, until):
+        """Print every record between since and until, merged by timestamp"""
+        from beam.saas.logindex import prune
+        prune()
+        # Opened at their ends, so following picks up after the history
+        self.discover(0)
+        per_file = [self.between(log, since, until) for log in self.files.values()]
+
+        def numbered(records):
+            for record in records:
+                record[1] = self.arrivals
+                self.arrivals += 1
+                yield record
+        merged = heapq.merge(*map(numbered, per_file), key=lambda r: (r[0], r[1]))
+        batch = []
+        for record in merged:
+            batch.append(record)
+            if len(batch) >= 1000:
+                self.emit(batch)
+                batch = []
+        self.emit(batch)
+
+    def collect(self, log):
+        """Read a file's new records into the reorder heap"""
+        state = log.changed()
+        if state == "rotated":
+            records = log.read()
+            log.open()
+            log.offset = 0
+            records += log.read()
+        elif state == "truncated":
+            log.offset = 0
+            log.partial = b""
+            records = log.read()
+        else:
+            records = log.read()
+        now = time.monotonic()
+        for record in records:
+            record[1] = self.arrivals
+            self.arrivals += 1
+            heapq.heappush(self.pending, (record[0], record[1], now, record))
+
+    def release(self, flush=False):
+        """Write out every held record whose window has passed"""
+        ready = []
+        now = time.monotonic()
+        while self.pending and (flush or self.pending[0][2] + self.window <= now):
+            ready.append(heapq.heappop(self.pending)[3])
+        self.emit(ready)
+
+    def follow(self):
+        import select
+        try:
+            notify = Inotify()
+        except (OSError, AttributeError):
+            notify = None
+        directories = {os.path.dirname(path) for path in self.files}
+        directories |= {os.path.join(self.bench_root, "logs")}
+        if notify:
+            for directory in directories:
+                notify.watch(directory)
+            for directory in glob.glob(os.path.join(self.bench_root, "sites", "*", "logs")):
+                notify.watch(directory)
+
+        discovered_at = time.monotonic()
+        try:
+            while True:
+                timeout = self.window if self.pending else (1.0 if notify else POLL_INTERVAL)
+                if notify:
+                    readable, _, _ = select.select([notify.fd], [], [], timeout)
+                    changed = notify.read() if readable else set()
+                    dirty = [self.files[path] for path in changed if path in self.files]
+                    if any(path.endswith(".log") and path not in self.files for path in changed):
+                        self.discover()
+                        dirty = list(self.files.values())
+                else:
+                    time.sleep(timeout)
+                    dirty = [log for log in self.files.values() if log.changed()]
+                if time.monotonic() - discovered_at >= DISCOVER_EVERY:
+                    discovered_at = time.monotonic()
+                    for log in self.discover():
+                        dirty.append(log)
+                        if notify:
+                            notify.watch(os.path.dirname(log.path))
+                for log in dirty:
+                    self.collect(log)
+                self.release()
+        except KeyboardInterrupt:
+            self.release(flush=True)
+        return 0
+
+
+def parse_args(args):
+    options = {"lines": DEFAULT_LINES, "follow": True, "services": None, "site": None,
+               "level": None, "grep": None, "window": DEFAULT_WINDOW, "since": None,
+               "until": None}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        value = args[index + 1] if index + 1 < len(args) else None
+        takes_value = True
+        if arg in ("-n", "--lines"):
+            options["lines"] = int(value or 0)
+        elif arg == "--service":
+            options["services"] = [s for s in (value or "").split(",") if s]
+        elif arg == "--site":
+            options["site"] = value
+        elif arg == "--level":
+            if (value or "").upper().encode() not in LEVELS:
+                raise ValueError(f"Unknown level: {value}")
+            options["level"] = value
+        elif arg == "--grep":
+            options["grep"] = value
+        elif arg == "--window":
+            options["window"] = float(value or 0)
+        elif arg == "--since":
+            options["since"] = parse_when(value or "")
+        elif arg == "--until":
+            options["until"] = parse_when(value or "")
+            options["follow"] = False
+        else:
+            takes_value = False
+            if arg == "--no-follow":
+                options["follow"] = False
+            elif not arg.startswith("-") and options["services"] is None:
+                # beam logs web  ==  beam logs --service web
+                options["services"] = [arg]
+            else:
+                raise ValueError(f"Unknown option: {arg}")
+        if takes_value and value is None:
+            raise ValueError(f"{arg} needs a value")
+        index += 2 if takes_value else 1
+    return options
 
 
 def main(args):
     """Handle beam logs command"""
-    print("Beam Logs - SaaS Logs")
-    print("This is a placeholder for future SaaS logs functionality.")
-    print("\nArguments received:", args)
-    print("\nYou can extend this module to add your logs viewing logic.")
-    return 0
+    if args and args[0] in ("--help", "-h", "help"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0
+    try:
+        options = parse_args(args)
+        log_filter = Filter(options["services"], options["site"], options["level"], options["grep"])
+    except (ValueError, re.error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    from beam.fanout import find_bench_root
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+
+    tailer = Tailer(bench_root, log_filter, options["window"])
+    if options["since"] is not None or options["until"] is not None:
+        tailer.history(options["since"], options["until"])
+    else:
+        tailer.backlog(options["lines"])
+    if not tailer.files:
+        print("No matching log files", file=sys.stderr)
+    if not options["follow"]:
+        return 0
+    return tailer.follow()
 
 
 if __name__ == "__main__":
     sys.exit(main(sys.argv[1:]))
-
@@ -0,0 +1,502 @@
+"""
+Provision tenant sites from a template snapshot
+
+`bench new-site` followed by install-app runs every installer, patch and
+fixture for each new tenant, which takes minutes. `beam provision` does
+that work once per app-set version instead:
+
+- A template site is created with bench for the requested apps, dumped
+  (database.sql.gz) and its files copied into a snapshot in beam's state
+  directory. The site itself is then dropped.
+- A new tenant gets a fresh database and user with a random password, the
+  snapshot loaded into it, the snapshot's files, a rewritten site_config
+  (new db_name, db_password and encryption_key) and its own Administrator
+  password.
+- Snapshots are keyed by the apps and their versions (git commit, or
+  __version__), so pulling a new version of any app builds a new snapshot
+  on the next provision and removes the old one.
+
+Loading the dump still takes a few seconds for a large app set.
+`beam provision warm --count N` keeps N spare databases loaded from the
+snapshot; a tenant that claims one only needs its tables renamed into the
+new database, which MariaDB does without copying data, so it is ready in
+well under a second. Claimed spares are refilled in the background.
+
+Database root credentials come from --db-root-password,
+$BEAM_DB_ROOT_PASSWORD or root_password in common_site_config.json.
+
+Usage:
+    beam provision <site> [options]          Create a site from the snapshot
+    beam provision snapshot [options]        Build the snapshot now
+    beam provision warm [--count N] [options] Keep N spare databases loaded
+    beam provision list                      Show snapshots for this bench
+    beam provision clear                     Remove this bench's snapshots
+
+Options:
+    --apps a,b               Apps to install besides frappe
+    --admin-password PW      Administrator password (default: generated)
+    --db-root-password PW    MariaDB root password
+    --count N                Spare databases to keep loaded (warm)
+
+Other options are passed to bench new-site when the template is built.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import sys
+import time
+from pathlib import Path
+
+
+# Not copied from the template: bench's own bookkeeping and old backups
+SKIP_SITE_FILES = {"site_config.json", "locks", "logs", "backups"}
+
+# Keys of the template's site_config that belong to the template alone
+PER_SITE_KEYS = {"db_name", "db_password", "db_user", "encryption_key"}
+
+# passlib's default for pbkdf2_sha256, which frappe verifies passwords with
+PBKDF2_ROUNDS = 29000
+
+
+def snapshots_dir():
+    from beam.state import state_dir
+    path = state_dir() / "site-snapshots"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def app_version(bench_root, app):
+    """The installed version of an app: its git commit, else __version__"""
+    from beam.saas.deploy import git
+    app_dir = Path(bench_root) / "apps" / app
+    commit = git(app_dir, "rev-parse", "HEAD")
+    if commit:
+        return commit.strip()
+    try:
+        source = (app_dir / app / "__init__.py").read_text(encoding="utf-8")
+    except OSError:
+        return None
+    match = re.search(r"""__version__\s*=\s*["']([^"']+)""", source)
+    return match.group(1) if match else None
+
+
+def snapshot_key(bench_root, apps):
+    """Key of the snapshot for these apps at their current versions"""
+    versions = [[app, app_version(bench_root, app)] for app in apps]
+    payload = json.dumps({"bench": str(bench_root), "apps": versions})
+    return hashlib.sha256(payload.encode()).hexdigest()[:16], dict(versions)
+
+
+def load_meta(key):
+    from beam.state import load_json
+    return load_json(snapshots_dir() / key / "meta.json")
+
+
+def save_meta(key, meta):
+    from beam.state import save_json
+    save_json(snapshots_dir() / key / "meta.json", meta)
+
+
+def bench_snapshots(bench_root):
+    """[(key, meta)] of the snapshots built for this bench"""
+    found = []
+    for path in snapshots_dir().iterdir():
+        meta = load_meta(path.name) if path.is_dir() else None
+        if meta and meta.get("bench") == str(bench_root):
+            found.append((path.name, meta))
+    return found
+
+
+def db_name_for(site_dir):
+    """Database name for a site, derived the same way frappe does"""
+    return "_" + hashlib.sha1(os.path.realpath(site_dir).encode()).hexdigest()[:16]
+
+
+def password_hash(password):
+    """A pbkdf2_sha256 hash in passlib's format, as stored in __Auth"""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ROUNDS)
+
+    def ab64(data):
+        return base64.b64encode(data).decode().rstrip("=").replace("+", ".")
+
+    return f"$pbkdf2-sha256${PBKDF2_ROUNDS}${ab64(salt)}${ab64(digest)}"
+
+
+def db_user_host(database):
+    """Host part of the accounts bench creates for site databases"""
+    return "localhost" if database.host in ("localhost", "127.0.0.1") else "%"
+
+
+def drop_database(database, name):
+    host = db_user_host(database)
+    database.query(f"DROP DATABASE IF EXISTS `{name}`", timeout=300)
+    database.query(f"DROP USER IF EXISTS '{name}'@'{host}'")
+
+
+# ---------------------------------------------------------------------------
+# Snapshots
+# ---------------------------------------------------------------------------
+
+def copy_site_files(source, target):
+    def ignore(directory, names):
+        return [name for name in names if name in SKIP_SITE_FILES]
+    shutil.copytree(source, target, ignore=ignore, symlinks=True)
+
+
+def build_snapshot(bench_root, apps, key, versions, database, bench, passthrough):
+    """Create, dump and drop a template site; the snapshot's meta or None"""
+    import subprocess
+
+    template = f"beam-template-{key[:8]}.localhost"
+    site_dir = Path(bench_root) / "sites" / template
+    if site_dir.exists():
+        # Left over from an interrupted build
+        from beam.state import load_json
+        leftover = load_json(site_dir / "site_config.json", {}).get("db_name")
+        if leftover:
+            drop_database(database, leftover)
+        shutil.rmtree(site_dir, ignore_errors=True)
+
+    print(f"Building template snapshot for {', '.join(apps)} (once per app versions)...",
+          file=sys.stderr, flush=True)
+    cmd = [bench, "new-site", template, "--admin-password", secrets.token_hex(16)]
+    for app in apps:
+        if app != "frappe":
+            cmd += ["--install-app", app]
+    if database.password:
+        cmd += ["--db-root-password", database.password]
+    start = time.monotonic()
+    if subprocess.run(cmd + passthrough, cwd=bench_root).returncode != 0:
+        print("❌ Could not create the template site", file=sys.stderr)
+        return None
+
+    from beam.state import load_json
+    config = load_json(site_dir / "site_config.json", {})
+    db_name = config.get("db_name") or db_name_for(site_dir)
+    target = snapshots_dir() / key
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    try:
+        if not database.dump(db_name, tmp / "database.sql.gz"):
+            print("❌ Could not dump the template database", file=sys.stderr)
+            return None
+        copy_site_files(site_dir, tmp / "site")
+        shutil.rmtree(target, ignore_errors=True)
+        os.rename(tmp, target)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        drop_database(database, db_name)
+        shutil.rmtree(site_dir, ignore_errors=True)
+
+    meta = {
+        "bench": str(bench_root),
+        "apps": versions,
+        "site_config": {k: v for k, v in config.items() if k not in PER_SITE_KEYS},
+        "created": time.time(),
+        "build_seconds": round(time.monotonic() - start, 1),
+        "spares": [],
+        "warm": 0,
+    }
+    save_meta(key, meta)
+    print(f"✓ Snapshot {key} built in {meta['build_seconds']:.0f}s", file=sys.stderr)
+    return meta
+
+
+def remove_snapshot(key, meta, database):
+    """Delete a snapshot and drop its spare databases"""
+    for spare in meta.get("spares", []):
+        drop_database(database, spare)
+    shutil.rmtree(snapshots_dir() / key, ignore_errors=True)
+
+
+def ensure_snapshot(bench_root, apps, database, bench, passthrough):
+    """(key, meta) of the current snapshot, building it if app versions changed"""
+    from beam.state import FileLock
+
+    key, versions = snapshot_key(bench_root, apps)
+    with FileLock(snapshots_dir() / key):
+        meta = load_meta(key)
+        if meta is None:
+            meta = build_snapshot(bench_root, apps, key, versions, database, bench, passthrough)
+            if meta is None:
+                return key, None
+    # Snapshots of the same apps at older versions are stale now
+    for old_key, old_meta in bench_snapshots(bench_root):
+        if old_key != key and sorted(old_meta.get("apps", {})) == sorted(apps):
+            remove_snapshot(old_key, old_meta, database)
+            print(f"Removed stale snapshot {old_key}", file=sys.stderr)
+    return key, meta
+
+
+# ---------------------------------------------------------------------------
+# Spare databases
+# ---------------------------------------------------------------------------
+
+def claim_spare(key):
+    """Take a spare database off the snapshot's list, or None"""
+    from beam.state import FileLock
+    with FileLock(snapshots_dir() / key):
+        meta = load_meta(key)
+        if not meta or not meta.get("spares"):
+            return None
+        spare = meta["spares"].pop(0)
+        save_meta(key, meta)
+        return spare
+
+
+def warm(key, database, count=None):
+    """Load spare databases until the snapshot has `count`; returns how many were added"""
+    from beam.state import FileLock
+
+    # One warmer per snapshot; a second one has nothing to add
+    with FileLock(snapshots_dir() / f"{key}.warm", blocking=False) as warming:
+        if not warming.acquired:
+            return 0
+        with FileLock(snapshots_dir() / key):
+            meta = load_meta(key)
+            if meta is None:
+                return 0
+            if count is not None:
+                meta["warm"] = count
+                save_meta(key, meta)
+            missing = meta["warm"] - len(meta["spares"])
+
+        added = 0
+        for _ in range(max(0, missing)):
+            spare = f"_beam_spare_{key[:8]}_{secrets.token_hex(4)}"
+            database.query(f"CREATE DATABASE `{spare}` "
+                           "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+            if not database.load(snapshots_dir() / key / "database.sql.gz", spare):
+                drop_database(database, spare)
+                break
+            with FileLock(snapshots_dir() / key):
+                meta = load_meta(key)
+                if meta is None:
+                    drop_database(database, spare)
+                    break
+                meta["spares"].append(spare)
+                save_meta(key, meta)
+            added += 1
+        return added
+
+
+def refill_in_background(options):
+    """Start a detached `beam provision warm` to replace a claimed spare"""
+    import subprocess
+    cmd = [sys.executable, "-m", "beam.cli", "provision", "warm", "--apps", ",".join(options["apps"])]
+    env = dict(os.environ)
+    if options["db_root_password"]:
+        env["BEAM_DB_ROOT_PASSWORD"] = options["db_root_password"]
+    try:
+        subprocess.Popen(cmd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, start_new_session=True)
+    except OSError:
+        pass
+
+
+def move_tables(database, source, target):
+    """Rename every table of source into target; True on success"""
+    rows = database.query(
+        "SELECT table_name, table_type FROM information_schema.tables "
+        f"WHERE table_schema = '{source}'"
+    )
+    if not rows or any(row[1] != "BASE TABLE" for row in rows):
+        # Views can't move between schemas
+        return False
+    renames = ", ".join(f"`{source}`.`{row[0]}` TO `{target}`.`{row[0]}`" for row in rows)
+    return database.query(f"RENAME TABLE {renames}", timeout=60) is not None
+
+
+# ---------------------------------------------------------------------------
+# Provisioning
+# ---------------------------------------------------------------------------
+
+def provision_site(bench_root, site, key, meta, database, admin_password):
+    """Create site from the snapshot; (ok, "spare"|"dump")"""
+    site_dir = Path(bench_root) / "sites" / site
+    db_name = db_name_for(site_dir)
+    db_password = secrets.token_hex(8)
+    host = db_user_host(database)
+
+    created = database.query(f"CREATE DATABASE `{db_name}` "
+                             "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+    if created is None:
+        print(f"❌ Could not create database {db_name} (does it exist, or are the "
+              "root credentials missing?)", file=sys.stderr)
+        return False, None
+
+    source = "dump"
+    spare = claim_spare(key)
+    if spare and move_tables(database, spare, db_name):
+        source = "spare"
+        database.query(f"DROP DATABASE IF EXISTS `{spare}`")
+    else:
+        if spare:
+            drop_database(database, spare)
+        if not database.load(snapshots_dir() / key / "database.sql.gz", db_name):
+            print("❌ Could not load the snapshot", file=sys.stderr)
+            drop_database(database, db_name)
+            return False, source
+
+    ok = all(database.query(sql) is not None for sql in [
+        f"CREATE USER '{db_name}'@'{host}' IDENTIFIED BY '{db_password}'",
+        f"GRANT ALL PRIVILEGES ON `{db_name}`.* TO '{db_name}'@'{host}'",
+        "FLUSH PRIVILEGES",
+        f"UPDATE `{db_name}`.`__Auth` SET `password` = '{password_hash(admin_password)}' "
+        "WHERE doctype = 'User' AND name = 'Administrator' AND fieldname = 'password'",
+        # Encrypted with the template's key, which the tenant doesn't get
+        f"DELETE FROM `{db_name}`.`__Auth` WHERE encrypted = 1",
+    ])
+    if not ok:
+        print("❌ Could not set up the site's database account", file=sys.stderr)
+        drop_database(database, db_name)
+        return False, source
+
+    from beam.state import save_json
+    copy_site_files(snapshots_dir() / key / "site", site_dir)
+    config = dict(meta.get("site_config", {}))
+    config.update({
+        "db_name": db_name,
+        "db_password": db_password,
+        # Same format as cryptography's Fernet.generate_key()
+        "encryption_key": base64.urlsafe_b64encode(os.urandom(32)).decode(),
+    })
+    save_json(site_dir / "site_config.json", config)
+    return True, source
+
+
+def parse_args(args):
+    options = {"action": None, "site": None, "apps": [], "admin_password": None,
+               "db_root_password": None, "count": None, "passthrough": []}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        value = args[index + 1] if index + 1 < len(args) else None
+        if arg in ("--apps", "--admin-password", "--db-root-password",
+                   "--mariadb-root-password", "--count"):
+            if value is None:
+                raise ValueError(f"{arg} needs a value")
+            if arg == "--apps":
+                options["apps"] += [app.strip() for app in value.split(",") if app.strip()]
+            elif arg == "--admin-password":
+                options["admin_password"] = value
+            elif arg == "--count":
+                options["count"] = int(value)
+            else:
+                options["db_root_password"] = value
+            index += 2
+            continue
+        if arg.startswith("-"):
+            options["passthrough"].append(arg)
+        elif options["action"] is None:
+            if arg in ("snapshot", "warm", "list", "clear"):
+                options["action"] = arg
+            else:
+                options["action"] = "site"
+                options["site"] = arg
+        else:
+            options["passthrough"].append(arg)
+        index += 1
+    options["apps"] = ["frappe"] + [app for app in options["apps"] if app != "frappe"]
+    return options
+
+
+def show_snapshots(bench_root):
+    snapshots = bench_snapshots(bench_root)
+    if not snapshots:
+        print("No snapshots for this bench yet")
+        return 0
+    for key, meta in sorted(snapshots, key=lambda item: item[1].get("created", 0)):
+        apps = ", ".join(f"{app}@{(version or '?')[:10]}" for app, version in meta["apps"].items())
+        age = (time.time() - meta.get("created", time.time())) / 3600
+        print(f"  {key}  {apps}")
+        print(f"      built {age:.1f}h ago in {meta.get('build_seconds', 0):.0f}s, "
+              f"{len(meta.get('spares', []))}/{meta.get('warm', 0)} spare database(s)")
+    return 0
+
+
+def main(args):
+    """Handle beam provision command"""
+    if not args or args[0] in ("--help", "-h", "help"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0 if args else 1
+    try:
+        options = parse_args(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    from beam.fanout import find_bench_root, list_apps
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+
+    from beam.migrations import Database
+    database = Database(bench_root, options["db_root_password"])
+    action = options["action"]
+
+    if action == "list":
+        return show_snapshots(bench_root)
+    if action == "clear":
+        snapshots = bench_snapshots(bench_root)
+        for key, meta in snapshots:
+            remove_snapshot(key, meta, database)
+        print(f"✓ Removed {len(snapshots)} snapshot(s)")
+        return 0
+
+    missing = [app for app in options["apps"] if app not in list_apps(bench_root)]
+    if missing:
+        print(f"Error: not installed in this bench: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    if not database.client or not database.dumper:
+        print("Error: the mariadb client and mariadb-dump are needed for snapshots", file=sys.stderr)
+        return 1
+
+    if action == "warm":
+        key, _ = snapshot_key(bench_root, options["apps"])
+        if load_meta(key) is None:
+            print("No snapshot for the current app versions - run 'beam provision snapshot' first",
+                  file=sys.stderr)
+            return 1
+        start = time.monotonic()
+        added = warm(key, database, options["count"])
+        print(f"✓ Loaded {added} spare database(s) in {time.monotonic() - start:.1f}s")
+        return 0
+
+    from beam.cli import ensure_bench_installed
+    bench = ensure_bench_installed()
+    key, meta = ensure_snapshot(bench_root, options["apps"], database, bench, options["passthrough"])
+    if meta is None:
+        return 1
+    if action == "snapshot":
+        print(f"✓ Snapshot {key} is current")
+        return 0
+
+    site = options["site"]
+    if (Path(bench_root) / "sites" / site).exists():
+        print(f"Error: site {site} already exists", file=sys.stderr)
+        return 1
+    admin_password = options["admin_password"] or secrets.token_urlsafe(12)
+    start = time.monotonic()
+    ok, source = provision_site(bench_root, site, key, meta, database, admin_password)
+    if not ok:
+        return 1
+    print(f"✓ Site {site} provisioned from snapshot {key} "
+          f"({'spare database' if source == 'spare' else 'loaded dump'}) "
+          f"in {time.monotonic() - start:.2f}s")
+    if not options["admin_password"]:
+        print(f"  Administrator password: {admin_password}")
+    if meta.get("warm"):
+        refill_in_background(options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
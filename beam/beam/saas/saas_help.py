@@ -10,19 +10,26 @@ def main(args):
 
 Available SaaS Commands:
     deploy            Deploy application to cloud
-                      Usage: beam deploy [environment]
+                      Usage: beam deploy [environment] [--dry-run] [--force]
+                      Skips stages whose inputs haven't changed
                       
-    scale             Scale application resources
-                      Usage: beam scale [up|down] [resources]
+    provision         Create a tenant site from a template snapshot
+                      Usage: beam provision <site> [--apps a,b] [--admin-password PW]
+                      beam provision warm --count N keeps spare databases loaded
                       
-    monitor           Monitor application health
-                      Usage: beam monitor [options]
+    scale             Size RQ worker pools to their queues
+                      Usage: beam scale auto [--bounds ROLE=MIN:MAX] [--dry-run]
+                             beam scale status
                       
-    logs              View application logs
-                      Usage: beam logs [service] [options]
+    monitor           Live CPU, memory, fds and context switches per process
+                      Usage: beam monitor [--interval S] [--prometheus PORT] [--no-view]
                       
-    status            Check application status
-                      Usage: beam status [service]
+    logs              Follow every bench and site log, merged by timestamp
+                      Usage: beam logs [service] [--site S] [--level L] [--grep RE]
+                                       [--since WHEN] [--until WHEN]
+                      
+    status            Check database, Redis, sites and processes concurrently
+                      Usage: beam status [db|redis|sites|processes] [--timeout S] [--all]
 
 These commands are extensible and can be customized for your SaaS platform.
 Modify the files in beam/beam/saas/ to add your custom logic.
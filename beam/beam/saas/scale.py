@@ -1,18 +1,524 @@
 """
 Scale command for SaaS functionality
+
+`beam scale auto` sizes the bench's RQ worker pools (long, default,
+short) to their queues. Every --interval it reads from the queue Redis:
+
+- each queue's length and the age of its oldest job (rq:queue:*, rq:job:*)
+- each worker's state, giving how busy every pool is (rq:workers)
+
+and starts or stops single processes of the matching supervisor worker
+program. Each program is declared once with numprocs at its maximum, so
+scaling never edits the config again or restarts running workers; a
+stopped worker finishes its current job first (RQ's warm shutdown).
+`bench setup supervisor` resets numprocs; the next `beam scale auto`
+declares it again.
+
+A pool grows when its oldest job has waited --up-age, or it has more
+than --up-backlog jobs per worker, while its workers are busy. It shrinks
+one worker at a time, and only after its queue has been empty and its
+workers mostly idle for --down-after. Every change starts a --cooldown for
+that pool; the gap between the two conditions keeps pools from flapping.
+
+Usage:
+    beam scale auto [options]
+    beam scale status
+
+Options:
+    --bounds [ROLE=]MIN:MAX,... Pool sizes allowed (default 1:<cpu count> each)
+    --interval SECONDS          Time between decisions (default 10)
+    --up-age SECONDS            Oldest job age that adds workers (default 30)
+    --up-backlog N              Queued jobs per worker that add workers (default 10)
+    --cooldown SECONDS          Minimum time between changes to a pool (default 60)
+    --down-after SECONDS        Idle time before a worker is removed (default 300)
+    --dry-run                   Log decisions without starting or stopping workers
+    --once                      Make one decision and exit
 """
+import math
+import os
+import re
 import sys
+import time
+
+
+ROLES = ("long", "default", "short")
+DEFAULT_INTERVAL = 10.0
+DEFAULT_UP_AGE = 30.0
+DEFAULT_UP_BACKLOG = 10
+DEFAULT_COOLDOWN = 60.0
+DEFAULT_DOWN_AFTER = 300.0
+# Busy fraction a pool needs before a backlog adds workers...
+UP_UTILIZATION = 0.75
+# ...and the smoothed fraction it must stay under to lose one
+DOWN_UTILIZATION = 0.3
+# Seconds over which utilization is smoothed
+SMOOTHING = 60.0
+ACTIVE_STATES = ("RUNNING", "STARTING", "BACKOFF")
+
+
+class RedisError(Exception):
+    pass
+
+
+class Redis:
+    """A minimal blocking RESP client: just enough for RQ's keys"""
+
+    def __init__(self, url, timeout=5.0):
+        import socket
+        from beam.saas.status import split_url
+
+        host, port, username, password = split_url(url, 6379)
+        self.sock = socket.create_connection((host, port), timeout)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.pipeline([["AUTH", username, password] if username else ["AUTH", password]])
+
+    def pipeline(self, commands):
+        """Replies to several commands, sent in one write"""
+        if not commands:
+            return []
+        payload = bytearray()
+        for command in commands:
+            payload += b"*%d\r\n" % len(command)
+            for part in command:
+                part = part if isinstance(part, bytes) else str(part).encode()
+                payload += b"$%d\r\n%s\r\n" % (len(part), part)
+        self.sock.sendall(payload)
+        replies = [self.read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def read(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RedisError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else self.reader.read(length + 2)[:-2].decode(errors="replace")
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self.read() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def role_of(queue):
+    """long/default/short of an RQ queue (frappe prefixes it with the bench id)"""
+    return queue.rsplit(":", 1)[-1]
+
+
+def parse_rq_time(value):
+    """Epoch seconds of RQ's UTC timestamps (2024-01-31T02:10:05.123456Z)"""
+    import calendar
+    stamp = calendar.timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S"))
+    fraction = value[19:].rstrip("Z")
+    return stamp + (float(fraction) if fraction.startswith(".") and len(fraction) > 1 else 0.0)
+
+
+def read_queues(redis, now=None):
+    """{role: {queued, age, workers, busy}} from RQ's keys, in three round trips"""
+    now = time.time() if now is None else now
+    queues, workers = redis.pipeline([["SMEMBERS", "rq:queues"], ["SMEMBERS", "rq:workers"]])
+    queues, workers = sorted(queues or []), sorted(workers or [])
+    replies = redis.pipeline(
+        [command for key in queues for command in (["LLEN", key], ["LINDEX", key, 0])]
+        + [["HMGET", key, "state", "queues"] for key in workers])
+
+    stats = {}
+
+    def entry(role):
+        return stats.setdefault(role, {"queued": 0, "age": 0.0, "workers": 0, "busy": 0})
+
+    oldest = {}
+    for position, key in enumerate(queues):
+        role = role_of(key[len("rq:queue:"):])
+        entry(role)["queued"] += replies[2 * position]
+        if replies[2 * position + 1]:
+            oldest[replies[2 * position + 1]] = role
+    for state, names in replies[2 * len(queues):]:
+        # A worker belongs to the pool of the first queue it listens on
+        first = (names or "").split(",")[0]
+        worker = entry(role_of(first) if first else "default")
+        worker["workers"] += 1
+        if state == "busy":
+            worker["busy"] += 1
+
+    jobs = list(oldest)
+    stamps = redis.pipeline([["HGET", f"rq:job:{job}", "enqueued_at"] for job in jobs])
+    for job, stamp in zip(jobs, stamps):
+        if stamp:
+            try:
+                age = now - parse_rq_time(stamp)
+            except ValueError:
+                continue
+            entry(oldest[job])["age"] = max(entry(oldest[job])["age"], age)
+    return stats
+
+
+def worker_programs(conf_path):
+    """{role: program} for the bench's RQ worker programs in a supervisor.conf"""
+    import configparser
+    parser = configparser.RawConfigParser(strict=False)
+    parser.read(conf_path, encoding="utf-8")
+    groups = {}
+    for section in parser.sections():
+        if section.startswith("group:"):
+            for program in parser.get(section, "programs", fallback="").split(","):
+                groups[program.strip()] = section[6:]
+    programs = {}
+    for section in parser.sections():
+        argv = parser.get(section, "command", fallback="").split()
+        if not section.startswith("program:") or "worker" not in argv:
+            continue
+        queue = argv[argv.index("--queue") + 1].split(",")[0] if "--queue" in argv[:-1] else "default"
+        name = section[8:]
+        programs[role_of(queue)] = {
+            "program": name,
+            "group": groups.get(name),
+            "numprocs": parser.getint(section, "numprocs", fallback=1),
+            "start": parser.getint(section, "numprocs_start", fallback=0),
+            "process_name": parser.get(section, "process_name", fallback="%(program_name)s"),
+        }
+    return programs
+
+
+def set_numprocs(conf_path, program, count):
+    """Declare count processes of a program, editing only its section"""
+    from beam.tuning import write_text
+
+    with open(conf_path, encoding="utf-8") as f:
+        text = f.read()
+    start = text.index(f"[program:{program}]")
+    end = text.find("\n[", start + 1)
+    end = len(text) if end < 0 else end + 1
+    section = text[start:end]
+    if re.search(r"^numprocs\s*=", section, re.M):
+        section = re.sub(r"^numprocs\s*=.*$", f"numprocs={count}", section, flags=re.M)
+    else:
+        section = section.rstrip("\n") + f"\nnumprocs={count}\n"
+    if "process_num" not in section:
+        # Several processes need distinct names
+        section = re.sub(r"^process_name\s*=.*\n", "", section, flags=re.M)
+        section = section.rstrip("\n") + "\nprocess_name=%(program_name)s-%(process_num)d\n"
+    if end < len(text) and not section.endswith("\n\n"):
+        section += "\n"
+    write_text(conf_path, text[:start] + section + text[end:])
+
+
+def supervisor_states():
+    """{group:process: state} from supervisorctl"""
+    import subprocess
+    result = subprocess.run(["supervisorctl", "status"], capture_output=True, text=True, timeout=30)
+    states = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            states[parts[0]] = parts[1]
+    return states
+
+
+class Pool:
+    """One worker pool: its bounds, processes and scaling state"""
+
+    def __init__(self, role, low, high, program=None):
+        self.role = role
+        self.low = low
+        self.high = high
+        self.program = program
+        self.names = []
+        if program:
+            for number in range(program["start"], program["start"] + high):
+                name = program["process_name"] % {"program_name": program["program"],
+                                                  "process_num": number,
+                                                  "group_name": program["group"] or ""}
+                group = program["group"] or program["program"]
+                # supervisorctl names a lone process after itself, not group:name
+                self.names.append(name if name == group else f"{group}:{name}")
+        self.running = 0
+        self.target = None
+        self.changed_at = float("-inf")
+        self.idle_since = None
+        self.utilization = None
+        self.action = None
+
+    @property
+    def size(self):
+        return self.target if self.target is not None else self.running
+
+
+def decide(pool, stats, now, options):
+    """(new size, reason); reason is None when the pool stays as it is"""
+    size = pool.size
+    queued, age = stats.get("queued", 0), stats.get("age", 0.0)
+    workers, busy = stats.get("workers", 0), stats.get("busy", 0)
+    utilization = busy / workers if workers else (1.0 if queued else 0.0)
+    if pool.utilization is None:
+        pool.utilization = utilization
+    else:
+        weight = min(1.0, options["interval"] / SMOOTHING)
+        pool.utilization += weight * (utilization - pool.utilization)
+
+    if queued == 0 and pool.utilization <= DOWN_UTILIZATION:
+        pool.idle_since = now if pool.idle_since is None else pool.idle_since
+    else:
+        pool.idle_since = None
+
+    if size < pool.low:
+        return pool.low, f"below minimum {pool.low}"
+    if size > pool.high:
+        return pool.high, f"above maximum {pool.high}"
+    if now - pool.changed_at < options["cooldown"]:
+        return size, None
+
+    load = f"{queued} queued, oldest {age:.0f}s, {busy}/{workers} busy"
+    pressure = queued and (age >= options["up_age"] or queued > options["up_backlog"] * max(size, 1))
+    if pressure and utilization >= UP_UTILIZATION and size < pool.high:
+        # Half as many again (at least one), or what the backlog asks for
+        wanted = max(size + 1, size + size // 2, math.ceil(queued / options["up_backlog"]))
+        return min(pool.high, wanted), load
+    if pool.idle_since is not None and now - pool.idle_since >= options["down_after"] \
+            and size > pool.low:
+        pool.idle_since = now
+        return size - 1, f"idle {options['down_after']:.0f}s, {pool.utilization:.0%} busy"
+    return size, None
+
+
+class Scaler:
+    """The control loop: observe, decide, start/stop supervisor processes"""
+
+    def __init__(self, bench_root, options):
+        from beam.state import load_json
+
+        self.bench_root = str(bench_root)
+        self.options = options
+        self.conf = os.path.join(self.bench_root, "config", "supervisor.conf")
+        config = load_json(os.path.join(self.bench_root, "sites", "common_site_config.json"), {})
+        self.redis_url = (config or {}).get("redis_queue") or "redis://127.0.0.1:11000"
+        self.redis = None
+        self.pools = {}
+
+    def log(self, message):
+        prefix = "[dry run] " if self.options["dry_run"] else ""
+        print(f"{time.strftime('%H:%M:%S')} {prefix}{message}", flush=True)
+
+    def setup(self):
+        """Pools for every worker program, declared at their maximum size"""
+        programs = worker_programs(self.conf) if os.path.exists(self.conf) else {}
+        if not programs and not self.options["dry_run"]:
+            raise RuntimeError(f"no worker programs in {self.conf} "
+                               "(run beam setup production, or use --dry-run)")
+        short_of_max = [role for role, program in programs.items()
+                        if program["numprocs"] < self.bounds(role)[1]]
+        if short_of_max and not self.options["dry_run"]:
+            import subprocess
+            before = self.observe_supervisor(programs)
+            for role in short_of_max:
+                set_numprocs(self.conf, programs[role]["program"], self.bounds(role)[1])
+                self.log(f"{role}: declared {self.bounds(role)[1]} processes in supervisor.conf")
+            programs = worker_programs(self.conf)
+            subprocess.run(["supervisorctl", "reread"], capture_output=True, timeout=60)
+            # Restarts these workers once; later changes start/stop single processes
+            groups = {programs[role]["group"] or programs[role]["program"] for role in short_of_max}
+            subprocess.run(["supervisorctl", "update", *sorted(groups)], capture_output=True, timeout=600)
+            for role in short_of_max:
+                # update started every declared process; go back to the earlier size
+                self.pools[role] = pool = Pool(role, *self.bounds(role), programs[role])
+                self.apply(pool, max(pool.low, min(pool.high, before.get(role, pool.low))))
+        # Without a supervisor config (dry run) the pools are RQ's own
+        for role in sorted(programs) or ROLES:
+            if role not in self.pools:
+                self.pools[role] = Pool(role, *self.bounds(role), programs.get(role))
+
+    def bounds(self, role):
+        bounds = self.options["bounds"]
+        return bounds.get(role) or bounds.get("*") or (1, max(1, os.cpu_count() or 1))
+
+    def observe_supervisor(self, programs):
+        """{role: running process count}"""
+        states = supervisor_states()
+        counts = {}
+        for role, program in programs.items():
+            prefix = f"{program['group'] or program['program']}:"
+            counts[role] = sum(1 for name, state in states.items()
+                               if name.startswith(prefix) and state in ACTIVE_STATES
+                               and program["program"] in name)
+        return counts
+
+    def observe(self):
+        """Queue stats per role; refreshes each pool's running count"""
+        if self.redis is None:
+            self.redis = Redis(self.redis_url)
+        try:
+            stats = read_queues(self.redis)
+        except (OSError, RedisError):
+            self.redis.close()
+            self.redis = None
+            raise
+        states = supervisor_states() if any(pool.names for pool in self.pools.values()) else {}
+        for role, pool in self.pools.items():
+            if pool.names:
+                pool.running = sum(1 for name in pool.names if states.get(name) in ACTIVE_STATES)
+            else:
+                pool.running = stats.get(role, {}).get("workers", 0)
+        return stats
+
+    def apply(self, pool, size):
+        """Start or stop processes to bring the pool to size, without waiting"""
+        import subprocess
+        states = supervisor_states()
+        active = [name for name in pool.names if states.get(name) in ACTIVE_STATES]
+        if size > len(active):
+            names = [name for name in pool.names if name not in active][:size - len(active)]
+            verb = "start"
+        else:
+            # The highest-numbered ones go first
+            names = active[size:]
+            verb = "stop"
+        if names:
+            pool.action = subprocess.Popen(["supervisorctl", verb, *names],
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def step(self, now=None):
+        now = time.monotonic() if now is None else now
+        stats = self.observe()
+        for role, pool in sorted(self.pools.items()):
+            if pool.action is not None:
+                if pool.action.poll() is None:
+                    # A stop waits for the worker's current job; decide again after it
+                    continue
+                pool.action = None
+            if not self.options["dry_run"]:
+                # Once supervisorctl is done, what supervisor reports is the size
+                pool.target = None
+            current = pool.size
+            size, reason = decide(pool, stats.get(role, {}), now, self.options)
+            if reason is None or size == current:
+                continue
+            self.log(f"{role:<8} {current} -> {size} workers ({reason})")
+            pool.changed_at = now
+            pool.target = size
+            if not self.options["dry_run"] and pool.names:
+                self.apply(pool, size)
+
+    def run(self):
+        self.setup()
+        for role, pool in sorted(self.pools.items()):
+            where = pool.program["program"] if pool.program else "not in supervisor.conf"
+            self.log(f"{role:<8} {pool.low}-{pool.high} workers ({where})")
+        next_at = time.monotonic()
+        try:
+            while True:
+                try:
+                    self.step()
+                except (OSError, RedisError) as e:
+                    self.log(f"⚠️  cannot read queues from {self.redis_url}: {e}")
+                if self.options["once"]:
+                    return 0
+                next_at += self.options["interval"]
+                time.sleep(max(0.0, next_at - time.monotonic()))
+        except KeyboardInterrupt:
+            return 0
+
+
+def print_status(scaler):
+    scaler.setup()
+    stats = scaler.observe()
+    print(f"{'POOL':<10}{'WORKERS':>9}{'BUSY':>7}{'QUEUED':>8}{'OLDEST':>9}  PROGRAM")
+    for role in sorted(set(stats) | set(scaler.pools)):
+        pool = scaler.pools.get(role)
+        entry = stats.get(role, {})
+        workers = f"{pool.running}/{pool.high}" if pool and pool.names else str(entry.get("workers", 0))
+        program = pool.program["program"] if pool and pool.program else "-"
+        print(f"{role:<10}{workers:>9}{entry.get('busy', 0):>7}{entry.get('queued', 0):>8}"
+              f"{entry.get('age', 0.0):>8.0f}s  {program}")
+    return 0
+
+
+def parse_bounds(value):
+    """{role: (min, max)}; a bare MIN:MAX applies to every role ('*')"""
+    bounds = {}
+    for part in value.split(","):
+        role, sep, limits = part.rpartition("=")
+        low, colon, high = limits.partition(":")
+        if not colon:
+            raise ValueError(f"Bad bounds: {part} (use ROLE=MIN:MAX)")
+        low, high = int(low), int(high)
+        if low < 0 or high < max(low, 1):
+            raise ValueError(f"Bad bounds: {part}")
+        bounds[role.strip() if sep else "*"] = (low, high)
+    return bounds
+
+
+def parse_args(args):
+    options = {"bounds": {}, "interval": DEFAULT_INTERVAL, "up_age": DEFAULT_UP_AGE,
+               "up_backlog": DEFAULT_UP_BACKLOG, "cooldown": DEFAULT_COOLDOWN,
+               "down_after": DEFAULT_DOWN_AFTER, "dry_run": False, "once": False}
+    numbers = {"--interval": "interval", "--up-age": "up_age", "--cooldown": "cooldown",
+               "--down-after": "down_after"}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        value = args[index + 1] if index + 1 < len(args) else None
+        if arg in numbers or arg in ("--bounds", "--up-backlog"):
+            if value is None:
+                raise ValueError(f"{arg} needs a value")
+            if arg == "--bounds":
+                options["bounds"].update(parse_bounds(value))
+            elif arg == "--up-backlog":
+                options["up_backlog"] = max(1, int(value))
+            else:
+                options[numbers[arg]] = float(value)
+            index += 2
+            continue
+        if arg == "--dry-run":
+            options["dry_run"] = True
+        elif arg == "--once":
+            options["once"] = True
+        else:
+            raise ValueError(f"Unknown option: {arg}")
+        index += 1
+    return options
 
 
 def main(args):
     """Handle beam scale command"""
-    print("Beam Scale - SaaS Scaling")
-    print("This is a placeholder for future SaaS scaling functionality.")
-    print("\nArguments received:", args)
-    print("\nYou can extend this module to add your scaling logic.")
-    return 0
+    if not args or args[0] in ("--help", "-h", "help") or args[0] not in ("auto", "status"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0 if not args or args[0] in ("--help", "-h", "help") else 1
+    try:
+        options = parse_args(args[1:])
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    from beam.fanout import find_bench_root
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+
+    scaler = Scaler(bench_root, options)
+    try:
+        if args[0] == "status":
+            scaler.options["dry_run"] = True
+            return print_status(scaler)
+        return scaler.run()
+    except (OSError, RedisError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
 
 
 if __name__ == "__main__":
     sys.exit(main(sys.argv[1:]))
-
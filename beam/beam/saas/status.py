@@ -1,18 +1,405 @@
 """
 Status command for SaaS functionality
+
+`beam status` checks the whole bench at once:
+
+- MariaDB: a TCP connect and the server's handshake packet (no login)
+- Redis cache, queue and socketio: PING
+- Every site: GET /api/method/ping through the web server, with the site
+  as the Host header
+- The bench's supervisor programs or systemd units
+
+All probes run concurrently on one asyncio loop, each under its own
+timeout, so a check of 300 sites takes about as long as the slowest
+probe rather than the sum of them. Site requests share a pool of HTTP
+keep-alive connections (--connections) instead of connecting per site.
+
+Usage:
+    beam status [check ...] [options]
+
+Checks:
+    db, redis, sites, processes (default: all)
+
+Options:
+    --timeout SECONDS    Timeout of each probe (default 5)
+    --connections N      Keep-alive connections to the web server (default 50)
+    --url URL            Web server for site checks (default: port 80 when
+                         nginx is set up, else the bench's webserver_port)
+    --all                List every site, not only failing ones
 """
+import asyncio
+import os
+import shutil
 import sys
+import time
+
+
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_CONNECTIONS = 50
+PING_PATH = "/api/method/ping"
+CHECKS = ("db", "redis", "sites", "processes")
+ALIASES = {"mariadb": "db", "database": "db", "site": "sites", "web": "sites",
+           "process": "processes", "supervisor": "processes"}
+
+OK, FAILED, UNKNOWN = "✓", "✗", "-"
+
+
+def format_latency(seconds):
+    if seconds is None:
+        return "-"
+    return f"{seconds * 1000:.1f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def split_url(url, default_port):
+    """(host, port, username, password) of a redis:// or http:// URL"""
+    from urllib.parse import urlsplit
+    parts = urlsplit(url if "://" in url else f"tcp://{url}")
+    return parts.hostname or "127.0.0.1", parts.port or default_port, parts.username, parts.password
+
+
+async def timed(name, target, probe, timeout):
+    """Run a probe coroutine returning (ok, detail) as a result row"""
+    started = time.monotonic()
+    try:
+        ok, detail = await asyncio.wait_for(probe, timeout)
+    except asyncio.TimeoutError:
+        ok, detail = False, f"timed out after {timeout:g}s"
+    except OSError as e:
+        # asyncio reports "Connect call failed (host, port)"; the errno says why
+        reason = os.strerror(e.errno) if e.errno and e.errno > 0 else None
+        ok, detail = False, reason or e.strerror or str(e) or type(e).__name__
+    except asyncio.LimitOverrunError:
+        ok, detail = False, "response headers too large"
+    except (EOFError, asyncio.IncompleteReadError, ValueError) as e:
+        ok, detail = False, str(e) or type(e).__name__
+    return {"name": name, "target": target, "ok": ok,
+            "latency": time.monotonic() - started, "detail": detail}
+
+
+async def mariadb_handshake(host, port):
+    """The server greeting: its version, or the error it sends instead"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        header = await reader.readexactly(4)
+        payload = await reader.readexactly(int.from_bytes(header[:3], "little"))
+    finally:
+        writer.close()
+    if payload[:1] == b"\xff":
+        # Sent instead of a greeting: too many connections, host blocked...
+        code = int.from_bytes(payload[1:3], "little")
+        return False, f"error {code}: {payload[3:].decode(errors='replace')}"
+    if payload[:1] == b"\x0a":
+        version = payload[1:payload.index(b"\0", 1)].decode(errors="replace")
+        return True, version.replace("5.5.5-", "", 1)
+    return False, "not a MariaDB/MySQL server"
+
+
+async def redis_ping(host, port, username=None, password=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        commands = []
+        if password:
+            commands.append(["AUTH", username, password] if username else ["AUTH", password])
+        commands.append(["PING"])
+        for command in commands:
+            writer.write(f"*{len(command)}\r\n".encode() + b"".join(
+                f"${len(part.encode())}\r\n{part}\r\n".encode() for part in command))
+        await writer.drain()
+        replies = [await reader.readline() for _ in commands]
+    finally:
+        writer.close()
+    for reply in replies:
+        if not reply.startswith(b"+"):
+            return False, reply.decode(errors="replace").strip() or "connection closed"
+    return True, "PONG"
+
+
+class HTTPPool:
+    """HTTP/1.1 keep-alive connections to one web server, shared by every site check"""
+
+    def __init__(self, host, port, size):
+        self.host = host
+        self.port = port
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+        self.opened = 0
+
+    async def get(self, site, path):
+        """(status, location) of a GET, on an idle connection if there is one"""
+        while self.idle:
+            try:
+                return await self.request(self.idle.pop(), site, path)
+            except (OSError, asyncio.IncompleteReadError):
+                # The server closed it while it sat idle
+                continue
+        self.opened += 1
+        return await self.request(await asyncio.open_connection(self.host, self.port), site, path)
+
+    async def request(self, connection, site, path):
+        reader, writer = connection
+        reusable = False
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {site}\r\n"
+                         f"User-Agent: beam-status\r\nAccept: application/json\r\n\r\n".encode())
+            await writer.drain()
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+            version, status = head[0].split()[:2]
+            headers = {}
+            for line in head[1:]:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            if "content-length" in headers:
+                await reader.readexactly(int(headers["content-length"]))
+            elif headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    await reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+            else:
+                await reader.read()
+                headers["connection"] = "close"
+            reusable = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            return int(status), headers.get("location")
+        finally:
+            # A cancelled (timed out) request leaves the connection mid-response
+            if reusable:
+                self.idle.append(connection)
+            else:
+                writer.close()
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+async def site_ping(pool, site):
+    status, location = await pool.get(site, PING_PATH)
+    if status == 200:
+        return True, "HTTP 200"
+    if 300 <= status < 400:
+        return True, f"HTTP {status} -> {location}"
+    return False, f"HTTP {status}"
+
+
+async def check_site(pool, site, target, timeout):
+    # Time spent waiting for a pooled connection is not the site's latency
+    async with pool.slots:
+        return await timed(site, target, site_ping(pool, site), timeout)
+
+
+async def run_command(argv):
+    process = await asyncio.create_subprocess_exec(
+        *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        stdin=asyncio.subprocess.DEVNULL)
+    try:
+        output, _ = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        raise
+    return process.returncode, output.decode(errors="replace")
+
+
+async def supervisor_states(bench_name):
+    """[(program, ok, detail)] of the bench's supervisor programs"""
+    _, output = await run_command(["supervisorctl", "status"])
+    rows = []
+    for line in output.splitlines():
+        parts = line.split(None, 2)
+        # bench names its groups and programs <bench>-web:<bench>-frappe-web
+        if len(parts) >= 2 and parts[0].startswith(f"{bench_name}-"):
+            detail = parts[2].strip() if len(parts) > 2 else ""
+            rows.append((parts[0], parts[1] == "RUNNING", f"{parts[1]} {detail}".strip()))
+    return rows
+
+
+async def systemd_states(bench_name):
+    """[(unit, ok, detail)] of the bench's systemd services"""
+    _, output = await run_command(["systemctl", "list-units", "--all", "--no-legend",
+                                   "--plain", f"{bench_name}-*.service"])
+    rows = []
+    for line in output.splitlines():
+        parts = line.split(None, 4)
+        if len(parts) >= 4 and parts[0].endswith(".service"):
+            rows.append((parts[0][:-8], parts[2] == "active" and parts[3] == "running",
+                         f"{parts[2]} ({parts[3]})"))
+    return rows
+
+
+async def check_processes(bench_name, timeout):
+    for program, states in (("supervisorctl", supervisor_states), ("systemctl", systemd_states)):
+        if not shutil.which(program):
+            continue
+        started = time.monotonic()
+        try:
+            rows = await asyncio.wait_for(states(bench_name), timeout)
+        except asyncio.TimeoutError:
+            return [{"name": program, "target": "", "ok": False, "latency": timeout,
+                     "detail": f"timed out after {timeout:g}s"}]
+        except OSError as e:
+            return [{"name": program, "target": "", "ok": False, "latency": None, "detail": str(e)}]
+        elapsed = time.monotonic() - started
+        if rows:
+            return [{"name": name, "target": program.replace("ctl", ""), "ok": ok,
+                     "latency": elapsed, "detail": detail} for name, ok, detail in rows]
+    return [{"name": "processes", "target": "", "ok": None, "latency": None,
+             "detail": "not managed by supervisor or systemd (use beam start / beam monitor)"}]
+
+
+def web_address(bench_root, config, url=None):
+    """(host, port) site checks are sent to"""
+    if url:
+        if url.startswith("https://"):
+            raise ValueError("--url must be plain http (use the web server's http port)")
+        host, port, _, _ = split_url(url, 80)
+        return host, port
+    if os.path.exists(os.path.join(bench_root, "config", "nginx.conf")):
+        return "127.0.0.1", 80
+    return "127.0.0.1", int(config.get("webserver_port") or 8000)
+
+
+async def gather_checks(bench_root, options):
+    """Every requested probe, run concurrently; (service rows, site rows)"""
+    from beam.fanout import list_sites
+    from beam.state import load_json
+
+    config = load_json(os.path.join(bench_root, "sites", "common_site_config.json"), {}) or {}
+    timeout = options["timeout"]
+    checks = options["checks"]
+    services = []
+
+    if "db" in checks:
+        host = config.get("db_host") or "127.0.0.1"
+        port = int(config.get("db_port") or 3306)
+        services.append(timed("mariadb", f"{host}:{port}", mariadb_handshake(host, port), timeout))
+
+    if "redis" in checks:
+        # queue and socketio are often the same instance: one PING for both
+        names = {}
+        for key in ("redis_cache", "redis_queue", "redis_socketio"):
+            if config.get(key):
+                names.setdefault(config[key], []).append(key[6:])
+        for url, roles in names.items():
+            host, port, username, password = split_url(url, 6379)
+            services.append(timed(f"redis {'+'.join(roles)}", f"{host}:{port}",
+                                  redis_ping(host, port, username, password), timeout))
+
+    pool = None
+    sites = []
+    if "sites" in checks:
+        host, port = web_address(bench_root, config, options["url"])
+        pool = HTTPPool(host, port, options["connections"])
+        target = f"{host}:{port}"
+        sites = [check_site(pool, site, target, timeout) for site in list_sites(bench_root)]
+
+    processes = []
+    if "processes" in checks:
+        processes = [check_processes(os.path.basename(os.path.abspath(bench_root)), timeout)]
+
+    try:
+        results = await asyncio.gather(*services, *processes, *sites)
+    finally:
+        if pool:
+            pool.close()
+    service_rows = list(results[:len(services)])
+    for rows in results[len(services):len(services) + len(processes)]:
+        service_rows.extend(rows)
+    return service_rows, list(results[len(services) + len(processes):]), pool
+
+
+def render(service_rows, site_rows, show_all, pool, wall):
+    lines = []
+    rows = list(service_rows)
+    if site_rows:
+        healthy = sorted(r["latency"] for r in site_rows if r["ok"])
+        summary = f"{len(healthy)}/{len(site_rows)} ok"
+        if healthy:
+            p50 = healthy[len(healthy) // 2]
+            p95 = healthy[min(len(healthy) - 1, int(len(healthy) * 0.95))]
+            summary += f", p50 {format_latency(p50)}, p95 {format_latency(p95)}"
+        summary += f", {pool.opened} connection(s)"
+        slowest = max(site_rows, key=lambda r: r["latency"])
+        rows.append({"name": "sites", "target": site_rows[0]["target"],
+                     "ok": len(healthy) == len(site_rows), "latency": slowest["latency"],
+                     "detail": summary})
+        rows.extend(r for r in site_rows if show_all or not r["ok"])
+
+    width = max([len(r["name"]) for r in rows] + [8])
+    target_width = max([len(r["target"]) for r in rows] + [6])
+    for row in rows:
+        mark = UNKNOWN if row["ok"] is None else (OK if row["ok"] else FAILED)
+        lines.append(f"  {mark} {row['name']:<{width}}  {row['target']:<{target_width}}  "
+                     f"{format_latency(row['latency']):>8}  {row['detail']}")
+    if rows:
+        slowest = max((r for r in service_rows + site_rows if r["latency"] is not None),
+                      key=lambda r: r["latency"], default=None)
+        footer = f"\n{len(rows)} check(s) in {format_latency(wall)}"
+        if slowest:
+            footer += f", slowest {slowest['name']} ({format_latency(slowest['latency'])})"
+        lines.append(footer)
+    return "\n".join(lines)
+
+
+def parse_args(args):
+    options = {"checks": [], "timeout": DEFAULT_TIMEOUT, "connections": DEFAULT_CONNECTIONS,
+               "url": None, "all": False}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        value = args[index + 1] if index + 1 < len(args) else None
+        if arg in ("--timeout", "--connections", "--url"):
+            if value is None:
+                raise ValueError(f"{arg} needs a value")
+            if arg == "--timeout":
+                options["timeout"] = float(value)
+            elif arg == "--connections":
+                options["connections"] = max(1, int(value))
+            else:
+                options["url"] = value
+            index += 2
+            continue
+        if arg == "--all":
+            options["all"] = True
+        elif not arg.startswith("-") and ALIASES.get(arg, arg) in CHECKS:
+            options["checks"].append(ALIASES.get(arg, arg))
+        else:
+            raise ValueError(f"Unknown option: {arg}")
+        index += 1
+    options["checks"] = options["checks"] or list(CHECKS)
+    return options
 
 
 def main(args):
     """Handle beam status command"""
-    print("Beam Status - SaaS Status")
-    print("This is a placeholder for future SaaS status functionality.")
-    print("\nArguments received:", args)
-    print("\nYou can extend this module to add your status checking logic.")
-    return 0
+    if args and args[0] in ("--help", "-h", "help"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0
+    try:
+        options = parse_args(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    from beam.fanout import find_bench_root
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+
+    started = time.monotonic()
+    try:
+        service_rows, site_rows, pool = asyncio.run(gather_checks(str(bench_root), options))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    print(f"Beam status: {os.path.basename(os.path.abspath(bench_root))}\n")
+    print(render(service_rows, site_rows, options["all"], pool, time.monotonic() - started))
+    failed = any(row["ok"] is False for row in service_rows + site_rows)
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
     sys.exit(main(sys.argv[1:]))
-
@@ -0,0 +1,63 @@
+"""
+Locations for beam's local state (caches, sockets, manifests)
+"""
+import json
+import os
+from pathlib import Path
+
+
+def state_dir():
+    """Directory for beam's per-user state, created on first use"""
+    override = os.environ.get("BEAM_STATE_DIR")
+    if override:
+        path = Path(override)
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = Path(base) / "beam"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def load_json(path, default=None):
+    """Read a JSON state file, returning default if it is missing or corrupt"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    """Atomically write a JSON state file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class FileLock:
+    """Exclusive flock on `<path>.lock`, shared with other beam processes"""
+
+    def __init__(self, path, blocking=True):
+        self.path = f"{path}.lock"
+        self.blocking = blocking
+        self.file = None
+        self.acquired = False
+
+    def __enter__(self):
+        self.file = open(self.path, "w")
+        try:
+            import fcntl
+            flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.flock(self.file, flags)
+            self.acquired = True
+        except ImportError:
+            self.acquired = True
+        except BlockingIOError:
+            self.acquired = False
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
@@ -0,0 +1,310 @@
+"""
+Chunked, binary-safe output streaming for forwarded commands
+
+Child output is read as raw byte chunks, split on line and carriage-return
+boundaries, rebranded a chunk at a time and written out in batches. Partial
+lines are held back until their terminator arrives (so a word split across
+two reads is still rewritten correctly) or until the latency budget expires
+(so prompts and progress bars without a newline still show up promptly).
+"""
+import os
+import sys
+import time
+
+from beam.rebrand import filter_bytes
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Write out buffered output once this much is pending...
+FLUSH_BYTES = 64 * 1024
+
+# ...or once the oldest pending byte has waited this long (seconds)
+FLUSH_LATENCY = 0.05
+
+# Keep reading this long after the child exits: a background process it
+# left behind may hold the pipes open indefinitely (seconds)
+EXIT_GRACE = 1.0
+
+# How often to check whether the child has exited while it runs (seconds)
+EXIT_POLL = 0.1
+
+
+def make_writer(stream):
+    """Return a callable that writes raw bytes to a text stream"""
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        fd = None
+
+    if fd is not None:
+        def write(data):
+            # Keep ordering with anything beam itself printed earlier
+            stream.flush()
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        return write
+
+    buffer = getattr(stream, "buffer", None)
+    if buffer is not None:
+        def write(data):
+            stream.flush()
+            buffer.write(data)
+            buffer.flush()
+        return write
+
+    def write(data):
+        stream.write(data.decode("utf-8", errors="replace"))
+        stream.flush()
+    return write
+
+
+def _last_boundary(data):
+    """Index just past the last newline or carriage return, or 0"""
+    return max(data.rfind(b"\n"), data.rfind(b"\r")) + 1
+
+
+def prefix_lines(rewrite, prefix):
+    """Wrap a rewrite function so every output line starts with prefix()
+
+    LineStream releases a partial line once the latency budget runs out; the
+    rest of that line arrives with the next chunk and must not be prefixed
+    again, so whether the last chunk ended a line is carried over.
+    """
+    state = {"at_line_start": True, "after_cr": False}
+
+    def rewrite_lines(data):
+        data = rewrite(data)
+        if not data:
+            return data
+        lines = data.splitlines(keepends=True)
+        label = prefix()
+        continued = not state["at_line_start"] or (state["after_cr"] and lines[0] == b"\n")
+        output = [lines[0] if continued else label + lines[0]]
+        output += [label + line for line in lines[1:]]
+        state["at_line_start"] = data.endswith((b"\n", b"\r"))
+        # A \r\n split between two chunks is one line end, not two
+        state["after_cr"] = data.endswith(b"\r")
+        return b"".join(output)
+    return rewrite_lines
+
+
+class LineStream:
+    """Incrementally split, rebrand and batch one output stream"""
+
+    def __init__(self, write, rewrite=filter_bytes, tap=None,
+                 flush_bytes=FLUSH_BYTES, latency=FLUSH_LATENCY, hold_partial=False):
+        self.write = write
+        self.rewrite = rewrite
+        self.tap = tap
+        self.flush_bytes = flush_bytes
+        self.latency = latency
+        # Streams sharing one terminal keep partial lines until they end,
+        # or another stream's output would land in the middle of them
+        self.hold_partial = hold_partial
+        self.partial = b""
+        self.pending = []
+        self.pending_size = 0
+        self.pending_since = None
+        self.partial_since = None
+
+    def feed(self, data):
+        """Accept a chunk of raw child output"""
+        now = time.monotonic()
+        data = self.partial + data
+        cut = _last_boundary(data)
+        if cut:
+            self._emit(data[:cut], now)
+            self.partial = data[cut:]
+            self.partial_since = now if self.partial else None
+        else:
+            self.partial = data
+            if self.partial_since is None:
+                self.partial_since = now
+
+        # A very long unterminated line (minified JS, base64) is not held forever
+        if len(self.partial) >= self.flush_bytes:
+            self._release_partial(now)
+        self.tick(now)
+
+    def tick(self, now=None):
+        """Flush whatever has exceeded the latency budget"""
+        now = time.monotonic() if now is None else now
+        if self.partial and not self.hold_partial and now - self.partial_since >= self.latency:
+            self._release_partial(now)
+        if self.pending and (
+            self.pending_size >= self.flush_bytes
+            or now - self.pending_since >= self.latency
+        ):
+            self.flush()
+
+    def deadline(self):
+        """Monotonic time at which tick() next has work to do, or None"""
+        partial_since = None if self.hold_partial else self.partial_since
+        times = [t for t in (self.pending_since, partial_since) if t is not None]
+        return min(times) + self.latency if times else None
+
+    def flush(self):
+        """Write out all complete, rebranded output"""
+        if self.pending:
+            data = b"".join(self.pending)
+            self.pending = []
+            self.pending_size = 0
+            self.pending_since = None
+            self.write(data)
+
+    def close(self):
+        """Write out everything, including an unterminated last line"""
+        self._release_partial(time.monotonic())
+        self.flush()
+
+    def _release_partial(self, now):
+        if self.partial:
+            data = self.partial
+            self.partial = b""
+            self.partial_since = None
+            self._emit(data, now)
+
+    def _emit(self, data, now):
+        if self.tap is not None:
+            self.tap(data)
+        data = self.rewrite(data)
+        if self.pending_since is None:
+            self.pending_since = now
+        self.pending.append(data)
+        self.pending_size += len(data)
+
+
+class _ExitWatch:
+    """Tracks when to stop reading: EXIT_GRACE after the child has exited"""
+
+    def __init__(self, process):
+        self.process = process
+        self.stop_at = None
+
+    def deadline(self, now):
+        if self.process is None:
+            return None
+        if self.stop_at is None:
+            if self.process.poll() is None:
+                return now + EXIT_POLL
+            self.stop_at = now + EXIT_GRACE
+        return self.stop_at
+
+    def expired(self, now):
+        return self.stop_at is not None and now >= self.stop_at
+
+
+def _timeout(streams, watch):
+    now = time.monotonic()
+    deadlines = [s.deadline() for s in streams.values()] + [watch.deadline(now)]
+    deadlines = [d for d in deadlines if d is not None]
+    return max(0.0, min(deadlines) - now) if deadlines else None
+
+
+def _pump_selectors(streams, watch):
+    """Multiplex child pipes with a single selector loop (POSIX)"""
+    import selectors
+
+    selector = selectors.DefaultSelector()
+    for fd, line_stream in streams.items():
+        selector.register(fd, selectors.EVENT_READ, line_stream)
+
+    try:
+        while selector.get_map():
+            for key, _ in selector.select(_timeout(streams, watch)):
+                data = os.read(key.fd, CHUNK_SIZE)
+                if data:
+                    key.data.feed(data)
+                else:
+                    selector.unregister(key.fd)
+                    key.data.close()
+
+            now = time.monotonic()
+            for line_stream in streams.values():
+                line_stream.tick(now)
+
+            if watch.expired(now):
+                for key in list(selector.get_map().values()):
+                    selector.unregister(key.fd)
+                    key.data.close()
+    finally:
+        selector.close()
+
+
+def _pump_threads(streams, watch):
+    """Read each pipe in its own thread, write from this one (Windows pipes can't be selected)"""
+    import queue
+    import threading
+
+    chunks = queue.Queue()
+
+    def reader(fd):
+        try:
+            while True:
+                data = os.read(fd, CHUNK_SIZE)
+                chunks.put((fd, data))
+                if not data:
+                    break
+        except OSError:
+            chunks.put((fd, b""))
+
+    for fd in streams:
+        threading.Thread(target=reader, args=(fd,), daemon=True).start()
+
+    open_fds = set(streams)
+    while open_fds:
+        try:
+            fd, data = chunks.get(timeout=_timeout(streams, watch))
+        except queue.Empty:
+            pass
+        else:
+            if data:
+                streams[fd].feed(data)
+            elif fd in open_fds:
+                open_fds.discard(fd)
+                streams[fd].close()
+
+        now = time.monotonic()
+        for line_stream in streams.values():
+            line_stream.tick(now)
+
+        if watch.expired(now):
+            for fd in open_fds:
+                streams[fd].close()
+            open_fds.clear()
+
+
+def pump(streams, process=None):
+    """
+    Copy {fd: LineStream} until every fd reaches EOF, or, given the child
+    process, until EXIT_GRACE after it exits - whichever comes first
+    """
+    watch = _ExitWatch(process)
+    if os.name == "nt":
+        _pump_threads(streams, watch)
+    else:
+        _pump_selectors(streams, watch)
+
+
+def stream_process(process, stdout=None, stderr=None, on_stderr=None,
+                   rewrite=filter_bytes):
+    """
+    Stream a child's stdout/stderr through the rebranding pipeline.
+
+    The process must have been started with stdout/stderr=PIPE in binary mode
+    (no text=True). on_stderr, if given, receives each raw stderr batch before
+    rebranding. Returns the child's exit code.
+    """
+    streams = {
+        process.stdout.fileno(): LineStream(make_writer(stdout or sys.stdout), rewrite),
+        process.stderr.fileno(): LineStream(make_writer(stderr or sys.stderr), rewrite, tap=on_stderr),
+    }
+    try:
+        pump(streams, process)
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+    return process.wait()
@@ -0,0 +1,325 @@
+"""
+Native Procfile supervisor for `beam start`
+
+Instead of forwarding to bench (which runs honcho, whose output beam then
+filters again), `beam start` reads the bench's Procfile and runs the
+processes itself:
+
+- Every process's output (stdout and stderr on one pipe) is multiplexed by
+  a single selector loop, rebranded and written with a colored
+  "time name |" prefix - one Python layer of line handling in total.
+- A process that exits is restarted after a backoff that doubles with
+  each quick crash (1s up to 30s) and resets once it has stayed up.
+- Ctrl+C (or SIGTERM) sends SIGTERM to every process group at once, keeps
+  draining their output, and SIGKILLs whatever is left after a grace
+  period.
+
+Set BEAM_NATIVE_START=0 to use bench's own `start` instead.
+
+Usage:
+    beam start [--procfile PATH] [-c name=N,...] [--no-dev] [--no-prefix]
+"""
+import os
+import signal
+import sys
+import time
+
+
+# honcho's palette, in the order it hands colors out
+COLORS = ["36", "33", "32", "35", "31", "34", "96", "93", "92", "95", "91", "94"]
+
+BACKOFF_START = 1.0
+BACKOFF_MAX = 30.0
+# A process that ran this long before exiting starts over at BACKOFF_START
+STABLE_AFTER = 60.0
+# How long processes get to exit after SIGTERM
+SHUTDOWN_GRACE = 5.0
+# How often exits are polled for when no output arrives
+POLL_INTERVAL = 0.5
+
+
+def read_procfile(path):
+    """[(name, command)] from a Procfile"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or ":" not in line:
+                continue
+            name, command = line.split(":", 1)
+            entries.append((name.strip(), command.strip()))
+    return entries
+
+
+def parse_concurrency(value):
+    """{name: count} from honcho's name=N,name=N syntax"""
+    counts = {}
+    for part in value.split(","):
+        name, sep, count = part.partition("=")
+        if not sep:
+            raise ValueError(f"Bad concurrency: {part}")
+        counts[name.strip()] = int(count)
+    return counts
+
+
+def parse_args(args):
+    """Options, or None when bench should handle the arguments"""
+    options = {"procfile": None, "concurrency": {}, "dev": True, "prefix": True}
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        value = args[index + 1] if index + 1 < len(args) else None
+        if arg == "--procfile" and value:
+            options["procfile"] = value
+            index += 2
+        elif arg in ("-c", "--concurrency") and value:
+            options["concurrency"].update(parse_concurrency(value))
+            index += 2
+        elif arg == "--no-dev":
+            options["dev"] = False
+            index += 1
+        elif arg == "--no-prefix":
+            options["prefix"] = False
+            index += 1
+        else:
+            return None
+    return options
+
+
+class Process:
+    """One Procfile process and its restart bookkeeping"""
+
+    def __init__(self, name, command, color):
+        self.name = name
+        self.command = command
+        self.color = color
+        self.popen = None
+        self.started = None
+        self.backoff = BACKOFF_START
+        self.restart_at = None
+        self.stream = None
+
+
+class Supervisor:
+    """Starts Procfile processes and multiplexes their output on one selector"""
+
+    def __init__(self, bench_root, entries, options):
+        import selectors
+        from beam.streaming import make_writer
+
+        self.bench_root = bench_root
+        self.options = options
+        self.selector = selectors.DefaultSelector()
+        self.write = make_writer(sys.stdout)
+        self.stopping = False
+        self.colored = sys.stdout.isatty() and not os.environ.get("NO_COLOR")
+
+        self.processes = []
+        for name, command in entries:
+            for number in range(1, options["concurrency"].get(name, 1) + 1):
+                color = COLORS[len(self.processes) % len(COLORS)]
+                self.processes.append(Process(f"{name}.{number}", command, color))
+        self.width = max(len(process.name) for process in self.processes)
+
+        self.env = dict(os.environ, PYTHONUNBUFFERED="1")
+        if options["dev"]:
+            self.env["DEV_SERVER"] = "true"
+
+    def prefix(self, name, color):
+        label = f"{time.strftime('%H:%M:%S')} {name:<{self.width}} | "
+        return f"\x1b[{color}m{label}\x1b[0m" if self.colored else label
+
+    def rewriter(self, process):
+        """Rebrand a batch of lines and prefix each with the time and name"""
+        from beam.rebrand import filter_bytes
+        if not self.options["prefix"]:
+            return filter_bytes
+
+        from beam.streaming import prefix_lines
+        return prefix_lines(filter_bytes, lambda: self.prefix(process.name, process.color).encode())
+
+    def say(self, process, message):
+        """A supervisor message, in the process's color"""
+        self.write(f"{self.prefix(process.name, process.color)}{message}\n".encode())
+
+    def spawn(self, process):
+        import selectors
+        import subprocess
+        from beam.streaming import LineStream
+
+        try:
+            process.popen = subprocess.Popen(
+                ["/bin/sh", "-c", process.command],
+                cwd=self.bench_root,
+                env=dict(self.env, BEAM_PROCESS_NAME=process.name),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=0,
+                start_new_session=True,
+            )
+        except OSError as e:
+            self.say(process, f"✗ could not start: {e}")
+            self.schedule_restart(process)
+            return
+        # Draining after an exit must not hang on a pipe a stray child holds
+        os.set_blocking(process.popen.stdout.fileno(), False)
+        process.started = time.monotonic()
+        process.restart_at = None
+        # Partial lines wait for their end, or another process's output
+        # would be written into the middle of them
+        process.stream = LineStream(self.write, self.rewriter(process), hold_partial=True)
+        self.selector.register(process.popen.stdout, selectors.EVENT_READ, process)
+        self.say(process, f"started with pid {process.popen.pid}")
+
+    def signal_group(self, process, signum):
+        try:
+            os.killpg(process.popen.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def drain(self, process):
+        """Stop reading a process's pipe, writing out what it left"""
+        pipe = process.popen.stdout
+        if pipe.closed:
+            return
+        try:
+            self.selector.unregister(pipe)
+        except (KeyError, ValueError):
+            pass
+        try:
+            while True:
+                data = os.read(pipe.fileno(), 65536)
+                if not data:
+                    break
+                process.stream.feed(data)
+        except (BlockingIOError, OSError):
+            pass
+        process.stream.close()
+        pipe.close()
+
+    def reap(self, process):
+        """Handle a process that has exited"""
+        code = process.popen.returncode
+        # Children it left behind would keep the pipe open
+        self.signal_group(process, signal.SIGKILL)
+        self.drain(process)
+        if self.stopping:
+            return
+        uptime = time.monotonic() - process.started
+        if uptime >= STABLE_AFTER:
+            process.backoff = BACKOFF_START
+        self.say(process, f"⚠️  exited with code {code} after {uptime:.0f}s - "
+                          f"restarting in {process.backoff:.0f}s")
+        self.schedule_restart(process)
+
+    def schedule_restart(self, process):
+        process.restart_at = time.monotonic() + process.backoff
+        process.backoff = min(process.backoff * 2, BACKOFF_MAX)
+
+    def running(self):
+        return [p for p in self.processes if p.popen is not None and p.popen.returncode is None]
+
+    def timeout(self):
+        """How long select may wait before a flush, restart or exit poll is due"""
+        now = time.monotonic()
+        deadlines = [now + POLL_INTERVAL]
+        for process in self.processes:
+            if process.stream is not None and process.stream.deadline() is not None:
+                deadlines.append(process.stream.deadline())
+            if process.restart_at is not None:
+                deadlines.append(process.restart_at)
+        return max(0.0, min(deadlines) - now)
+
+    def step(self):
+        """One pass of the event loop"""
+        for key, _ in self.selector.select(self.timeout()):
+            process = key.data
+            try:
+                data = os.read(key.fd, 65536)
+            except OSError:
+                data = b""
+            if data:
+                process.stream.feed(data)
+            else:
+                self.drain(process)
+
+        now = time.monotonic()
+        for process in self.processes:
+            if process.stream is not None:
+                process.stream.tick(now)
+            if process.popen is not None and process.popen.returncode is None:
+                if process.popen.poll() is not None:
+                    self.reap(process)
+            elif process.restart_at is not None and now >= process.restart_at and not self.stopping:
+                self.spawn(process)
+
+    def stop(self):
+        """SIGTERM everything, drain output, SIGKILL stragglers"""
+        self.stopping = True
+        for process in self.processes:
+            process.restart_at = None
+        running = self.running()
+        if running:
+            self.write(f"\n⏹  Stopping {len(running)} process(es)...\n".encode())
+        for process in running:
+            self.signal_group(process, signal.SIGTERM)
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        while self.running() and time.monotonic() < deadline:
+            self.step()
+        for process in self.running():
+            self.say(process, "did not stop in time - killing")
+            self.signal_group(process, signal.SIGKILL)
+            process.popen.wait()
+        for process in self.processes:
+            if process.popen is not None:
+                self.drain(process)
+
+    def run(self):
+        def interrupt(signum, frame):
+            raise KeyboardInterrupt
+
+        previous = signal.signal(signal.SIGTERM, interrupt)
+        try:
+            for process in self.processes:
+                self.spawn(process)
+            while True:
+                self.step()
+        except KeyboardInterrupt:
+            # A second Ctrl+C during shutdown is ignored; SIGKILL follows anyway
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self.stop()
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            self.selector.close()
+        return 0
+
+
+def main(args):
+    """Run `beam start` natively; None when bench should handle it"""
+    if os.name == "nt" or os.environ.get("BEAM_NATIVE_START") == "0":
+        return None
+    if "--help" in args or "-h" in args:
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0
+    try:
+        options = parse_args(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if options is None:
+        return None
+
+    from beam.fanout import find_bench_root
+    bench_root = find_bench_root()
+    if bench_root is None:
+        return None
+    procfile = options["procfile"] or os.path.join(bench_root, "Procfile")
+    try:
+        entries = read_procfile(procfile)
+    except OSError:
+        return None
+    if not entries:
+        print(f"Error: no processes in {procfile}", file=sys.stderr)
+        return 1
+    return Supervisor(str(bench_root), entries, options).run()
@@ -0,0 +1,156 @@
+"""
+Pseudo-terminal forwarding for interactive and colored commands
+
+The child runs on a real PTY, so it keeps TTY detection (colors, line
+buffering, prompts). A single selector loop copies keystrokes to the child
+and rebranded output back to the terminal; window size changes and
+termination signals are passed through. POSIX only.
+"""
+import errno
+import os
+import selectors
+import signal
+import sys
+import time
+
+from beam.rebrand import filter_bytes
+from beam.streaming import CHUNK_SIZE, LineStream, make_writer
+
+
+# Interactive echo needs a much tighter budget than bulk output
+PTY_LATENCY = 0.01
+
+# Signals beam receives that should reach the child instead
+FORWARDED_SIGNALS = ("SIGTERM", "SIGHUP", "SIGQUIT", "SIGUSR1", "SIGUSR2")
+
+
+def _copy_window_size(source_fd, target_fd):
+    """Copy the terminal size from one fd to another, if both are terminals"""
+    import fcntl
+    import termios
+
+    try:
+        size = fcntl.ioctl(source_fd, termios.TIOCGWINSZ, b"\0" * 8)
+        fcntl.ioctl(target_fd, termios.TIOCSWINSZ, size)
+    except OSError:
+        pass
+
+
+def _exit_code(status):
+    """Translate a waitpid status into a shell-style exit code"""
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_in_pty(cmd, rewrite=filter_bytes, stdin=None, stdout=None):
+    """Run cmd on a new PTY, rebranding its output. Returns the exit code."""
+    import pty
+    import termios
+    import tty
+
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    stdin_fd = stdin.fileno()
+    stdin_is_tty = os.isatty(stdin_fd)
+
+    stdout.flush()
+    pid, master_fd = pty.fork()
+    if pid == 0:
+        # Child: the PTY is already our controlling terminal and stdio
+        try:
+            os.execvp(cmd[0], cmd)
+        except OSError as e:
+            os.write(2, f"Error executing {cmd[0]}: {e}\n".encode())
+        os._exit(127)
+
+    if stdin_is_tty:
+        _copy_window_size(stdin_fd, master_fd)
+
+    previous_handlers = {}
+
+    def on_winch(signum, frame):
+        _copy_window_size(stdin_fd, master_fd)
+
+    def forward(signum, frame):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    if stdin_is_tty:
+        previous_handlers[signal.SIGWINCH] = signal.signal(signal.SIGWINCH, on_winch)
+    for name in FORWARDED_SIGNALS:
+        signum = getattr(signal, name, None)
+        if signum is not None:
+            previous_handlers[signum] = signal.signal(signum, forward)
+
+    saved_mode = None
+    if stdin_is_tty:
+        saved_mode = termios.tcgetattr(stdin_fd)
+        # Raw mode: keystrokes (including Ctrl+C) go to the child's terminal
+        tty.setraw(stdin_fd)
+
+    output = LineStream(make_writer(stdout), rewrite, latency=PTY_LATENCY)
+    selector = selectors.DefaultSelector()
+    selector.register(master_fd, selectors.EVENT_READ, "child")
+    try:
+        selector.register(stdin_fd, selectors.EVENT_READ, "stdin")
+    except (OSError, ValueError):
+        # Regular files can't be polled; the child just gets no input
+        pass
+
+    try:
+        while True:
+            deadline = output.deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+
+            try:
+                events = selector.select(timeout)
+            except InterruptedError:
+                continue
+
+            child_done = False
+            for key, _ in events:
+                if key.data == "child":
+                    try:
+                        data = os.read(master_fd, CHUNK_SIZE)
+                    except OSError as e:
+                        # Linux reports EIO once the child side is closed
+                        if e.errno != errno.EIO:
+                            raise
+                        data = b""
+                    if data:
+                        output.feed(data)
+                    else:
+                        child_done = True
+                else:
+                    data = os.read(stdin_fd, CHUNK_SIZE)
+                    if data:
+                        os.write(master_fd, data)
+                    else:
+                        # EOF on piped stdin: pass it on as ^D
+                        selector.unregister(stdin_fd)
+                        os.write(master_fd, b"\x04")
+
+            output.tick()
+            if child_done:
+                break
+    finally:
+        output.close()
+        selector.close()
+        if saved_mode is not None:
+            termios.tcsetattr(stdin_fd, termios.TCSAFLUSH, saved_mode)
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        os.close(master_fd)
+
+    _, status = os.waitpid(pid, 0)
+    return _exit_code(status)
+
+
+def exec_command(cmd):
+    """Replace the beam process with cmd - no copy loop, no rebranding"""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execvp(cmd[0], cmd)
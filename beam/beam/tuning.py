@@ -0,0 +1,630 @@
+"""
+Host-aware tuning for `beam setup production`
+
+bench writes the same gunicorn, Redis and nginx settings on every
+machine. beam lets bench generate its configs and then fits them to the
+host - its cores and RAM (cgroup limits included), the disk under the
+bench (HDD, SSD or NVMe) and the number of sites:
+
+- gunicorn: workers, max-requests and jitter (common_site_config.json,
+  from which bench regenerates config/supervisor.conf), plus threads
+  (gthread when RAM allows fewer processes than cores want)
+- Redis: cache maxmemory with allkeys-lru; noeviction for the queue, whose
+  jobs must never be dropped (config/redis_*.conf, applied live)
+- MariaDB: buffer pool, redo log, connections, table caches and I/O
+  capacity, written to config/mariadb.cnf for the server to include
+- nginx: upstream keepalive to gunicorn (config/nginx.conf) and
+  worker_connections (/etc/nginx/nginx.conf, when writable)
+
+Every setting is shown with its current and tuned value before anything
+is written.
+
+Usage:
+    beam setup production [bench options] [--dry-run] [--tune-only] [--no-tune]
+
+Options:
+    --dry-run     Show the tuned profile against the current values only
+    --tune-only   Re-tune the existing configs without running bench
+    --no-tune     Plain bench setup production (also BEAM_TUNE=0)
+"""
+import math
+import os
+import re
+import sys
+
+
+MB = 1024 * 1024
+# Resident memory of one gunicorn worker with frappe loaded
+GUNICORN_WORKER_MB = 200
+# Tables an ERPNext site brings; the table caches are sized from it
+TABLES_PER_SITE = 1000
+IO_CAPACITY = {"hdd": 200, "ssd": 2000, "nvme": 10000}
+
+# (key, label, file) in the order they are shown
+SETTINGS = [
+    ("gunicorn_workers", "gunicorn workers", "config/supervisor.conf"),
+    ("gunicorn_threads", "gunicorn threads", "config/supervisor.conf"),
+    ("max_requests", "gunicorn max-requests", "config/supervisor.conf"),
+    ("max_requests_jitter", "gunicorn max-requests-jitter", "config/supervisor.conf"),
+    ("cache_maxmemory", "redis cache maxmemory", "config/redis_cache.conf"),
+    ("cache_policy", "redis cache maxmemory-policy", "config/redis_cache.conf"),
+    ("queue_policy", "redis queue maxmemory-policy", "config/redis_queue.conf"),
+    ("innodb_buffer_pool_size", "innodb_buffer_pool_size", "config/mariadb.cnf"),
+    ("innodb_log_file_size", "innodb_log_file_size", "config/mariadb.cnf"),
+    ("max_connections", "max_connections", "config/mariadb.cnf"),
+    ("table_definition_cache", "table_definition_cache", "config/mariadb.cnf"),
+    ("table_open_cache", "table_open_cache", "config/mariadb.cnf"),
+    ("innodb_io_capacity", "innodb_io_capacity", "config/mariadb.cnf"),
+    ("innodb_flush_neighbors", "innodb_flush_neighbors", "config/mariadb.cnf"),
+    ("upstream_keepalive", "nginx upstream keepalive", "config/nginx.conf"),
+    ("worker_connections", "nginx worker_connections", "/etc/nginx/nginx.conf"),
+]
+MARIADB_KEYS = [key for key, _, path in SETTINGS if path == "config/mariadb.cnf"]
+SYSTEM_NGINX = "/etc/nginx/nginx.conf"
+
+
+# ---------------------------------------------------------------------------
+# Host facts
+# ---------------------------------------------------------------------------
+
+def cpu_count():
+    """Cores available, honouring a cgroup v2 CPU quota"""
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores or 1
+
+
+def memory_total():
+    """Bytes of RAM available, honouring a cgroup v2 memory limit"""
+    total = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    total = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    if total is None and hasattr(os, "sysconf"):
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+        if limit != "max":
+            total = min(total, int(limit))
+    except (OSError, ValueError, TypeError):
+        pass
+    return total or 1024 * MB
+
+
+def disk_kind(path):
+    """'nvme', 'ssd' or 'hdd' for the block device holding path"""
+    try:
+        device = os.stat(path).st_dev
+        block = os.path.realpath(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}")
+    except OSError:
+        return "ssd"
+    name = os.path.basename(block)
+    # A partition's queue settings are its disk's
+    queue = os.path.join(block, "queue", "rotational")
+    if not os.path.exists(queue):
+        queue = os.path.join(os.path.dirname(block), "queue", "rotational")
+    if name.startswith("nvme"):
+        return "nvme"
+    try:
+        with open(queue) as f:
+            return "hdd" if f.read().strip() == "1" else "ssd"
+    except OSError:
+        # Virtual and overlay filesystems: assume the cloud default
+        return "ssd"
+
+
+def host_facts(bench_root):
+    from beam.fanout import list_sites
+    from beam.state import load_json
+    config = load_json(os.path.join(bench_root, "sites", "common_site_config.json"), {}) or {}
+    return {
+        "cores": cpu_count(),
+        "memory": memory_total(),
+        "disk": disk_kind(bench_root),
+        "sites": len(list_sites(bench_root)),
+        "db_local": config.get("db_host", "localhost") in ("localhost", "127.0.0.1", "::1"),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Profile
+# ---------------------------------------------------------------------------
+
+def round_down(value, step):
+    return max(step, int(value) // step * step)
+
+
+def compute_profile(facts):
+    """Tuned values for a host; memory sizes in MB"""
+    cores, sites = facts["cores"], facts["sites"]
+    memory = facts["memory"] // MB
+    # The OS, page cache headroom, RQ workers and the scheduler
+    usable = max(256, memory - max(512, memory // 10) - 150 * 3)
+
+    profile = {}
+    buffer_pool = round_down(usable * 0.4, 128) if facts["db_local"] else None
+    web_budget = usable - (buffer_pool or 0) - usable // 10
+    wanted = 2 * cores + 1
+    workers = max(2, min(wanted, web_budget // GUNICORN_WORKER_MB))
+    # Concurrency the RAM can't give as processes comes from threads
+    threads = 1 if workers >= wanted else min(4, math.ceil(wanted / workers))
+    profile["gunicorn_workers"] = workers
+    profile["gunicorn_threads"] = threads
+    # Recycle workers sooner on small hosts, where a leak swaps sooner
+    profile["max_requests"] = 5000 if memory >= 4096 else 2000
+    profile["max_requests_jitter"] = profile["max_requests"] // 10
+
+    profile["cache_maxmemory"] = max(64, min(usable // 20 + 2 * sites, usable // 8))
+    profile["cache_policy"] = "allkeys-lru"
+    profile["queue_policy"] = "noeviction"
+
+    if buffer_pool:
+        profile["innodb_buffer_pool_size"] = buffer_pool
+        profile["innodb_log_file_size"] = max(48, min(2048, buffer_pool // 4))
+        # Every web thread and worker holds a connection, plus headroom for consoles
+        profile["max_connections"] = max(151, 2 * (workers * threads + 16) + 50)
+        tables = max(400, min(sites * TABLES_PER_SITE, 200000))
+        profile["table_definition_cache"] = tables
+        # Open handles are bounded by open_files_limit, which MariaDB caps this to anyway
+        profile["table_open_cache"] = min(tables, 20000)
+        profile["innodb_io_capacity"] = IO_CAPACITY[facts["disk"]]
+        profile["innodb_flush_neighbors"] = 1 if facts["disk"] == "hdd" else 0
+
+    # gunicorn's sync workers close every connection; gthread keeps them
+    profile["upstream_keepalive"] = workers * threads if threads > 1 else None
+    profile["worker_connections"] = min(65535, max(1024, 1024 * cores))
+    return profile
+
+
+# ---------------------------------------------------------------------------
+# Reading and writing the configs
+# ---------------------------------------------------------------------------
+
+def read_text(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_text(path, text):
+    """
+    Replace a file atomically, keeping its owner and mode. These are
+    bench's files and beam runs under sudo: a root-owned replacement would
+    lock the bench user out of its own config. New files take the owner of
+    their directory.
+    """
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        info = None
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    try:
+        if info is not None:
+            os.chmod(tmp, info.st_mode & 0o7777)
+        else:
+            info = os.stat(os.path.dirname(os.path.abspath(path)))
+        if hasattr(os, "chown") and (info.st_uid, info.st_gid) != (os.getuid(), os.getgid()):
+            os.chown(tmp, info.st_uid, info.st_gid)
+    except OSError:
+        # Can't hand the file over: write in place so it keeps what it had
+        os.unlink(tmp)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return
+    os.replace(tmp, path)
+
+
+def gunicorn_line(text):
+    """(start, end) of the gunicorn command= line in supervisor.conf"""
+    for match in re.finditer(r"^command\s*=.*$", text, re.M):
+        if "gunicorn" in match.group(0):
+            return match.start(), match.end()
+    return None
+
+
+def option_value(argv, *names):
+    for index, arg in enumerate(argv[:-1]):
+        if arg in names:
+            return argv[index + 1]
+    for arg in argv:
+        for name in names:
+            if name.startswith("--") and arg.startswith(name + "="):
+                return arg.split("=", 1)[1]
+    return None
+
+
+def set_option(argv, names, value):
+    """argv with the option set in place (appended if missing, removed when value is None)"""
+    out = []
+    found = False
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        inline = any(name.startswith("--") and arg.startswith(name + "=") for name in names)
+        if arg in names or inline:
+            skip = not inline
+            if value is not None and not found:
+                out += [arg.split("=", 1)[0], str(value)]
+            found = True
+            continue
+        out.append(arg)
+    if value is not None and not found:
+        out += [names[0], str(value)]
+    return out
+
+
+def read_supervisor(text):
+    span = gunicorn_line(text or "")
+    if not span:
+        return {}
+    argv = text[span[0]:span[1]].split("=", 1)[1].split()
+    threads = option_value(argv, "--threads")
+    return {
+        "gunicorn_workers": option_value(argv, "-w", "--workers"),
+        "gunicorn_threads": threads or "1",
+        "max_requests": option_value(argv, "--max-requests"),
+        "max_requests_jitter": option_value(argv, "--max-requests-jitter"),
+    }
+
+
+def tune_supervisor(text, profile, workers=True):
+    """The gunicorn line with the profile's options; workers=False leaves the
+    ones bench renders from common_site_config.json alone"""
+    span = gunicorn_line(text)
+    if not span:
+        return text
+    key, command = text[span[0]:span[1]].split("=", 1)
+    argv = command.split()
+    if workers:
+        argv = set_option(argv, ["-w", "--workers"], profile["gunicorn_workers"])
+        argv = set_option(argv, ["--max-requests"], profile["max_requests"])
+        argv = set_option(argv, ["--max-requests-jitter"], profile["max_requests_jitter"])
+    threads = profile["gunicorn_threads"]
+    argv = set_option(argv, ["--threads"], threads if threads > 1 else None)
+    if threads > 1:
+        argv = set_option(argv, ["-k", "--worker-class"], "gthread")
+    elif option_value(argv, "-k", "--worker-class") == "gthread":
+        argv = set_option(argv, ["-k", "--worker-class"], None)
+    return text[:span[0]] + f"{key}={' '.join(argv)}" + text[span[1]:]
+
+
+def redis_directive(text, name):
+    match = re.search(rf"^{name}\s+(\S+)", text or "", re.M)
+    return match.group(1) if match else None
+
+
+def set_directive(text, name, value, separator=" "):
+    """text with `name value` replaced, or appended when missing"""
+    pattern = rf"^(\s*){re.escape(name)}\b.*$"
+    if re.search(pattern, text, re.M):
+        return re.sub(pattern, lambda m: f"{m.group(1)}{name}{separator}{value}", text, count=1, flags=re.M)
+    return text.rstrip("\n") + f"\n{name}{separator}{value}\n"
+
+
+def megabytes(value):
+    """A Redis/MariaDB size (bytes, or with a k/m/g suffix) in MB"""
+    if value is None:
+        return None
+    match = re.match(r"(\d+)\s*([kmg]?)b?$", str(value).strip().lower())
+    if not match:
+        return value
+    number, unit = int(match.group(1)), match.group(2)
+    return number * {"": 1, "k": 1024, "m": MB, "g": 1024 * MB}[unit] // MB
+
+
+def upstream_name(text):
+    """The gunicorn upstream in bench's nginx.conf (not the socketio one)"""
+    for match in re.finditer(r"upstream\s+(\S+)\s*\{", text or ""):
+        if not match.group(1).endswith("socketio-server") and "socketio" not in match.group(1):
+            return match.group(1)
+    return None
+
+
+def read_nginx(text):
+    name = upstream_name(text)
+    if not name:
+        return {}
+    block = re.search(rf"upstream\s+{re.escape(name)}\s*\{{([^}}]*)\}}", text)
+    keepalive = re.search(r"^\s*keepalive\s+(\d+)\s*;", block.group(1), re.M) if block else None
+    return {"upstream_keepalive": keepalive.group(1) if keepalive else None}
+
+
+def tune_nginx(text, profile):
+    name = upstream_name(text)
+    if not name:
+        return text
+    keepalive = profile["upstream_keepalive"]
+
+    def block(match):
+        body = re.sub(r"\n\s*keepalive\s+\d+\s*;", "", match.group(2))
+        if keepalive:
+            body = body.rstrip() + f"\n\tkeepalive {keepalive};\n"
+        return match.group(1) + body + "}"
+    text = re.sub(rf"(upstream\s+{re.escape(name)}\s*\{{)([^}}]*)\}}", block, text)
+    if keepalive:
+        # Kept-alive upstream connections need HTTP/1.1 without "Connection: close"
+        def proxy(match):
+            # Only this location's own directives count
+            before = text[text.rfind("{", 0, match.start()):match.start()]
+            if "proxy_http_version" in before:
+                return match.group(0)
+            indent = match.group(1)
+            return (f"{indent}proxy_http_version 1.1;\n{indent}proxy_set_header Connection \"\";\n"
+                    + match.group(0))
+        text = re.sub(rf"^([ \t]*)proxy_pass\s+http://{re.escape(name)}\s*;", proxy, text, flags=re.M)
+    return text
+
+
+def read_mariadb(bench_root):
+    """Live values from the server, falling back to config/mariadb.cnf"""
+    from beam.migrations import Database
+    names = ", ".join(f"'{key}'" for key in MARIADB_KEYS)
+    rows = Database(bench_root).query(f"SHOW GLOBAL VARIABLES WHERE Variable_name IN ({names})", timeout=5)
+    if rows:
+        values = {row[0]: row[1] for row in rows if len(row) == 2}
+    else:
+        text = read_text(os.path.join(bench_root, "config", "mariadb.cnf")) or ""
+        values = {key: redis_directive(text.replace("=", " "), key) for key in MARIADB_KEYS}
+    for key in ("innodb_buffer_pool_size", "innodb_log_file_size"):
+        values[key] = megabytes(values.get(key))
+    return values
+
+
+def render_mariadb(profile, facts):
+    lines = [
+        "# Written by beam setup production for "
+        f"{facts['cores']} cores, {facts['memory'] // MB} MB RAM, {facts['disk']}, {facts['sites']} sites",
+        "[mysqld]",
+    ]
+    for key in MARIADB_KEYS:
+        value = profile[key]
+        lines.append(f"{key} = {value}M" if key.endswith("_size") else f"{key} = {value}")
+    lines.append("innodb_flush_method = O_DIRECT")
+    return "\n".join(lines) + "\n"
+
+
+def read_current(bench_root, profile):
+    """{key: current value (str/int) or None} for every setting"""
+    config = os.path.join(bench_root, "config")
+    current = {}
+    current.update(read_supervisor(read_text(os.path.join(config, "supervisor.conf"))))
+    cache = read_text(os.path.join(config, "redis_cache.conf"))
+    current["cache_maxmemory"] = megabytes(redis_directive(cache, "maxmemory"))
+    current["cache_policy"] = redis_directive(cache, "maxmemory-policy")
+    current["queue_policy"] = redis_directive(read_text(os.path.join(config, "redis_queue.conf")),
+                                              "maxmemory-policy")
+    if "innodb_buffer_pool_size" in profile:
+        current.update(read_mariadb(bench_root))
+    current.update(read_nginx(read_text(os.path.join(config, "nginx.conf"))))
+    match = re.search(r"^\s*worker_connections\s+(\d+)\s*;", read_text(SYSTEM_NGINX) or "", re.M)
+    current["worker_connections"] = match.group(1) if match else None
+    return current
+
+
+def show_diff(facts, profile, current):
+    """Print current vs tuned values; the number that change"""
+    print(f"Tuning for {facts['cores']} cores, {facts['memory'] / 1024 / MB:.1f} GB RAM, "
+          f"{facts['disk']} disk, {facts['sites']} site(s)\n")
+    rows = []
+    for key, label, path in SETTINGS:
+        if key not in profile:
+            continue
+        tuned, now = profile[key], current.get(key)
+        unit = "M" if key in ("cache_maxmemory", "innodb_buffer_pool_size", "innodb_log_file_size") else ""
+        tuned_text = "-" if tuned is None else f"{tuned}{unit}"
+        now_text = "-" if now is None else f"{now}{unit if isinstance(now, int) else ''}"
+        changed = str("-" if now is None else now) != str("-" if tuned is None else tuned)
+        rows.append((changed, label, now_text, tuned_text, path))
+    widths = [max(len(row[column]) for row in rows) for column in (1, 2, 3)]
+    changes = 0
+    for changed, label, now_text, tuned_text, path in rows:
+        changes += changed
+        print(f"  {'*' if changed else ' '} {label:<{widths[0]}}  {now_text:>{widths[1]}} -> "
+              f"{tuned_text:<{widths[2]}}  {path}")
+    print(f"\n{changes} setting(s) change" if changes else "\nAlready tuned")
+    return changes
+
+
+# ---------------------------------------------------------------------------
+# Applying
+# ---------------------------------------------------------------------------
+
+def set_common_config(bench_root, values):
+    """Merge values into common_site_config.json; whether anything changed"""
+    import json
+    path = os.path.join(bench_root, "sites", "common_site_config.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise OSError(f"cannot read {path}: {e}") from None
+    if all(config.get(key) == value for key, value in values.items()):
+        return False
+    config.update(values)
+    # bench's own layout, so its later edits produce small diffs
+    write_text(path, json.dumps(config, indent=1, sort_keys=True) + "\n")
+    return True
+
+
+def apply_profile(bench_root, facts, profile):
+    """Write the tuned values into the configs and reload what uses them"""
+    from beam.cli import forward_to_bench
+    config = os.path.join(bench_root, "config")
+
+    # Workers and max-requests go where bench reads them, so the next
+    # bench setup supervisor (or beam setup production) keeps them
+    workers = False
+    try:
+        if set_common_config(bench_root, {
+            "gunicorn_workers": profile["gunicorn_workers"],
+            "gunicorn_max_requests": profile["max_requests"],
+            "gunicorn_max_requests_jitter": profile["max_requests_jitter"],
+        }):
+            print("✓ gunicorn workers and max-requests written to sites/common_site_config.json")
+        workers = forward_to_bench(["setup", "supervisor", "--yes"]) != 0
+        if workers:
+            print("⚠️  Could not regenerate config/supervisor.conf; patching it directly")
+    except OSError as e:
+        print(f"⚠️  {e}; patching config/supervisor.conf directly")
+        workers = True
+
+    path = os.path.join(config, "supervisor.conf")
+    text = read_text(path)
+    if text and gunicorn_line(text):
+        tuned = tune_supervisor(text, profile, workers=workers)
+        if tuned != text:
+            write_text(path, tuned)
+        run_quiet(["supervisorctl", "reread"])
+        run_quiet(["supervisorctl", "update"])
+        print("✓ gunicorn settings applied (config/supervisor.conf)")
+
+    for name, settings in (("cache", {"maxmemory": f"{profile['cache_maxmemory']}mb",
+                                      "maxmemory-policy": profile["cache_policy"]}),
+                           ("queue", {"maxmemory-policy": profile["queue_policy"]})):
+        path = os.path.join(config, f"redis_{name}.conf")
+        text = read_text(path)
+        if text is None:
+            continue
+        for directive, value in settings.items():
+            text = set_directive(text, directive, value)
+        write_text(path, text)
+        port = redis_directive(text, "port")
+        if port and set_redis_live(port, settings):
+            print(f"✓ redis {name} settings written and applied live")
+        else:
+            print(f"✓ redis {name} settings written (applied at its next restart)")
+
+    if "innodb_buffer_pool_size" in profile:
+        path = os.path.join(config, "mariadb.cnf")
+        write_text(path, render_mariadb(profile, facts))
+        print(f"✓ MariaDB settings written to {path}")
+        print(f"  Include it and restart MariaDB: ln -sf {path} /etc/mysql/mariadb.conf.d/90-beam.cnf")
+
+    reload_nginx = False
+    path = os.path.join(config, "nginx.conf")
+    text = read_text(path)
+    if text:
+        tuned = tune_nginx(text, profile)
+        if tuned != text:
+            write_text(path, tuned)
+            reload_nginx = True
+    text = read_text(SYSTEM_NGINX) if "worker_connections" in profile else None
+    if text and re.search(r"^\s*worker_connections\s", text, re.M):
+        tuned = set_directive(text, "worker_connections", f"{profile['worker_connections']};")
+        if tuned != text:
+            try:
+                write_text(SYSTEM_NGINX, tuned)
+                reload_nginx = True
+            except OSError:
+                print(f"⚠️  Cannot write {SYSTEM_NGINX}; set worker_connections "
+                      f"{profile['worker_connections']} there by hand")
+    if reload_nginx:
+        test = run_quiet(["nginx", "-t"])
+        if test is None or test.returncode != 0:
+            print("⚠️  nginx -t failed; nginx was not reloaded - check the nginx configs")
+        else:
+            run_quiet(["nginx", "-s", "reload"])
+            print("✓ nginx settings written and reloaded")
+
+
+def run_quiet(argv):
+    import subprocess
+    try:
+        return subprocess.run(argv, capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def set_redis_live(port, settings):
+    """CONFIG SET on the running instance, so no restart drops its data"""
+    from beam.saas.scale import Redis, RedisError
+    try:
+        redis = Redis(f"redis://127.0.0.1:{port}", timeout=2)
+        try:
+            redis.pipeline([["CONFIG", "SET", key, value] for key, value in settings.items()])
+        finally:
+            redis.close()
+    except (OSError, RedisError):
+        return False
+    return True
+
+
+def parse_args(args):
+    options = {"dry_run": False, "tune_only": False, "tune": os.environ.get("BEAM_TUNE") != "0",
+               "bench_args": []}
+    for arg in args:
+        if arg == "--dry-run":
+            options["dry_run"] = True
+        elif arg == "--tune-only":
+            options["tune_only"] = True
+        elif arg == "--no-tune":
+            options["tune"] = False
+        else:
+            options["bench_args"].append(arg)
+    return options
+
+
+def main(args):
+    """Handle beam setup production: bench's setup, then the tuned profile"""
+    from beam.cli import forward_to_bench
+    if "--help" in args or "-h" in args:
+        print(__doc__.split("Usage:")[1].rstrip())
+        return 0
+    options = parse_args(args)
+    if not options["tune"]:
+        return forward_to_bench(["setup", "production", *options["bench_args"]])
+
+    from beam.fanout import find_bench_root
+    bench_root = find_bench_root()
+    if bench_root is None:
+        print("Error: not inside a beam directory (no sites/ and apps/ found)", file=sys.stderr)
+        return 1
+    bench_root = str(bench_root)
+
+    facts = host_facts(bench_root)
+    profile = compute_profile(facts)
+    if not os.path.exists(SYSTEM_NGINX):
+        del profile["worker_connections"]
+    # What runs now, before bench regenerates anything - shown, not trusted
+    current = read_current(bench_root, profile)
+
+    ran_bench = not options["dry_run"] and not options["tune_only"]
+    if ran_bench:
+        return_code = forward_to_bench(["setup", "production", *options["bench_args"]])
+        if return_code:
+            return return_code
+        # Settings that had no config yet are compared with bench's defaults
+        generated = read_current(bench_root, profile)
+        for key, value in generated.items():
+            if current.get(key) is None:
+                current[key] = value
+
+    print()
+    changes = show_diff(facts, profile, current)
+    # bench has just rewritten its configs with its own defaults, whatever
+    # was there before, so the profile always goes back on after it
+    if options["dry_run"] or (not ran_bench and not changes):
+        return 0
+    if not changes:
+        print("Putting the profile back over bench's regenerated configs")
+    print()
+    apply_profile(bench_root, facts, profile)
+    return 0
@@ -0,0 +1,131 @@
+"""
+Agent that runs inside the WSL distro on behalf of beam.wsl_broker
+
+It is started once with `python3 -c <this file's source>` and then runs
+beam commands for the Windows side without a new wsl.exe per command.
+Requests arrive as frames on stdin, output and exit codes go back as
+frames on stdout. Several commands can run at the same time; each frame
+carries the id of the request it belongs to. Commands get no stdin: beam
+sends anything that may read the console (prompts, piped input, PTY
+commands) through a plain wsl launch instead - see cli.needs_console.
+
+This file must only use the standard library - it is executed by the
+distro's python3, which has no access to the Windows-side beam package.
+"""
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+
+
+# Frame: 1-byte kind + 4-byte request id + 4-byte length + payload
+FRAME_HEADER = struct.Struct(">cII")
+HELLO = b"h"
+PING = b"p"
+REQUEST = b"r"
+CANCEL = b"k"
+STDOUT = b"o"
+STDERR = b"e"
+EXIT = b"x"
+
+CHUNK_SIZE = 64 * 1024
+
+
+def read_frame(stream):
+    """Read one frame from a binary stream, or None at EOF"""
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    kind, request_id, length = FRAME_HEADER.unpack(header)
+    payload = stream.read(length) if length else b""
+    if len(payload) < length:
+        return None
+    return kind, request_id, payload
+
+
+def encode_frame(kind, request_id, payload=b""):
+    return FRAME_HEADER.pack(kind, request_id, len(payload)) + payload
+
+
+class Agent:
+    def __init__(self, stdin, stdout):
+        self.stdin = stdin
+        self.stdout = stdout
+        self.write_lock = threading.Lock()
+        self.processes = {}
+
+    def send(self, kind, request_id, payload=b""):
+        with self.write_lock:
+            self.stdout.write(encode_frame(kind, request_id, payload))
+            self.stdout.flush()
+
+    def relay(self, request_id, pipe, kind):
+        while True:
+            data = os.read(pipe.fileno(), CHUNK_SIZE)
+            if not data:
+                break
+            self.send(kind, request_id, data)
+        pipe.close()
+
+    def run(self, request_id, request):
+        cwd = request.get("cwd")
+        if not cwd or not os.path.isdir(cwd):
+            cwd = None
+        try:
+            process = subprocess.Popen(
+                request["argv"],
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            # The caller decides what a missing program means (e.g. re-probe)
+            self.send(EXIT, request_id, str(request.get("missing_code", 127)).encode())
+            return
+        except OSError as e:
+            self.send(STDERR, request_id, f"{request['argv'][0]}: {e.strerror}\n".encode())
+            self.send(EXIT, request_id, b"126")
+            return
+
+        self.processes[request_id] = process
+        readers = [
+            threading.Thread(target=self.relay, args=(request_id, process.stdout, STDOUT), daemon=True),
+            threading.Thread(target=self.relay, args=(request_id, process.stderr, STDERR), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        code = process.wait()
+        for reader in readers:
+            reader.join()
+        self.processes.pop(request_id, None)
+        if code < 0:
+            code = 128 - code
+        self.send(EXIT, request_id, str(code).encode())
+
+    def serve(self):
+        self.send(HELLO, 0, json.dumps({"pid": os.getpid()}).encode())
+        while True:
+            frame = read_frame(self.stdin)
+            if frame is None:
+                break
+            kind, request_id, payload = frame
+            if kind == PING:
+                self.send(PING, request_id, payload)
+            elif kind == REQUEST:
+                request = json.loads(payload)
+                threading.Thread(target=self.run, args=(request_id, request), daemon=True).start()
+            elif kind == CANCEL:
+                process = self.processes.get(request_id)
+                if process is not None:
+                    process.terminate()
+
+        # Broker went away - don't leave commands running
+        for process in list(self.processes.values()):
+            process.terminate()
+
+
+if __name__ == "__main__":
+    Agent(sys.stdin.buffer, sys.stdout.buffer).serve()
@@ -0,0 +1,394 @@
+"""
+Long-lived WSL session broker
+
+Every wsl.exe launch pays a noticeable cold start, and run_in_wsl used to
+pay it up to four times per command (status check, echo test, optional
+restart, the command itself). The broker is a small background process on
+the Windows side that keeps one agent (beam.wsl_agent) running inside the
+distro and forwards beam commands to it:
+
+    beam (client) --TCP, framed--> broker --stdio, framed--> agent (in WSL)
+
+The broker listens on 127.0.0.1 with a random token stored in beam's state
+directory. It is started on first use, its agent is health-checked lazily
+(a dead agent is restarted on the next request) and it exits after being
+idle for a while.
+
+Set BEAM_WSL_LAUNCHER to replace "wsl -d Ubuntu" - for example
+BEAM_WSL_LAUNCHER=env runs the agent as a local subprocess, which is how the
+protocol is exercised on plain Linux.
+
+Usage:
+    python -m beam.wsl_broker serve [--idle-timeout SECONDS]
+    python -m beam.wsl_broker stop
+    python -m beam.wsl_broker status
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from beam.wsl_agent import (
+    CANCEL,
+    EXIT,
+    HELLO,
+    REQUEST,
+    STDERR,
+    STDOUT,
+    encode_frame,
+    read_frame,
+)
+
+
+# Sent to a client when the broker can't reach WSL - the client falls back
+UNAVAILABLE = b"u"
+
+DEFAULT_IDLE_TIMEOUT = 1800
+
+# How long a WSL cold start may take before the agent counts as failed
+AGENT_START_TIMEOUT = 30
+
+
+def state_file():
+    from beam.state import state_dir
+    return state_dir() / "wsl_broker.json"
+
+
+def wsl_launcher():
+    """Command prefix that runs a program inside the distro"""
+    override = os.environ.get("BEAM_WSL_LAUNCHER")
+    if override is not None:
+        import shlex
+        return shlex.split(override)
+    from beam.cli import WSL_DISTRO
+    return ["wsl", "-d", WSL_DISTRO]
+
+
+def agent_command(launcher):
+    """Start the agent from its source - nothing has to be installed in WSL"""
+    from beam import wsl_agent
+
+    with open(wsl_agent.__file__, encoding="utf-8") as f:
+        source = f.read()
+    return launcher + ["python3", "-u", "-c", source]
+
+
+def broker_version():
+    from beam import __version__
+    return __version__
+
+
+def _no_window_flags():
+    # A detached broker has no console; don't let wsl.exe pop one up
+    return getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+class Broker:
+    def __init__(self, launcher, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.launcher = launcher
+        self.idle_timeout = idle_timeout
+        self.token = os.urandom(16).hex()
+        self.agent = None
+        self.agent_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.clients = {}
+        self.next_id = 1
+        self.last_activity = time.monotonic()
+
+    # -- agent ------------------------------------------------------------
+
+    def agent_alive(self):
+        return self.agent is not None and self.agent.poll() is None
+
+    def ensure_agent(self):
+        """Start the agent if it isn't running; raise RuntimeError if it can't be"""
+        with self.agent_lock:
+            if self.agent_alive():
+                return
+            agent = subprocess.Popen(
+                agent_command(self.launcher),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0,
+                creationflags=_no_window_flags(),
+            )
+            hello = threading.Event()
+            threading.Thread(target=self.read_agent, args=(agent, hello), daemon=True).start()
+            if not hello.wait(AGENT_START_TIMEOUT):
+                agent.kill()
+                raise RuntimeError("WSL agent did not start")
+            self.agent = agent
+
+    def read_agent(self, agent, hello):
+        """Route agent frames to the client that owns each request"""
+        while True:
+            frame = read_frame(agent.stdout)
+            if frame is None:
+                break
+            kind, request_id, payload = frame
+            if kind == HELLO:
+                hello.set()
+                continue
+            conn = self.clients.get(request_id)
+            if conn is None:
+                continue
+            if kind == EXIT:
+                self.clients.pop(request_id, None)
+            try:
+                conn.sendall(encode_frame(kind, request_id, payload))
+            except OSError:
+                pass
+
+        agent.wait()
+        # Agent died: fail the requests it was running; the next one restarts it
+        for request_id, conn in list(self.clients.items()):
+            if self.agent is not agent:
+                break
+            self.clients.pop(request_id, None)
+            try:
+                conn.sendall(encode_frame(STDERR, request_id, b"WSL agent exited unexpectedly\n"))
+                conn.sendall(encode_frame(EXIT, request_id, b"1"))
+            except OSError:
+                pass
+
+    def send_agent(self, kind, request_id, payload=b""):
+        with self.write_lock:
+            self.agent.stdin.write(encode_frame(kind, request_id, payload))
+
+    # -- clients ----------------------------------------------------------
+
+    def handle_client(self, conn):
+        reader = conn.makefile("rb")
+        frame = read_frame(reader)
+        if frame is None or frame[0] != REQUEST:
+            conn.close()
+            return
+        request = json.loads(frame[2])
+        if request.pop("token", None) != self.token:
+            conn.close()
+            return
+
+        try:
+            self.ensure_agent()
+        except (OSError, RuntimeError) as e:
+            conn.sendall(encode_frame(UNAVAILABLE, 0, str(e).encode()))
+            conn.close()
+            return
+
+        with self.agent_lock:
+            request_id = self.next_id
+            self.next_id += 1
+        self.clients[request_id] = conn
+        try:
+            self.send_agent(REQUEST, request_id, json.dumps(request).encode())
+            # Blocks until the client hangs up (done, or Ctrl+C)
+            conn.recv(1)
+        except OSError:
+            pass
+        finally:
+            if self.clients.pop(request_id, None) is not None and self.agent_alive():
+                try:
+                    self.send_agent(CANCEL, request_id)
+                except OSError:
+                    pass
+            conn.close()
+            self.last_activity = time.monotonic()
+
+    def serve(self):
+        """Start the agent, publish the port and serve until idle"""
+        import signal
+        from beam.state import save_json
+
+        # `stop` sends SIGTERM; unwind through the cleanup below
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        try:
+            self.ensure_agent()
+        except (OSError, RuntimeError) as e:
+            save_json(state_file(), {"pid": os.getpid(), "error": str(e)})
+            return 1
+
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(64)
+        server.settimeout(1.0)
+        save_json(state_file(), {
+            "pid": os.getpid(),
+            "port": server.getsockname()[1],
+            "token": self.token,
+            "version": broker_version(),
+            "launcher": self.launcher,
+        })
+
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    if not self.clients and time.monotonic() - self.last_activity > self.idle_timeout:
+                        break
+                    continue
+                conn.settimeout(None)
+                self.last_activity = time.monotonic()
+                threading.Thread(target=self.handle_client, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            if self.agent is not None:
+                self.agent.stdin.close()
+            try:
+                state_file().unlink()
+            except FileNotFoundError:
+                pass
+        return 0
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+def _connect(state):
+    if not state or "port" not in state:
+        return None
+    if state.get("version") != broker_version() or state.get("launcher") != wsl_launcher():
+        return None
+    try:
+        return socket.create_connection(("127.0.0.1", state["port"]), timeout=2)
+    except OSError:
+        return None
+
+
+def start_broker():
+    """Launch a detached broker and wait until it has published its port"""
+    from beam.state import load_json
+
+    stop_broker()
+    try:
+        state_file().unlink()
+    except FileNotFoundError:
+        pass
+
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    process = subprocess.Popen(
+        [sys.executable, "-m", "beam.wsl_broker", "serve"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **kwargs
+    )
+
+    deadline = time.monotonic() + AGENT_START_TIMEOUT + 5
+    while time.monotonic() < deadline:
+        state = load_json(state_file())
+        if state and state.get("pid") == process.pid:
+            return None if "error" in state else state
+        if process.poll() is not None:
+            return None
+        time.sleep(0.05)
+    return None
+
+
+def stop_broker():
+    """Stop a running broker, if any"""
+    import signal
+    from beam.state import load_json
+
+    state = load_json(state_file())
+    if not state or "pid" not in state:
+        return False
+    try:
+        os.kill(state["pid"], signal.SIGTERM)
+    except OSError:
+        return False
+    return True
+
+
+def run_via_broker(argv, cwd, missing_code=127, on_stderr=None):
+    """
+    Run argv inside WSL through the broker, streaming rebranded output.
+
+    on_stderr, if given, sees each raw batch of stderr. Returns the exit
+    code, or None when the broker can't reach WSL and the caller should use
+    a plain wsl.exe launch instead.
+    """
+    from beam.state import load_json
+    from beam.streaming import LineStream, make_writer
+
+    conn = _connect(load_json(state_file()))
+    if conn is None:
+        state = start_broker()
+        conn = _connect(state)
+        if conn is None:
+            return None
+    conn.settimeout(None)
+
+    streams = {
+        STDOUT: LineStream(make_writer(sys.stdout)),
+        STDERR: LineStream(make_writer(sys.stderr), tap=on_stderr),
+    }
+    request = {
+        "token": load_json(state_file(), {}).get("token"),
+        "argv": argv,
+        "cwd": cwd,
+        "missing_code": missing_code,
+    }
+
+    try:
+        conn.sendall(encode_frame(REQUEST, 0, json.dumps(request).encode()))
+        reader = conn.makefile("rb")
+        while True:
+            frame = read_frame(reader)
+            if frame is None:
+                code = 1
+                streams[STDERR].feed(b"beam: lost connection to the WSL broker\n")
+                break
+            kind, _, payload = frame
+            if kind in streams:
+                streams[kind].feed(payload)
+            elif kind == EXIT:
+                code = int(payload)
+                break
+            elif kind == UNAVAILABLE:
+                return None
+    finally:
+        for line_stream in streams.values():
+            line_stream.close()
+        conn.close()
+
+    return code
+
+
+def main(args):
+    """Handle python -m beam.wsl_broker"""
+    command = args[0] if args else "status"
+    if command == "serve":
+        idle_timeout = DEFAULT_IDLE_TIMEOUT
+        if "--idle-timeout" in args:
+            idle_timeout = int(args[args.index("--idle-timeout") + 1])
+        return Broker(wsl_launcher(), idle_timeout).serve()
+    if command == "stop":
+        print("✓ WSL broker stopped" if stop_broker() else "WSL broker is not running")
+        return 0
+    if command == "status":
+        from beam.state import load_json
+        state = load_json(state_file())
+        conn = _connect(state)
+        if conn is not None:
+            conn.close()
+            print(f"WSL broker running (pid {state['pid']}, port {state['port']})")
+            return 0
+        print("WSL broker is not running")
+        return 1
+    print(__doc__.split("Usage:")[1].rstrip())
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the rebranding engine
+
+Compares beam.rebrand.filter_output against the original rule-by-rule
+implementation and checks that both produce identical output.
+
+Usage:
+    python benchmarks/filter_output_benchmark.py [--lines N] [--repeat N]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from beam.rebrand import filter_output  # noqa: E402
+
+
+def legacy_filter_output(text):
+    """Original implementation: one uncompiled re.sub per rule"""
+    if not text:
+        return text
+
+    replacements = [
+        (r'frappe-bench', 'beam'),
+        (r'frappe_bench', 'beam'),
+        (r'Frappe Framework', 'Beam Framework'),
+        (r'frappe framework', 'beam framework'),
+        (r'Frappe Bench', 'Beam'),
+        (r'frappe bench', 'beam'),
+        (r'frappe-bench', 'beam'),
+        (r'\bFrappe\b', 'Beam'),
+        (r'\bfrappe\b', 'beam'),
+        (r'\bBench\b', 'Beam'),
+        (r'\bbench\b', 'beam'),
+        (r"'bench'", "'beam'"),
+        (r'"bench"', '"beam"'),
+        (r'`bench`', '`beam`'),
+        (r"'frappe'", "'beam'"),
+        (r'"frappe"', '"beam"'),
+        (r'`frappe`', '`beam`'),
+    ]
+
+    result = text
+    for pattern, replacement in replacements:
+        result = re.sub(pattern, replacement, result)
+    return result
+
+
+# Representative output from bench build / migrate / update
+SAMPLE_LINES = [
+    "Updating DocTypes for frappe        : [========================================] 100%\n",
+    "Migrating site1.local\n",
+    "Executing erpnext.patches.v14_0.update_closing_balances in site1.local (_1bd3e0294da19198)\n",
+    "  dist/css/website.bundle.ZXH3NKHD.css                       19.25 Kb\n",
+    "Compiling translations for erpnext\n",
+    "$ cd /home/frappe/frappe-bench && bench build --app frappe\n",
+    "Frappe Framework v15.2.0 - see `bench --help` for 'bench' commands\n",
+    "Queued rebuilding of search index for site1.local\n",
+    "WARN: frappe_bench.utils: Node version 16 is not supported\n",
+    "✨  Done in 12.04s.\n",
+]
+
+TOKENS = [
+    "frappe", "Frappe", "bench", "Bench", "frappe-bench", "frappe_bench",
+    "Frappe Framework", "frappe framework", "Frappe Bench", "frappe bench",
+    "benchmark", "frappes", "'bench'", '"frappe"', "`bench`", "x", "_", "-",
+    " ", "/", "é", "Framework", "Benches", "1",
+]
+
+
+def random_corpus(count, seed=0):
+    """Random token soup that exercises rule overlaps and word boundaries"""
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(TOKENS) for _ in range(rng.randint(1, 12))) + "\n"
+        for _ in range(count)
+    ]
+
+
+def check_equivalence(lines):
+    """Return the first line where both implementations disagree"""
+    for line in lines:
+        if filter_output(line) != legacy_filter_output(line):
+            return line
+    return None
+
+
+def time_it(func, lines, repeat):
+    """Best-of-N wall time to filter every line once"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args(argv)
+
+    mismatch = check_equivalence(random_corpus(50000) + SAMPLE_LINES)
+    if mismatch is not None:
+        print(f"✗ Output differs for: {mismatch!r}")
+        return 1
+    print("✓ Output identical to the rule-by-rule implementation")
+
+    lines = (SAMPLE_LINES * (options.lines // len(SAMPLE_LINES) + 1))[:options.lines]
+    legacy = time_it(legacy_filter_output, lines, options.repeat)
+    engine = time_it(filter_output, lines, options.repeat)
+
+    print(f"\n{len(lines)} lines, best of {options.repeat}")
+    print(f"  legacy filter_output:  {legacy:.3f}s  ({len(lines) / legacy:,.0f} lines/s)")
+    print(f"  compiled engine:       {engine:.3f}s  ({len(lines) / engine:,.0f} lines/s)")
+    print(f"  speedup:               {legacy / engine:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
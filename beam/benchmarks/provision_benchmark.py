@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tenant provisioning benchmark: new-site vs template snapshots
+
+Times creating a site with `beam new-site --install-app ...`, with
+`beam provision` loading the snapshot dump, and with `beam provision`
+claiming a pre-loaded spare database. Run it from inside a bench
+directory with MariaDB root access; the sites it creates are dropped
+afterwards unless --keep is given. The snapshot is built before timing
+starts, since it is a one-time cost per app versions.
+
+Usage:
+    python benchmarks/provision_benchmark.py [--runs N] [--apps a,b]
+        [--db-root-password PW] [--keep]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+BEAM_ROOT = Path(__file__).resolve().parent.parent
+
+
+def beam(args, env, quiet=True):
+    """Run a beam command; (exit code, seconds)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "beam.cli"] + args,
+        env=env,
+        stdout=subprocess.DEVNULL if quiet else None,
+        stderr=subprocess.DEVNULL if quiet else None,
+    )
+    return result.returncode, time.perf_counter() - start
+
+
+def time_sites(name, make_args, env, runs, created):
+    """Create `runs` sites with make_args(site); seconds per successful run"""
+    samples = []
+    for _ in range(runs):
+        site = f"bench-{name}-{uuid.uuid4().hex[:8]}.localhost"
+        code, seconds = beam(make_args(site), env)
+        if code != 0:
+            print(f"  {name}: creating {site} failed (exit {code})", file=sys.stderr)
+            continue
+        created.append(site)
+        samples.append(seconds)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--apps", default="")
+    parser.add_argument("--db-root-password")
+    parser.add_argument("--keep", action="store_true")
+    options = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BEAM_ROOT), env.get("PYTHONPATH")]))
+    root = ["--db-root-password", options.db_root_password] if options.db_root_password else []
+    apps = [app for app in options.apps.split(",") if app]
+    password = ["--admin-password", "benchmark"]
+
+    print("Building the snapshot (not timed)...")
+    code, seconds = beam(["provision", "snapshot", "--apps", options.apps] + root, env, quiet=False)
+    if code != 0:
+        return code
+    print(f"  snapshot ready after {seconds:.1f}s")
+
+    created = []
+    results = {}
+    install = [arg for app in apps for arg in ("--install-app", app)]
+    results["new-site"] = time_sites(
+        "new", lambda site: ["new-site", site] + password + install + root,
+        env, options.runs, created)
+    results["snapshot dump"] = time_sites(
+        "dump", lambda site: ["provision", site, "--apps", options.apps] + password + root,
+        env, options.runs, created)
+
+    print(f"Loading {options.runs} spare database(s) (not timed)...")
+    beam(["provision", "warm", "--count", str(options.runs), "--apps", options.apps] + root, env)
+    results["snapshot spare"] = time_sites(
+        "spare", lambda site: ["provision", site, "--apps", options.apps] + password + root,
+        env, options.runs, created)
+    # Don't leave the warmer refilling spares for the benchmark
+    beam(["provision", "warm", "--count", "0", "--apps", options.apps] + root, env)
+
+    print(f"\nsite with frappe{' + ' + options.apps if apps else ''}  ({options.runs} runs)")
+    baseline = statistics.median(results["new-site"]) if results["new-site"] else None
+    for name, samples in results.items():
+        if not samples:
+            print(f"  {name:<15} no successful runs")
+            continue
+        median = statistics.median(samples)
+        speedup = f"   {baseline / median:6.1f}x" if baseline else ""
+        print(f"  {name:<15} median {median:8.2f} s   min {min(samples):8.2f} s{speedup}")
+
+    if not options.keep:
+        for site in created:
+            beam(["drop-site", site, "--force", "--no-backup"] + root, env)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
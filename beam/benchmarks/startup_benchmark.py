@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Startup-latency benchmark for forwarded bench commands
+
+Times a full `beam <command>` invocation with the subprocess path and with
+in-process dispatch (BEAM_INPROCESS=1). Run it from inside a bench
+directory with bench installed, using a cheap command such as `src`.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs N] [command ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BEAM_ROOT = Path(__file__).resolve().parent.parent
+
+
+def time_runs(command, env, runs):
+    """Wall time of each run, in milliseconds"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "beam.cli"] + command,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("command", nargs="*", default=["src"])
+    options = parser.parse_args(argv)
+
+    base_env = dict(os.environ)
+    base_env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(BEAM_ROOT), base_env.get("PYTHONPATH")])
+    )
+
+    print(f"beam {' '.join(options.command)}  ({options.runs} runs)")
+    results = {}
+    for name, flag in [("subprocess", "0"), ("in-process", "1")]:
+        env = dict(base_env, BEAM_INPROCESS=flag)
+        samples = time_runs(options.command, env, options.runs)
+        results[name] = statistics.median(samples)
+        print(f"  {name:<11} median {results[name]:7.1f} ms   "
+              f"min {min(samples):7.1f} ms   max {max(samples):7.1f} ms")
+
+    saved = results["subprocess"] - results["in-process"]
+    print(f"  saved per invocation: {saved:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for forwarded command output
+
+Runs a child that prints bench-style lines and streams its output to
+/dev/null, once through the original per-line thread pipeline and once
+through beam.streaming. Both use the same rebranding engine, so the
+difference is the streaming overhead alone.
+
+Usage:
+    python benchmarks/streaming_benchmark.py [--lines N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from beam.rebrand import filter_output  # noqa: E402
+from beam.streaming import stream_process  # noqa: E402
+from filter_output_benchmark import SAMPLE_LINES  # noqa: E402
+
+
+# Cycles through the representative bench output used by the rebranding benchmark
+PRODUCER = """
+import sys
+lines = {sample!r}
+write = sys.stdout.write
+for i in range({count}):
+    write(lines[i % len(lines)])
+"""
+
+
+def spawn(lines, **kwargs):
+    return subprocess.Popen(
+        [sys.executable, "-c", PRODUCER.format(sample=SAMPLE_LINES, count=lines)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        **kwargs
+    )
+
+
+def legacy_pipeline(lines, sink):
+    """Original forward_to_bench loop: text mode, readline, print+flush per line"""
+    process = spawn(lines, text=True, bufsize=1)
+
+    def stream_output(pipe, output_file):
+        for line in iter(pipe.readline, ''):
+            if line:
+                print(filter_output(line), end='', file=output_file, flush=True)
+        pipe.close()
+
+    threads = [
+        threading.Thread(target=stream_output, args=(process.stdout, sink), daemon=True),
+        threading.Thread(target=stream_output, args=(process.stderr, sink), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    process.wait()
+    for thread in threads:
+        thread.join()
+
+
+def chunked_pipeline(lines, sink):
+    """beam.streaming: raw os.read chunks, batched rebranding and writes"""
+    process = spawn(lines, bufsize=0)
+    stream_process(process, stdout=sink, stderr=sink)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=300000)
+    options = parser.parse_args(argv)
+
+    # Wall time is bounded by the producer; wrapper CPU time is what beam costs
+    with open(os.devnull, "w") as sink:
+        results = []
+        for name, pipeline in [("legacy line loop", legacy_pipeline),
+                               ("chunked streaming", chunked_pipeline)]:
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            pipeline(options.lines, sink)
+            cpu = time.process_time() - cpu_start
+            elapsed = time.perf_counter() - start
+            results.append(cpu)
+            print(f"  {name:<20} wall {elapsed:.3f}s  wrapper cpu {cpu:.3f}s  "
+                  f"({options.lines / elapsed:,.0f} lines/s)")
+
+    print(f"  wrapper cpu reduction: {results[0] / results[1]:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,32 @@
 """
 Quick test script to verify beam installation and basic functionality
 """
+import os
 import sys
 import subprocess
 import shutil
+import time
+
+
+# `beam --version` may cost this much wall time over a bare interpreter
+STARTUP_BUDGET_MS = 50
+
+# Cumulative import time allowed for beam's own modules on the fast paths
+IMPORT_BUDGET_US = 15000
+
+# Modules that metadata/help invocations must not import
+HEAVY_MODULES = [
+    "subprocess",
+    "threading",
+    "shutil",
+    "platform",
+    "pathlib",
+    "selectors",
+    "beam.rebrand",
+    "beam.streaming",
+]
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
 
 
 def test_command(cmd, description):
@@ -30,6 +53,55 @@ def test_command(cmd, description):
         return False
 
 
+def run_beam_inline(args, extra=()):
+    """Command line that runs beam's entry point from this source tree"""
+    code = f"import sys; sys.argv = ['beam'] + {list(args)!r}; from beam.cli import main; main()"
+    return [sys.executable, *extra, "-c", code]
+
+
+def best_wall_time(cmd, runs=5):
+    """Best-of-N wall time in milliseconds"""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, capture_output=True, cwd=BEAM_SOURCE)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def import_times(cmd):
+    """Map of module name to cumulative import time (us) from -X importtime"""
+    result = subprocess.run(cmd, capture_output=True, text=True, cwd=BEAM_SOURCE)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_startup_budget():
+    """beam --version / --help must stay within the startup budget"""
+    baseline = import_times([sys.executable, "-X", "importtime", "-c", "pass"])
+
+    for args in (["--version"], ["--help"]):
+        times = import_times(run_beam_inline(args, ["-X", "importtime"]))
+        assert "beam.cli" in times, f"beam {args[0]} did not import beam.cli"
+        heavy = [name for name in HEAVY_MODULES if name in times and name not in baseline]
+        assert not heavy, f"beam {args[0]} imports {', '.join(heavy)}"
+        beam_us = sum(us for name, us in times.items() if name in ("beam", "beam.cli"))
+        assert beam_us <= IMPORT_BUDGET_US, (
+            f"beam {args[0]} spends {beam_us} us importing beam (budget {IMPORT_BUDGET_US} us)"
+        )
+
+    overhead = best_wall_time(run_beam_inline(["--version"])) - best_wall_time([sys.executable, "-c", "pass"])
+    print(f"beam --version overhead: {overhead:.1f} ms (budget {STARTUP_BUDGET_MS} ms)")
+    assert overhead <= STARTUP_BUDGET_MS, (
+        f"beam --version takes {overhead:.1f} ms over a bare interpreter (budget {STARTUP_BUDGET_MS} ms)"
+    )
+
+
 def main():
     """Run all tests"""
     print("Beam Installation Test Suite")
@@ -60,6 +132,18 @@ def main():
     else:
         tests_failed += 1
     
+    # Test 3b: startup budget for the fast paths
+    print(f"\n{'='*60}")
+    print("Testing: Startup budget (beam --version / --help)")
+    print('='*60)
+    try:
+        test_startup_budget()
+        print("✓ Within startup budget")
+        tests_passed += 1
+    except AssertionError as e:
+        print(f"✗ {e}")
+        tests_failed += 1
+    
     # Test 4: beam saas --help
     if test_command(["beam", "saas", "--help"], "SaaS help"):
         tests_passed += 1
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming error classifier: signatures seen across chunk
+boundaries and within one line, the bounded context and the report
+"""
+import io
+import os
+import sys
+
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BEAM_SOURCE)
+
+from beam import diagnostics  # noqa: E402
+from beam.diagnostics import ErrorClassifier  # noqa: E402
+
+
+def feed_in_chunks(classifier, data, size):
+    for start in range(0, len(data), size):
+        classifier.feed(data[start:start + size])
+
+
+def test_signature_split_across_chunks():
+    """A signature split over several reads is still recognised"""
+    data = (b"Running migrations\n"
+            b"pymysql.err.OperationalError: (2003, \"Can't connect to MySQL server on 'localhost'\")\n"
+            b"Traceback follows\n")
+    for size in (1, 7, 64, len(data)):
+        classifier = ErrorClassifier("bench")
+        feed_in_chunks(classifier, data, size)
+        diagnosis = classifier.finish(1)
+        assert diagnosis is not None and diagnosis.message == diagnostics.MARIADB_UNREACHABLE, size
+        assert diagnosis.line.startswith("pymysql.err.OperationalError")
+
+
+def test_later_signature_on_same_line():
+    """A generic match early in a line doesn't hide a specific one after it"""
+    classifier = ErrorClassifier("wsl")
+    classifier.feed(b"sites/common_site_config.json not found, then: Could not connect to Redis at 127.0.0.1:13000\n")
+    assert set(classifier.hits) == {"beam_not_found", "redis_unreachable"}
+    # Redis comes first in SIGNATURES, so it is the diagnosis
+    assert classifier.finish(1).message == diagnostics.REDIS_UNREACHABLE
+
+
+def test_failure_only_signatures_need_a_failing_exit():
+    """requires_failure signatures are ignored when the command succeeded"""
+    classifier = ErrorClassifier("bench")
+    classifier.feed(b"Error 111 connecting to 127.0.0.1:13000. Connection refused.\n")
+    assert classifier.finish(0) is None
+
+    classifier = ErrorClassifier("wsl")
+    classifier.feed(b"Catastrophic failure\n")
+    assert classifier.finish(0).message == diagnostics.WSL_SERVICE_ERROR
+
+
+def test_unterminated_last_line():
+    """A last line without a newline is checked at finish"""
+    classifier = ErrorClassifier("bench")
+    classifier.feed(b"ok\r\nprogress 50%\rModuleNotFoundError: No module named 'bench'")
+    assert classifier.finish(1).message == diagnostics.BENCH_MISSING
+
+
+def test_context_is_bounded_and_reported():
+    """Only the last context_lines lines are kept; report shows them rebranded"""
+    classifier = ErrorClassifier("bench", context_lines=3)
+    for number in range(50):
+        classifier.feed(b"frappe line %d\n" % number)
+    classifier.feed(b"Could not connect to Redis\n")
+    diagnosis = classifier.finish(1)
+    assert diagnosis.context == ["frappe line 48", "frappe line 49", "Could not connect to Redis"]
+
+    output = io.StringIO()
+    diagnostics.report(diagnosis, file=output)
+    text = output.getvalue()
+    assert text.startswith(diagnostics.REDIS_UNREACHABLE)
+    assert text.endswith("  | beam line 48\n  | beam line 49\n  | Could not connect to Redis\n")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for beam fanout: per-site prefixes, output ordering and retries,
+run against a stub bench that writes partial lines on both streams
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
+
+# Writes a line in two parts with a pause longer than the streaming
+# latency budget, so the first part is released on its own
+STUB_BENCH = textwrap.dedent("""\
+    #!{python}
+    import sys, time
+    site, command = sys.argv[2], sys.argv[3]
+    out, err = sys.stdout, sys.stderr
+    out.write(f"{{site}} step 1\\n"); out.flush()
+    out.write(f"{{site}} step 2 ..."); out.flush()
+    time.sleep(0.2)
+    out.write(" done\\n"); out.flush()
+    err.write(f"bench warning for {{site}}\\n"); err.flush()
+    out.write(f"{{site}} step 3\\n")
+    sys.exit(3 if site.startswith("bad") else 0)
+""")
+
+
+def make_bench(root, sites):
+    """A bench directory with the given sites and a bench stub on PATH"""
+    for site in sites:
+        os.makedirs(os.path.join(root, "sites", site))
+        with open(os.path.join(root, "sites", site, "site_config.json"), "w") as f:
+            f.write("{}")
+    os.makedirs(os.path.join(root, "apps"))
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    stub = os.path.join(bin_dir, "bench")
+    with open(stub, "w") as f:
+        f.write(STUB_BENCH.format(python=sys.executable))
+    os.chmod(stub, 0o755)
+    return bin_dir
+
+
+def run_beam(root, bin_dir, args):
+    env = dict(
+        os.environ,
+        PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        PYTHONPATH=BEAM_SOURCE,
+        BEAM_STATE_DIR=os.path.join(root, "state"),
+        BEAM_NO_DAEMON="1",
+    )
+    code = f"import sys; sys.argv = ['beam'] + {list(args)!r}; from beam.cli import main; sys.exit(main())"
+    return subprocess.run([sys.executable, "-c", code], cwd=root, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def site_lines(output, site):
+    """Lines carrying a site's prefix, with the prefix removed"""
+    lines = []
+    for line in output.splitlines():
+        name, separator, rest = line.partition(" | ")
+        if separator and name.strip() == site:
+            lines.append(rest)
+    return lines
+
+
+def test_prefix_lines_across_chunks():
+    """A line released in parts is prefixed once, at its start"""
+    from beam.fanout import prefixer
+
+    rewrite = prefixer("s1 | ", lambda data: data)
+    chunks = [b"one\ntw", b"o", b"\nthree\r", b"\nfour\n"]
+    assert b"".join(rewrite(chunk) for chunk in chunks) == b"s1 | one\ns1 | two\ns1 | three\r\ns1 | four\n"
+
+
+def test_fanout_prefixes_and_order(tmp_path):
+    """Every line is prefixed once, in the order each site wrote it"""
+    root = str(tmp_path)
+    sites = ["a.local", "bad.local", "long-site-name.local"]
+    bin_dir = make_bench(root, sites)
+
+    result = run_beam(root, bin_dir, ["fanout", "--jobs", "3", "migrate"])
+
+    assert result.returncode == 1, result.stderr
+    for site in sites:
+        assert site_lines(result.stdout, site) == [
+            f"{site} step 1", f"{site} step 2 ... done", f"{site} step 3",
+        ], result.stdout
+        # Rebranded, and on stderr with the same prefix
+        assert site_lines(result.stderr, site) == [f"beam warning for {site}"], result.stderr
+    # Every output line belongs to a site - nothing was split off mid-line
+    for line in result.stdout.splitlines():
+        if " | " in line:
+            assert line.count(" | ") == 1, line
+    assert "✗ 1 failed" in result.stdout
+    assert "bad.local" in result.stdout.split("Failed sites:")[1]
+
+
+def test_fanout_retry_failed(tmp_path):
+    """--retry-failed runs only the sites that failed last time"""
+    root = str(tmp_path)
+    bin_dir = make_bench(root, ["a.local", "bad.local"])
+    run_beam(root, bin_dir, ["fanout", "migrate"])
+
+    result = run_beam(root, bin_dir, ["fanout", "--retry-failed"])
+
+    assert result.returncode == 1
+    assert site_lines(result.stdout, "bad.local")
+    assert not site_lines(result.stdout, "a.local")
+
+
+def test_jobs_must_be_positive(tmp_path):
+    """--jobs below 1 is a usage error rather than a count of 0 or less"""
+    root = str(tmp_path)
+    bin_dir = make_bench(root, ["a.local"])
+
+    for jobs in ("0", "-3", "many"):
+        result = run_beam(root, bin_dir, ["fanout", "--jobs", jobs, "migrate"])
+        assert result.returncode == 1
+        assert f"Error: --jobs must be a positive number, got {jobs}" in result.stderr
+        assert "at a time" not in result.stderr
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for beam get-app's git mirrors: clones go through a local mirror
+(url.<mirror>.insteadOf) and keep working once the origin is unreachable.
+Repositories are local file:// repos; bench is a stub that clones.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Test", "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "Test", "GIT_COMMITTER_EMAIL": "test@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+# Clones the last argument into apps/, the way bench get-app does
+STUB_BENCH = textwrap.dedent("""\
+    #!{python}
+    import os, subprocess, sys
+    args = sys.argv[1:]
+    if "--help" in args:
+        print("Usage: bench get-app [OPTIONS] GIT_URL")
+        sys.exit(0)
+    url = args[-1]
+    name = os.path.basename(url.rstrip("/"))
+    name = name[:-4] if name.endswith(".git") else name
+    sys.exit(subprocess.call(["git", "clone", "--quiet", url, os.path.join("apps", name)]))
+""")
+
+
+def git(*args, cwd=None):
+    result = subprocess.run(["git"] + list(args), cwd=cwd, capture_output=True, text=True,
+                            env=dict(os.environ, **GIT_ENV))
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def make_origin(path, bare=False):
+    """A repository with one commit; returns its file:// URL"""
+    work = path + ".work" if bare else path
+    os.makedirs(work)
+    git("init", "--quiet", work)
+    with open(os.path.join(work, "hooks.py"), "w") as f:
+        f.write("app_name = 'test'\n")
+    git("add", ".", cwd=work)
+    git("commit", "--quiet", "-m", "initial", cwd=work)
+    if bare:
+        git("clone", "--quiet", "--bare", work, path)
+    return "file://" + path
+
+
+def make_bench(path):
+    os.makedirs(os.path.join(path, "sites"))
+    os.makedirs(os.path.join(path, "apps"))
+    return path
+
+
+def run_get_app(root, bench, args):
+    bin_dir = os.path.join(root, "bin")
+    if not os.path.exists(bin_dir):
+        os.makedirs(bin_dir)
+        with open(os.path.join(bin_dir, "bench"), "w") as f:
+            f.write(STUB_BENCH.format(python=sys.executable))
+        os.chmod(os.path.join(bin_dir, "bench"), 0o755)
+    env = dict(
+        os.environ, **GIT_ENV,
+        PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        PYTHONPATH=BEAM_SOURCE,
+        BEAM_STATE_DIR=os.path.join(root, "state"),
+        BEAM_GIT_MIRRORS=os.path.join(root, "mirrors"),
+        BEAM_NO_DAEMON="1",
+    )
+    code = f"import sys; sys.argv = ['beam', 'get-app'] + {list(args)!r}; from beam.cli import main; sys.exit(main())"
+    return subprocess.run([sys.executable, "-c", code], cwd=bench, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_clone_through_mirror(tmp_path):
+    """The app is cloned, a mirror is kept and the remote points at the origin"""
+    root = str(tmp_path)
+    url = make_origin(os.path.join(root, "origin", "myapp"))
+    bench = make_bench(os.path.join(root, "bench1"))
+
+    result = run_get_app(root, bench, [url])
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert os.path.exists(os.path.join(bench, "apps", "myapp", "hooks.py"))
+    mirrors = os.listdir(os.path.join(root, "mirrors"))
+    assert [name for name in mirrors if name.startswith("myapp-") and name.endswith(".git")]
+    assert git("remote", "get-url", "origin", cwd=os.path.join(bench, "apps", "myapp")) == url
+
+
+def test_mirror_reused_when_origin_is_gone(tmp_path):
+    """A second bench gets the app from the mirror after the origin disappears"""
+    root = str(tmp_path)
+    origin = os.path.join(root, "origin", "myapp")
+    url = make_origin(origin)
+    assert run_get_app(root, make_bench(os.path.join(root, "bench1")), [url]).returncode == 0
+
+    shutil.rmtree(origin)
+    bench = make_bench(os.path.join(root, "bench2"))
+    result = run_get_app(root, bench, [url])
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert os.path.exists(os.path.join(bench, "apps", "myapp", "hooks.py"))
+    assert git("remote", "get-url", "origin", cwd=os.path.join(bench, "apps", "myapp")) == url
+
+
+def test_dot_git_url_uses_mirror(tmp_path):
+    """A URL spelled with .git maps to the same mirror, not <mirror>.git"""
+    root = str(tmp_path)
+    origin = os.path.join(root, "origin", "other.git")
+    url = make_origin(origin, bare=True)
+    assert run_get_app(root, make_bench(os.path.join(root, "bench1")), [url]).returncode == 0
+
+    shutil.rmtree(origin)
+    bench = make_bench(os.path.join(root, "bench2"))
+    result = run_get_app(root, bench, [url])
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert os.path.exists(os.path.join(bench, "apps", "other", "hooks.py"))
+
+
+def test_usage_errors_and_help(tmp_path):
+    """Bad --jobs is a usage error; --help is bench's get-app help"""
+    root = str(tmp_path)
+    bench = make_bench(os.path.join(root, "bench"))
+
+    result = run_get_app(root, bench, ["--jobs", "abc", "myapp"])
+    assert result.returncode == 1
+    assert "Error: invalid value for --jobs: abc" in result.stderr
+    assert "Traceback" not in result.stderr
+
+    result = run_get_app(root, bench, ["--help"])
+    assert result.returncode == 0
+    assert "get-app" in result.stdout
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Tests for beam scale: the scaling decision (hysteresis, cooldown, bounds)
+and reading RQ's keys from a RESP stub server
+"""
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BEAM_SOURCE)
+
+from beam.saas import scale  # noqa: E402
+
+
+OPTIONS = {"interval": 10.0, "up_age": 30.0, "up_backlog": 10, "cooldown": 60.0,
+           "down_after": 300.0, "dry_run": True, "bounds": {}}
+
+BUSY = {"queued": 50, "age": 40.0, "workers": 2, "busy": 2}
+IDLE = {"queued": 0, "age": 0.0, "workers": 2, "busy": 0}
+
+
+def simulate(pool, stats, start, seconds, options=OPTIONS):
+    """Run decide every interval, applying each change at once; [(time, size)] of changes"""
+    changes = []
+    now = start
+    while now < start + seconds:
+        size, reason = scale.decide(pool, dict(stats, workers=pool.size), now, options)
+        if reason is not None and size != pool.size:
+            pool.running = size
+            pool.changed_at = now
+            changes.append((now - start, size))
+        now += options["interval"]
+    return changes
+
+
+def make_pool(running, low=1, high=8):
+    pool = scale.Pool("short", low, high)
+    pool.running = running
+    return pool
+
+
+def test_grows_by_half_or_by_backlog():
+    """A busy pool with old jobs grows by half, or to what the backlog needs"""
+    pool = make_pool(4)
+    assert scale.decide(pool, dict(BUSY, queued=45, workers=4, busy=4), 0.0, OPTIONS)[0] == 6
+    pool = make_pool(2)
+    assert scale.decide(pool, dict(BUSY, queued=70), 0.0, OPTIONS)[0] == 7
+    # ...never past its maximum
+    pool = make_pool(2, high=3)
+    assert scale.decide(pool, dict(BUSY, queued=500), 0.0, OPTIONS)[0] == 3
+
+
+def test_backlog_with_idle_workers_does_not_grow():
+    """Queued jobs while workers sit idle are not a reason for more workers"""
+    pool = make_pool(4)
+    size, reason = scale.decide(pool, dict(BUSY, workers=4, busy=1), 0.0, OPTIONS)
+    assert (size, reason) == (4, None)
+
+
+def test_cooldown_between_changes():
+    """After a change, the pool is left alone for --cooldown seconds"""
+    pool = make_pool(2)
+    changes = simulate(pool, dict(BUSY, queued=1000), 0.0, 200)
+    times = [when for when, _ in changes]
+    assert times[0] == 0.0
+    assert all(later - earlier >= OPTIONS["cooldown"] for earlier, later in zip(times, times[1:]))
+    assert changes[-1][1] == 8
+
+
+def test_shrinks_one_at_a_time_after_idle():
+    """An idle pool loses one worker per --down-after, down to its minimum"""
+    pool = make_pool(3)
+    changes = simulate(pool, IDLE, 0.0, 1000)
+    assert changes == [(300.0, 2), (600.0, 1)]
+    assert pool.size == 1
+
+
+def test_no_flapping_between_thresholds():
+    """Load between the grow and shrink thresholds changes nothing"""
+    pool = make_pool(4)
+    # Half busy, a small backlog: not enough to grow, too busy to shrink
+    changes = simulate(pool, {"queued": 0, "age": 0.0, "busy": 2}, 0.0, 3600)
+    assert changes == []
+    changes = simulate(pool, {"queued": 5, "age": 5.0, "busy": 4}, 3600.0, 3600)
+    assert changes == []
+
+
+def test_busy_history_delays_shrinking():
+    """Utilization is smoothed, so a pool that was just busy waits longer to shrink"""
+    pool = make_pool(4)
+    simulate(pool, dict(BUSY, queued=0, age=0.0, busy=4), 0.0, 600)
+    assert pool.utilization > 0.9
+    changes = simulate(pool, IDLE, 600.0, 600)
+    # The smoothed utilization needs a while to fall under the idle threshold
+    assert changes and changes[0][0] > OPTIONS["down_after"]
+
+
+def test_bounds_are_enforced_first():
+    """A pool outside its bounds is brought back regardless of cooldown"""
+    pool = make_pool(0, low=2)
+    pool.changed_at = 0.0
+    assert scale.decide(pool, IDLE, 1.0, OPTIONS) == (2, "below minimum 2")
+    pool = make_pool(9, high=4)
+    pool.changed_at = 0.0
+    assert scale.decide(pool, BUSY, 1.0, OPTIONS) == (4, "above maximum 4")
+
+
+# ---------------------------------------------------------------------------
+# RESP stub
+# ---------------------------------------------------------------------------
+
+class RespStub(socketserver.ThreadingTCPServer):
+    """Serves SMEMBERS/LLEN/LINDEX/HMGET/HGET/AUTH from in-memory data"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, data, password=None):
+        self.data = data
+        self.password = password
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.server_address[1]}"
+
+
+def encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, (list, set)):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in sorted(value, key=str))
+    value = str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        data = self.server.data
+        authenticated = self.server.password is None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = []
+            for _ in range(int(line[1:])):
+                self.rfile.readline()
+                command.append(self.rfile.readline().strip().decode())
+            name, args = command[0].upper(), command[1:]
+            if name == "AUTH":
+                authenticated = args[-1] == self.server.password
+                reply = b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n"
+            elif not authenticated:
+                reply = b"-NOAUTH Authentication required.\r\n"
+            elif name == "SMEMBERS":
+                reply = encode(data.get(args[0], set()))
+            elif name == "LLEN":
+                reply = encode(len(data.get(args[0], [])))
+            elif name == "LINDEX":
+                items = data.get(args[0], [])
+                reply = encode(items[int(args[1])] if items else None)
+            elif name == "HMGET":
+                reply = b"*%d\r\n" % len(args[1:]) + b"".join(
+                    encode(data.get(args[0], {}).get(field)) for field in args[1:])
+            elif name == "HGET":
+                reply = encode(data.get(args[0], {}).get(args[1]))
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+def rq_time(epoch):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(epoch)) + ".250000Z"
+
+
+def rq_data(now):
+    return {
+        "rq:queues": {"rq:queue:bench1:long", "rq:queue:bench1:default", "rq:queue:bench1:short"},
+        "rq:queue:bench1:long": ["job-a", "job-b", "job-c"],
+        "rq:queue:bench1:default": ["job-d"],
+        "rq:queue:bench1:short": [],
+        "rq:job:job-a": {"enqueued_at": rq_time(now - 120)},
+        "rq:job:job-d": {"enqueued_at": rq_time(now - 5)},
+        "rq:workers": {"rq:worker:w1", "rq:worker:w2", "rq:worker:w3", "rq:worker:w4"},
+        "rq:worker:w1": {"state": "busy", "queues": "bench1:long"},
+        "rq:worker:w2": {"state": "idle", "queues": "bench1:long"},
+        "rq:worker:w3": {"state": "busy", "queues": "bench1:short,bench1:default"},
+        "rq:worker:w4": {"state": "idle", "queues": "bench1:default"},
+    }
+
+
+def test_read_queues():
+    """Queue lengths, oldest job ages and worker states per pool"""
+    # Whole seconds, so the .25 in RQ's timestamps is the only fraction
+    now = float(int(time.time()))
+    server = RespStub(rq_data(now), password="secret")
+    try:
+        redis = scale.Redis(server.url, timeout=5)
+        try:
+            stats = scale.read_queues(redis, now)
+        finally:
+            redis.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert stats["long"]["queued"] == 3 and stats["long"]["workers"] == 2 and stats["long"]["busy"] == 1
+    assert abs(stats["long"]["age"] - 119.75) < 0.01
+    assert stats["default"]["queued"] == 1 and stats["default"]["workers"] == 1
+    assert stats["default"]["busy"] == 0
+    assert abs(stats["default"]["age"] - 4.75) < 0.01
+    # w3 listens on short first, so it belongs to the short pool
+    assert stats["short"] == {"queued": 0, "age": 0.0, "workers": 1, "busy": 1}
+
+
+def test_redis_errors():
+    """A refused password surfaces as RedisError"""
+    server = RespStub(rq_data(time.time()), password="secret")
+    try:
+        try:
+            scale.Redis(server.url.replace(":secret@", ":wrong@"), timeout=5)
+        except scale.RedisError as e:
+            assert "WRONGPASS" in str(e)
+        else:
+            raise AssertionError("a wrong password was accepted")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_dry_run_step(tmp_path):
+    """Without a supervisor config, a dry run sizes RQ's own pools and logs the decision"""
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "sites"))
+    now = time.time()
+    data = rq_data(now)
+    data["rq:queue:bench1:long"] = [f"job-{number}" for number in range(40)]
+    data["rq:job:job-0"] = {"enqueued_at": rq_time(now - 300)}
+    data["rq:worker:w2"]["state"] = "busy"
+    server = RespStub(data)
+    with open(os.path.join(root, "sites", "common_site_config.json"), "w") as f:
+        json.dump({"redis_queue": server.url}, f)
+    scaler = scale.Scaler(root, dict(OPTIONS, bounds={"*": (1, 6)}))
+    try:
+        scaler.setup()
+        scaler.step(now=1000.0)
+        # Simulated: the target stands in for the processes a live run would start
+        assert scaler.pools["long"].size == 4
+        assert scaler.pools["default"].size == 1
+        assert scaler.pools["short"].size == 1
+        scaler.step(now=1010.0)
+        assert scaler.pools["long"].size == 4
+    finally:
+        if scaler.redis is not None:
+            scaler.redis.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_set_numprocs_keeps_file_mode(tmp_path):
+    """Only the program's section changes; the file keeps its mode"""
+    conf = tmp_path / "supervisor.conf"
+    conf.write_text("[program:bench1-frappe-short-worker]\ncommand=bench worker\n\n"
+                    "[program:bench1-frappe-web]\ncommand=gunicorn\n")
+    conf.chmod(0o640)
+
+    scale.set_numprocs(str(conf), "bench1-frappe-short-worker", 3)
+
+    text = conf.read_text()
+    assert "numprocs=3\nprocess_name=%(program_name)s-%(process_num)d\n\n[program:bench1-frappe-web]" in text
+    assert text.endswith("[program:bench1-frappe-web]\ncommand=gunicorn\n")
+    assert conf.stat().st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["supervisor.conf"]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Tests for beam status against asyncio stand-ins for MariaDB (greeting
+packet only), Redis (PING/AUTH) and the web server (keep-alive HTTP/1.1)
+"""
+import asyncio
+import json
+import os
+import sys
+
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BEAM_SOURCE)
+
+from beam.saas import status  # noqa: E402
+
+
+def packet(payload, sequence=0):
+    return len(payload).to_bytes(3, "little") + bytes([sequence]) + payload
+
+
+class StandIns:
+    """MariaDB, Redis and HTTP servers on ephemeral ports of the running loop"""
+
+    def __init__(self, db_greeting, redis_password=None):
+        self.db_greeting = db_greeting
+        self.redis_password = redis_password
+        self.http_connections = 0
+        self.http_requests = 0
+        self.servers = []
+
+    async def start(self):
+        for handler in (self.mariadb, self.redis, self.http):
+            server = await asyncio.start_server(handler, "127.0.0.1", 0)
+            self.servers.append(server)
+        self.db_port, self.redis_port, self.http_port = (
+            server.sockets[0].getsockname()[1] for server in self.servers)
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+
+    async def mariadb(self, reader, writer):
+        writer.write(packet(self.db_greeting))
+        await writer.drain()
+        writer.close()
+
+    async def redis(self, reader, writer):
+        authenticated = self.redis_password is None
+        try:
+            while True:
+                count = int((await reader.readline())[1:])
+                parts = []
+                for _ in range(count):
+                    await reader.readline()
+                    parts.append((await reader.readline()).strip().decode())
+                if parts[0] == "AUTH":
+                    authenticated = parts[-1] == self.redis_password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                else:
+                    writer.write(b"+PONG\r\n")
+                await writer.drain()
+        except (ValueError, ConnectionError):
+            pass
+        writer.close()
+
+    async def http(self, reader, writer):
+        self.http_connections += 1
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode().split("\r\n")
+                self.http_requests += 1
+                host = next(line.split(":", 1)[1].strip() for line in head if line.lower().startswith("host:"))
+                if host.startswith("slow"):
+                    await asyncio.sleep(5)
+                if host.startswith("huge"):
+                    writer.write(b"HTTP/1.1 200 OK\r\nX-Padding: " + b"x" * 100000 + b"\r\n\r\n")
+                    await writer.drain()
+                    break
+                code, extra = {"moved": (302, "Location: https://moved.local/\r\n"),
+                               "broken": (500, "")}.get(host.split(".")[0], (200, ""))
+                body = b'{"message":"pong"}'
+                writer.write(f"HTTP/1.1 {code} X\r\n{extra}Content-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+
+def make_bench(root, sites, config):
+    os.makedirs(os.path.join(root, "sites"), exist_ok=True)
+    for site in sites:
+        os.makedirs(os.path.join(root, "sites", site))
+        with open(os.path.join(root, "sites", site, "site_config.json"), "w") as f:
+            f.write("{}")
+    os.makedirs(os.path.join(root, "apps"), exist_ok=True)
+    with open(os.path.join(root, "sites", "common_site_config.json"), "w") as f:
+        json.dump(config, f)
+
+
+def run_checks(root, stand_ins, checks, site_names=(), connections=4, timeout=1.0, redis_auth=""):
+    """Start the stand-ins, write a matching bench config and run gather_checks"""
+    async def scenario():
+        await stand_ins.start()
+        try:
+            make_bench(root, site_names, {
+                "db_host": "127.0.0.1", "db_port": stand_ins.db_port,
+                "redis_cache": f"redis://{redis_auth}127.0.0.1:{stand_ins.redis_port}",
+                "redis_queue": f"redis://{redis_auth}127.0.0.1:{stand_ins.redis_port}",
+                "webserver_port": stand_ins.http_port,
+            })
+            options = {"checks": checks, "timeout": timeout, "connections": connections,
+                       "url": None, "all": True}
+            return await status.gather_checks(root, options)
+        finally:
+            stand_ins.close()
+    return asyncio.run(scenario())
+
+
+GREETING = b"\x0a5.5.5-10.11.6-MariaDB\x00" + b"\x00" * 40
+
+
+def test_services(tmp_path):
+    """MariaDB's version comes from its greeting; one PING per Redis instance"""
+    stand_ins = StandIns(GREETING, redis_password="secret")
+    services, sites, _ = run_checks(str(tmp_path), stand_ins, ["db", "redis"], redis_auth=":secret@")
+
+    rows = {row["name"]: row for row in services}
+    assert rows["mariadb"]["ok"] and rows["mariadb"]["detail"] == "10.11.6-MariaDB"
+    # cache and queue share an instance
+    assert rows["redis cache+queue"]["ok"] and rows["redis cache+queue"]["detail"] == "PONG"
+    assert sites == []
+
+
+def test_service_failures(tmp_path):
+    """An error packet and a rejected password are failures with the server's reason"""
+    stand_ins = StandIns(b"\xff\x10\x04Too many connections", redis_password="secret")
+    services, _, _ = run_checks(str(tmp_path), stand_ins, ["db", "redis"])
+
+    rows = {row["name"]: row for row in services}
+    assert not rows["mariadb"]["ok"] and rows["mariadb"]["detail"] == "error 1040: Too many connections"
+    assert not rows["redis cache+queue"]["ok"] and "NOAUTH" in rows["redis cache+queue"]["detail"]
+
+
+def test_sites_share_keepalive_connections(tmp_path):
+    """Many sites are checked over at most --connections connections"""
+    stand_ins = StandIns(GREETING)
+    names = [f"site{number}.local" for number in range(60)]
+    _, sites, pool = run_checks(str(tmp_path), stand_ins, ["sites"], names, connections=4)
+
+    assert len(sites) == 60 and all(row["ok"] for row in sites)
+    assert stand_ins.http_requests == 60
+    assert pool.opened == stand_ins.http_connections <= 4
+
+
+def test_site_failures(tmp_path):
+    """Redirects pass; errors, timeouts and oversized responses fail without stopping the rest"""
+    stand_ins = StandIns(GREETING)
+    names = ["ok.local", "moved.local", "broken.local", "slow.local", "huge.local"]
+    _, sites, _ = run_checks(str(tmp_path), stand_ins, ["sites"], names, timeout=0.5)
+
+    rows = {row["name"]: row for row in sites}
+    assert rows["ok.local"]["ok"] and rows["ok.local"]["detail"] == "HTTP 200"
+    assert rows["moved.local"]["ok"] and rows["moved.local"]["detail"] == "HTTP 302 -> https://moved.local/"
+    assert not rows["broken.local"]["ok"] and rows["broken.local"]["detail"] == "HTTP 500"
+    assert not rows["slow.local"]["ok"] and rows["slow.local"]["detail"] == "timed out after 0.5s"
+    assert not rows["huge.local"]["ok"] and rows["huge.local"]["detail"] == "response headers too large"
+
+
+def test_unreachable_services(tmp_path):
+    """Closed ports are reported per check with the OS's reason"""
+    root = str(tmp_path)
+    make_bench(root, ["a.local"], {"db_port": 1, "redis_cache": "redis://127.0.0.1:1",
+                                   "webserver_port": 1})
+    options = {"checks": ["db", "redis", "sites"], "timeout": 1.0, "connections": 2,
+               "url": None, "all": True}
+    services, sites, _ = asyncio.run(status.gather_checks(root, options))
+
+    assert all(not row["ok"] and row["detail"] == "Connection refused" for row in services + sites)
+
+
+def test_render_summary():
+    """The sites line summarises latency and connections; the footer names the slowest check"""
+    class Pool:
+        opened = 2
+    services = [{"name": "mariadb", "target": "127.0.0.1:3306", "ok": True, "latency": 0.002,
+                 "detail": "10.11.6-MariaDB"}]
+    sites = [{"name": f"s{n}", "target": "127.0.0.1:80", "ok": n != 3, "latency": n / 100,
+              "detail": "HTTP 200" if n != 3 else "HTTP 500"} for n in range(1, 5)]
+
+    text = status.render(services, sites, False, Pool(), 0.05)
+
+    assert "3/4 ok" in text and "2 connection(s)" in text
+    assert "s3" in text and "s1 " not in text
+    assert text.rstrip().endswith("slowest s4 (40.0ms)")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for beam.streaming: rebranded, binary-safe copying of a child's
+output, and not waiting on pipes a background child keeps open
+"""
+import io
+import os
+import subprocess
+import sys
+import time
+
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BEAM_SOURCE)
+
+from beam import streaming  # noqa: E402
+
+
+def run(command, **kwargs):
+    """Stream a command into StringIO sinks; (exit code, stdout, stderr)"""
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+    stdout, stderr = io.StringIO(), io.StringIO()
+    return_code = streaming.stream_process(process, stdout, stderr, **kwargs)
+    return return_code, stdout.getvalue(), stderr.getvalue()
+
+
+def test_streams_rebranded_output():
+    """Both streams are rebranded and complete; the exit code comes back"""
+    return_code, stdout, stderr = run(
+        ["sh", "-c", "echo bench start; printf 'frappe partial'; echo frappe err >&2; exit 4"])
+    assert return_code == 4
+    assert stdout == "beam start\nbeam partial"
+    assert stderr == "beam err\n"
+
+
+def test_background_child_does_not_block():
+    """A child left holding the pipes is given EXIT_GRACE, not waited for"""
+    started = time.monotonic()
+    return_code, stdout, _ = run(["sh", "-c", "sleep 8 & echo hi"])
+    elapsed = time.monotonic() - started
+    assert return_code == 0
+    assert stdout == "hi\n"
+    assert elapsed < streaming.EXIT_GRACE + 2
+
+
+def test_output_after_exit_within_grace():
+    """Output a background child writes shortly after the parent exits still arrives"""
+    return_code, stdout, _ = run(["sh", "-c", "(sleep 0.3; echo late) & echo early"])
+    assert return_code == 0
+    assert stdout == "early\nlate\n"
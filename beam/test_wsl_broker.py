@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for the WSL broker and agent, with the agent run as a local
+process (BEAM_WSL_LAUNCHER=env) standing in for the WSL distro
+"""
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+BEAM_SOURCE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BEAM_SOURCE)
+
+from beam import wsl_agent  # noqa: E402
+from beam.wsl_agent import CANCEL, EXIT, HELLO, PING, REQUEST, STDERR, STDOUT, encode_frame, read_frame  # noqa: E402
+
+
+def start_agent():
+    with open(wsl_agent.__file__, encoding="utf-8") as f:
+        source = f.read()
+    agent = subprocess.Popen([sys.executable, "-u", "-c", source],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+    assert read_frame(agent.stdout)[0] == HELLO
+    return agent
+
+
+def collect(agent, request_ids):
+    """{request id: {kind: joined payloads}} until every request has exited (or answered a ping)"""
+    frames = {}
+    waiting = set(request_ids)
+    while waiting:
+        kind, request_id, payload = read_frame(agent.stdout)
+        received = frames.setdefault(request_id, {})
+        received[kind] = received.get(kind, b"") + payload
+        if kind in (EXIT, PING):
+            waiting.discard(request_id)
+    return frames
+
+
+def broker_env(root):
+    return dict(os.environ, PYTHONPATH=BEAM_SOURCE, BEAM_STATE_DIR=os.path.join(root, "state"),
+                BEAM_WSL_LAUNCHER="env")
+
+
+def run_python(root, code):
+    return subprocess.run([sys.executable, "-c", code], cwd=root, env=broker_env(root),
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_frame_roundtrip():
+    """Frames survive a stream; a truncated frame reads as EOF"""
+    data = encode_frame(STDOUT, 7, b"hello") + encode_frame(EXIT, 7, b"0")
+    stream = io.BytesIO(data)
+    assert read_frame(stream) == (STDOUT, 7, b"hello")
+    assert read_frame(stream) == (EXIT, 7, b"0")
+    assert read_frame(stream) is None
+    assert read_frame(io.BytesIO(encode_frame(STDOUT, 1, b"hello")[:-2])) is None
+
+
+def test_agent_requests_and_exit_codes():
+    """Concurrent requests keep their own output and exit codes"""
+    agent = start_agent()
+    try:
+        requests = {
+            1: {"argv": ["sh", "-c", "echo out; echo err >&2; exit 5"]},
+            2: {"argv": ["beam-does-not-exist"], "missing_code": 199},
+            3: {"argv": ["sh", "-c", "kill -TERM $$"]},
+        }
+        for request_id, request in requests.items():
+            agent.stdin.write(encode_frame(REQUEST, request_id, json.dumps(request).encode()))
+        agent.stdin.write(encode_frame(PING, 9, b"x"))
+
+        frames = collect(agent, [1, 2, 3, 9])
+        assert frames[1] == {STDOUT: b"out\n", STDERR: b"err\n", EXIT: b"5"}
+        assert frames[2] == {EXIT: b"199"}
+        # Killed by a signal: 128 + signal number, as a shell reports it
+        assert frames[3][EXIT] == b"143"
+        assert frames[9] == {PING: b"x"}
+    finally:
+        agent.stdin.close()
+        agent.wait(10)
+
+
+def test_agent_cancel():
+    """CANCEL terminates the request's process"""
+    agent = start_agent()
+    try:
+        request = {"argv": ["sleep", "30"]}
+        agent.stdin.write(encode_frame(REQUEST, 4, json.dumps(request).encode()))
+        time.sleep(0.3)
+        started = time.monotonic()
+        agent.stdin.write(encode_frame(CANCEL, 4))
+        assert collect(agent, [4])[4][EXIT] == b"143"
+        assert time.monotonic() - started < 5
+    finally:
+        agent.stdin.close()
+        agent.wait(10)
+
+
+def test_run_via_broker(tmp_path):
+    """Output is rebranded, exit codes come back and the broker is reused"""
+    root = str(tmp_path)
+    code = (
+        "import os, sys; from beam.wsl_broker import run_via_broker; "
+        "sys.exit(run_via_broker(sys.argv[1:], os.getcwd(), missing_code=199))"
+    )
+    command = ["sh", "-c", "echo bench output; echo frappe error >&2; exit 7"]
+    try:
+        result = subprocess.run([sys.executable, "-c", code] + command, cwd=root, env=broker_env(root),
+                                capture_output=True, text=True, timeout=60)
+        assert result.returncode == 7, result.stderr
+        assert result.stdout == "beam output\n"
+        assert result.stderr == "beam error\n"
+
+        with open(os.path.join(root, "state", "wsl_broker.json")) as f:
+            first_pid = json.load(f)["pid"]
+        result = subprocess.run([sys.executable, "-c", code, "beam-does-not-exist"], cwd=root,
+                                env=broker_env(root), capture_output=True, text=True, timeout=60)
+        assert result.returncode == 199
+        with open(os.path.join(root, "state", "wsl_broker.json")) as f:
+            assert json.load(f)["pid"] == first_pid
+    finally:
+        run_python(root, "from beam.wsl_broker import stop_broker; stop_broker()")
+
+
+def test_missing_beam_in_wsl(tmp_path):
+    """beam missing inside WSL prints the setup hint rather than exit 199"""
+    root = str(tmp_path)
+    code = (
+        "import io, sys\n"
+        "class Console(io.StringIO):\n"
+        "    def isatty(self):\n"
+        "        return True\n"
+        "sys.stdin = Console()\n"
+        "from beam import cli\n"
+        "cli.get_wsl_beam_path = lambda refresh=False: '/nonexistent/beam'\n"
+        "sys.exit(cli.run_in_wsl(['migrate']))\n"
+    )
+    try:
+        result = run_python(root, code)
+        assert result.returncode == 1
+        assert "Beam Not Found in WSL" in result.stderr
+    finally:
+        run_python(root, "from beam.wsl_broker import stop_broker; stop_broker()")